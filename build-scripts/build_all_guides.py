@@ -12,7 +12,7 @@ Author: Martin Preisler <mpreisle@redhat.com>
 
 import os.path
 import argparse
-import threading
+import time
 import sys
 
 import ssg.build_guides
@@ -38,6 +38,11 @@ def parse_args():
     p.add_argument("-j", "--jobs", type=int, action="store",
                    default=ssg.utils.get_cpu_count(),
                    help="how many jobs should be processed in parallel")
+    p.add_argument("--retries", type=int, action="store", default=1,
+                   help="how many times a failed guide generation is retried")
+    p.add_argument("--timing-report", action="store",
+                   help="write a JSON report with the duration of each "
+                   "guide generation to the given file")
     p.add_argument("-i", "--input", action="store", required=True,
                    help="input file, can be XCCDF or Source DataStream")
     p.add_argument("-o", "--output", action="store", required=True,
@@ -79,22 +84,19 @@ def main():
         print(index_path)
         sys.exit(0)
 
-    index_links, index_options, index_initial_src, queue = \
-        ssg.build_guides.fill_queue(benchmarks, benchmark_profile_pairs,
-                                    input_path, path_base, output_dir)
-
-    workers = []
-    for worker_id in range(args.jobs):
-        worker = threading.Thread(
-            name="Guide generate worker #%i" % (worker_id),
-            target=lambda queue=queue: ssg.build_guides.builder(queue)
-        )
-        workers.append(worker)
-        worker.daemon = True
-        worker.start()
-
-    for worker in workers:
-        worker.join()
+    costs = ssg.build_guides.get_benchmark_profile_costs(input_tree, benchmarks)
+    index_links, index_options, index_initial_src, tasks = \
+        ssg.build_guides.get_build_tasks(benchmarks, benchmark_profile_pairs,
+                                         input_path, path_base, output_dir, costs)
+
+    start = time.time()
+    results = ssg.build_guides.run_tasks(ssg.build_guides.generate_guide, tasks,
+                                         args.jobs, args.retries)
+    if args.timing_report:
+        ssg.build_guides.write_timing_report(results, time.time() - start,
+                                             args.jobs, args.timing_report)
+    if any(result.error is not None for result in results):
+        sys.exit(1)
 
     index_source = ssg.build_guides.build_index(benchmarks, input_basename,
                                                 index_links, index_options,
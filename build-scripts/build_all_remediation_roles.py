@@ -12,7 +12,7 @@ Author: Martin Preisler <mpreisle@redhat.com>
 import os.path
 import argparse
 
-import threading
+import time
 import sys
 
 import ssg.build_guides
@@ -38,6 +38,11 @@ def parse_args():
     p.add_argument("-j", "--jobs", type=int, action="store",
                    default=ssg.utils.get_cpu_count(),
                    help="how many jobs should be processed in parallel")
+    p.add_argument("--retries", type=int, action="store", default=1,
+                   help="how many times a failed role generation is retried")
+    p.add_argument("--timing-report", action="store",
+                   help="write a JSON report with the duration of each "
+                   "role generation to the given file")
 
     p.add_argument("-t", "--template", action="store", required=True,
                    help="the remediation template")
@@ -84,21 +89,19 @@ def main():
 
         sys.exit(0)
 
-    queue = ssg.build_roles.fill_queue(benchmarks, benchmark_profile_pairs, input_path,
-                                       path_base, extension, output_dir, template)
-
-    workers = []
-    for worker_id in range(args.jobs):
-        worker = threading.Thread(
-            name="Role generate worker #%i" % (worker_id),
-            target=lambda queue=queue: ssg.build_roles.builder(queue)
-        )
-        workers.append(worker)
-        worker.daemon = True
-        worker.start()
-
-    for worker in workers:
-        worker.join()
+    costs = ssg.build_guides.get_benchmark_profile_costs(input_tree, benchmarks)
+    tasks = ssg.build_roles.get_build_tasks(benchmarks, benchmark_profile_pairs, input_path,
+                                            path_base, extension, output_dir, template,
+                                            costs)
+
+    start = time.time()
+    results = ssg.build_guides.run_tasks(ssg.build_roles.generate_role, tasks,
+                                         args.jobs, args.retries)
+    if args.timing_report:
+        ssg.build_guides.write_timing_report(results, time.time() - start,
+                                             args.jobs, args.timing_report)
+    if any(result.error is not None for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
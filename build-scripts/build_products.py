@@ -0,0 +1,283 @@
+#!/usr/bin/env python2
+
+"""
+Builds the unlinked artifacts (shorthand XCCDF, OVAL, remediations and CPE
+files) of several products in one run. Content shared by the products, like
+the build configuration, the rule directories of the benchmarks, the jinja
+macros and the bash remediation functions, is loaded only once and the
+products are then built in parallel.
+
+The artifacts are written to the same locations the CMake build uses, e.g.
+build/rhel7/shorthand.xml, build/rhel7/oval-unlinked.xml,
+build/rhel7/bash-fixes.xml and build/ssg-rhel7-cpe-oval.xml.
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import os.path
+import subprocess
+import sys
+import time
+
+import ssg.build_cpe
+import ssg.build_ovals
+import ssg.build_remediations
+import ssg.build_templates
+import ssg.build_yaml
+import ssg.constants
+import ssg.jinja
+import ssg.rules
+import ssg.utils
+import ssg.xml
+import ssg.yaml
+
+
+SSG_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SSG_SHARED = os.path.join(SSG_DIR, "shared")
+SSG_BUILD_SCRIPTS = os.path.join(SSG_DIR, "build-scripts")
+
+REMEDIATION_LANGUAGES = ["bash", "ansible", "puppet", "anaconda"]
+
+# Content loaded by the parent process and inherited by the workers
+_shared_content = dict()
+
+
+def parse_args():
+    p = argparse.ArgumentParser(
+        description="Build shorthand XCCDF, OVAL, remediations and CPE "
+        "artifacts of the given products in one run.")
+    p.add_argument(
+        "--build-config-yaml", required=True, dest="build_config_yaml",
+        help="YAML file with information about the build configuration. "
+        "e.g.: ~/scap-security-guide/build/build_config.yml"
+    )
+    p.add_argument("--build-dir", required=True, dest="build_dir",
+                   help="where is the cmake build directory. pass value of "
+                   "$CMAKE_BINARY_DIR.")
+    p.add_argument("-j", "--jobs", type=int, action="store",
+                   default=ssg.utils.get_cpu_count(),
+                   help="how many products should be built in parallel")
+    p.add_argument("products", metavar="PRODUCT", nargs="*",
+                   help="products to build, all known products are built "
+                   "if none are given")
+
+    args = p.parse_args()
+    if not args.products:
+        args.products = [product for product in ssg.constants.product_directories
+                         if os.path.isfile(get_product_yaml(product))]
+    for product in args.products:
+        if not os.path.isfile(get_product_yaml(product)):
+            print("Error: '%s' is not a product, '%s' doesn't exist!" %
+                  (product, get_product_yaml(product)), file=sys.stderr)
+            sys.exit(1)
+
+    return args
+
+
+def get_product_yaml(product):
+    return os.path.join(SSG_DIR, product, "product.yml")
+
+
+def get_guide_dir(env_yaml, product_yaml):
+    product_dir = os.path.dirname(product_yaml)
+    benchmark_root = ssg.utils.required_key(env_yaml, "benchmark_root")
+    return os.path.abspath(os.path.join(product_dir, benchmark_root))
+
+
+def get_bash_remediation_functions(build_dir):
+    """
+    Make sure bash-remediation-functions.xml exists in build_dir, it is
+    needed by the shorthand and by the remediations of all products.
+    """
+    path = os.path.join(build_dir, "bash-remediation-functions.xml")
+    if not os.path.isfile(path):
+        subprocess.check_call([
+            sys.executable,
+            os.path.join(SSG_BUILD_SCRIPTS, "generate_bash_remediation_functions.py"),
+            "--input_dir", os.path.join(SSG_SHARED, "bash_remediation_functions"),
+            "--output", path])
+    return path
+
+
+def load_shared_content(build_config_yaml, build_dir, products):
+    """
+    Load everything products have in common. The result is stored in a module
+    level variable, so that worker processes forked afterwards inherit it.
+    """
+    build_config = ssg.yaml.open_raw(build_config_yaml)
+
+    rule_dirs = dict()
+    for product in products:
+        product_yaml = get_product_yaml(product)
+        env_yaml = ssg.yaml.open_product_environment(build_config, product_yaml)
+        guide_dir = get_guide_dir(env_yaml, product_yaml)
+        if guide_dir not in rule_dirs:
+            rule_dirs[guide_dir] = list(ssg.rules.find_rule_dirs(guide_dir))
+
+    ssg.jinja.preload_templates(
+        [ssg.constants.JINJA_MACROS_BASE_DEFINITIONS,
+         ssg.constants.JINJA_MACROS_HIGHLEVEL_DEFINITIONS],
+        build_config)
+
+    bash_remediation_fns = get_bash_remediation_functions(build_dir)
+
+    _shared_content.update(
+        build_config=build_config,
+        build_dir=build_dir,
+        rule_dirs=rule_dirs,
+        bash_remediation_fns=bash_remediation_fns,
+        remediation_functions=ssg.build_remediations.get_available_functions(build_dir),
+    )
+
+
+def _init_worker(shared_content):
+    # Needed only when workers are spawned instead of forked
+    _shared_content.update(shared_content)
+
+
+def build_templates(env_yaml, product_dir, output_dir, languages):
+    inputs = [os.path.join(product_dir, "templates"), os.path.join(SSG_SHARED, "templates")]
+    outputs = [output_dir, os.path.join(output_dir, "shared")]
+    for input_dir, output in zip(inputs, outputs):
+        builder = ssg.build_templates.Builder(env_yaml)
+        builder.set_langs(languages)
+        builder.set_input_dir(input_dir)
+        builder.output_dir = output
+        builder.ssg_shared = SSG_SHARED
+        # The manifest removes outputs of rows removed from the CSVs, as in
+        # the CMake build
+        builder.incremental = True
+        builder.build()
+
+
+def build_shorthand(env_yaml, product_dir, output_path):
+    benchmark_root = ssg.utils.required_key(env_yaml, "benchmark_root")
+    profiles_root = ssg.utils.required_key(env_yaml, "profiles_root")
+    if not os.path.isabs(benchmark_root):
+        benchmark_root = os.path.join(product_dir, benchmark_root)
+    if not os.path.isabs(profiles_root):
+        profiles_root = os.path.join(product_dir, profiles_root)
+
+    ssg.build_yaml.add_from_directory(
+        "build", None, benchmark_root, profiles_root,
+        _shared_content["bash_remediation_fns"], output_path, env_yaml)
+
+
+def build_remediations(env_yaml, product_yaml, product_dir, fixes_dir,
+                       output_dir, rule_dirs):
+    rule_remediations = ssg.build_remediations.collect_rule_dir_remediations(
+        rule_dirs, REMEDIATION_LANGUAGES, ssg.utils.required_key(env_yaml, "product"))
+    for lang in REMEDIATION_LANGUAGES:
+        fix_dirs = [
+            os.path.join(fixes_dir, "shared", lang),
+            os.path.join(SSG_SHARED, "fixes", lang),
+            os.path.join(fixes_dir, lang),
+            os.path.join(product_dir, "fixes", lang),
+        ]
+        fixes = ssg.build_remediations.combine_fixes(
+            dict(env_yaml), product_yaml, lang, fix_dirs,
+            rule_remediations=rule_remediations[lang])
+        ssg.build_remediations.write_fixes(
+            lang, _shared_content["build_dir"],
+            os.path.join(output_dir, "%s-fixes.xml" % lang), fixes,
+            _shared_content["remediation_functions"])
+
+
+def build_oval(env_yaml, product_yaml, product_dir, checks_dir, output_path,
+               rule_dirs):
+    oval_dirs = [
+        os.path.join(checks_dir, "shared", "oval"),
+        os.path.join(SSG_SHARED, "checks", "oval"),
+        os.path.join(checks_dir, "oval"),
+        os.path.join(product_dir, "checks", "oval"),
+    ]
+    root = ssg.build_ovals.combine_ovals(
+        dict(env_yaml), product_yaml, oval_dirs, rule_dirs)
+    ssg.xml.ElementTree.ElementTree(root).write(output_path)
+
+
+def build_product(product):
+    """
+    Build all artifacts of one product, return the time it took.
+    """
+    start = time.time()
+
+    build_dir = _shared_content["build_dir"]
+    product_yaml = get_product_yaml(product)
+    product_dir = os.path.dirname(product_yaml)
+    output_dir = os.path.join(build_dir, product)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    env_yaml = ssg.yaml.open_product_environment(
+        _shared_content["build_config"], product_yaml)
+    rule_dirs = _shared_content["rule_dirs"][get_guide_dir(env_yaml, product_yaml)]
+
+    # Every step gets its own copy of the environment, loading rules adds
+    # macros to it which other steps don't expect.
+    fixes_dir = os.path.join(output_dir, "fixes")
+    checks_dir = os.path.join(output_dir, "checks")
+    build_templates(dict(env_yaml), product_dir, fixes_dir, REMEDIATION_LANGUAGES)
+    build_templates(dict(env_yaml), product_dir, checks_dir, ["oval"])
+
+    build_shorthand(dict(env_yaml), product_dir,
+                    os.path.join(output_dir, "shorthand.xml"))
+    build_remediations(env_yaml, product_yaml, product_dir, fixes_dir,
+                       output_dir, rule_dirs)
+
+    oval_path = os.path.join(output_dir, "oval-unlinked.xml")
+    build_oval(env_yaml, product_yaml, product_dir, checks_dir, oval_path,
+               rule_dirs)
+    ssg.build_cpe.generate_cpe_files(
+        product, "ssg", build_dir, oval_path,
+        os.path.join(product_dir, "cpe", "%s-cpe-dictionary.xml" % product),
+        oval_search_dir=output_dir)
+
+    return time.time() - start
+
+
+def build_product_task(product):
+    # Pool workers would die on sys.exit() used by the build functions to
+    # report errors and the pool would wait for their result forever.
+    try:
+        return build_product(product)
+    except SystemExit as exc:
+        raise RuntimeError("Building of '%s' exited with %s" % (product, exc.code))
+    finally:
+        ssg.jinja.finish_render_cache()
+
+
+def main():
+    args = parse_args()
+    build_dir = os.path.abspath(args.build_dir)
+
+    load_shared_content(args.build_config_yaml, build_dir, args.products)
+
+    pool = multiprocessing.Pool(
+        max(1, min(args.jobs, len(args.products))),
+        initializer=_init_worker, initargs=(_shared_content,))
+    results = [(product, pool.apply_async(build_product_task, (product,)))
+               for product in args.products]
+    pool.close()
+
+    failed = []
+    for product, result in results:
+        try:
+            duration = result.get()
+        except Exception as exc:
+            sys.stderr.write("Failed to build '%s': %s\n" % (product, exc))
+            failed.append(product)
+            continue
+        print("Built %s in %.1f s" % (product, duration))
+    pool.join()
+
+    if failed:
+        sys.stderr.write("Failed products: %s\n" % ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,6 @@ import argparse
 import collections
 
 import ssg.build_ovals
-import ssg.constants
-import ssg.utils
 import ssg.xml
 import ssg.yaml
 
@@ -43,57 +41,11 @@ def parse_args():
 def main():
     args = parse_args()
 
-    oval_ns = ssg.constants.oval_namespace
-    footer = ssg.constants.oval_footer
     env_yaml = ssg.yaml.open_environment(
         args.build_config_yaml, args.product_yaml)
 
-    header = ssg.xml.oval_generated_header(
-        "combine_ovals.py",
-        ssg.utils.required_key(env_yaml, "target_oval_version_str"),
-        ssg.utils.required_key(env_yaml, "ssg_version"))
-
-    body = ssg.build_ovals.checks(
-        env_yaml,
-        args.product_yaml,
-        ssg.utils.required_key(env_yaml, "target_oval_version_str"),
-        args.ovaldirs)
-
-    # parse new file(string) as an ssg.xml.ElementTree, so we can reorder elements
-    # appropriately
-    corrected_tree = ssg.xml.ElementTree.fromstring(
-        ("%s%s%s" % (header, body, footer)).encode("utf-8"))
-    tree = ssg.build_ovals.finalize_affected_platforms(corrected_tree, env_yaml)
-    definitions = ssg.xml.ElementTree.Element("{%s}definitions" % oval_ns)
-    tests = ssg.xml.ElementTree.Element("{%s}tests" % oval_ns)
-    objects = ssg.xml.ElementTree.Element("{%s}objects" % oval_ns)
-    states = ssg.xml.ElementTree.Element("{%s}states" % oval_ns)
-    variables = ssg.xml.ElementTree.Element("{%s}variables" % oval_ns)
-
-    for childnode in tree.findall("./{%s}def-group/*" % oval_ns):
-        if childnode.tag is ssg.xml.ElementTree.Comment:
-            continue
-        elif childnode.tag.endswith("definition"):
-            ssg.build_ovals.append(definitions, childnode)
-        elif childnode.tag.endswith("_test"):
-            ssg.build_ovals.append(tests, childnode)
-        elif childnode.tag.endswith("_object"):
-            ssg.build_ovals.append(objects, childnode)
-        elif childnode.tag.endswith("_state"):
-            ssg.build_ovals.append(states, childnode)
-        elif childnode.tag.endswith("_variable"):
-            ssg.build_ovals.append(variables, childnode)
-        else:
-            sys.stderr.write("Warning: Unknown element '%s'\n"
-                             % (childnode.tag))
-
-    root = ssg.xml.ElementTree.fromstring(("%s%s" % (header, footer)).encode("utf-8"))
-    root.append(definitions)
-    root.append(tests)
-    root.append(objects)
-    root.append(states)
-    if list(variables):
-        root.append(variables)
+    root = ssg.build_ovals.combine_ovals(
+        env_yaml, args.product_yaml, args.ovaldirs)
 
     ssg.xml.ElementTree.ElementTree(root).write(args.output)
 
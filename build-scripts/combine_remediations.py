@@ -7,15 +7,20 @@ import re
 import errno
 import argparse
 import codecs
+import multiprocessing
 
 import ssg.build_remediations as remediation
-import ssg.rules
 import ssg.jinja
-import ssg.yaml
+import ssg.rules
 import ssg.utils
+import ssg.yaml
 import ssg.xml
 
 
+# Content loaded by the parent process and inherited by the workers
+_shared_content = dict()
+
+
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument(
@@ -28,18 +33,63 @@ def parse_args():
         help="YAML file with information about the product we are building. "
         "e.g.: ~/scap-security-guide/rhel7/product.yml"
     )
-    p.add_argument("--remediation_type", required=True,
-                   help="language or type of the remediations we are combining."
-                   "example: ansible")
+    p.add_argument("--remediation_type", required=True, nargs="+",
+                   help="language(s) or type(s) of the remediations we are "
+                   "combining. example: ansible")
     p.add_argument("--build_dir", required=True,
                    help="where is the cmake build directory. pass value of "
                    "$CMAKE_BINARY_DIR.")
-    p.add_argument("--output", type=argparse.FileType("wb"), required=True)
+    output = p.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output", type=argparse.FileType("wb"),
+                        help="where to write the remediations, only one "
+                        "remediation type can be combined")
+    output.add_argument("--output-dir", dest="output_dir",
+                        help="directory where <type>-fixes.xml is written "
+                        "for each remediation type. FIX_DIRs then contain "
+                        "a subdirectory for each remediation type.")
+    p.add_argument("-j", "--jobs", type=int, action="store",
+                   default=ssg.utils.get_cpu_count(),
+                   help="how many remediation types should be combined "
+                   "in parallel")
     p.add_argument("fixdirs", metavar="FIX_DIR", nargs="+",
                    help="directory(ies) from which we will collect "
                    "remediations to combine.")
 
-    return p.parse_args()
+    args = p.parse_args()
+    if args.output and len(args.remediation_type) != 1:
+        p.error("--output can be used with one remediation type only, "
+                "use --output-dir for more")
+    return args
+
+
+def _init_worker(shared_content):
+    # Needed only when workers are spawned instead of forked
+    _shared_content.update(shared_content)
+
+
+def combine_remediation_type(remediation_type, output, fix_dirs):
+    fixes = remediation.combine_fixes(
+        dict(_shared_content["env_yaml"]), _shared_content["product_yaml"],
+        remediation_type, fix_dirs,
+        rule_remediations=_shared_content["rule_remediations"][remediation_type])
+
+    remediation.write_fixes(remediation_type, _shared_content["build_dir"],
+                            output, fixes,
+                            _shared_content["remediation_functions"])
+
+    return len(fixes)
+
+
+def combine_remediation_type_task(remediation_type, output, fix_dirs):
+    # Pool workers would die on sys.exit() used to report errors and
+    # the pool would wait for their result forever.
+    try:
+        return combine_remediation_type(remediation_type, output, fix_dirs)
+    except SystemExit as exc:
+        raise RuntimeError("Combining of %s remediations exited with %s"
+                           % (remediation_type, exc.code))
+    finally:
+        ssg.jinja.finish_render_cache()
 
 
 def main():
@@ -49,42 +99,57 @@ def main():
         args.build_config_yaml, args.product_yaml)
 
     product = ssg.utils.required_key(env_yaml, "product")
-
     product_dir = os.path.dirname(args.product_yaml)
     relative_guide_dir = ssg.utils.required_key(env_yaml, "benchmark_root")
     guide_dir = os.path.abspath(os.path.join(product_dir, relative_guide_dir))
 
-    # As fixes is continually updated, the last seen fix that is applicable for a
-    # given fix_name is chosen to replace newer fix_names
-    fixes = dict()
-    for fixdir in args.fixdirs:
-        if os.path.isdir(fixdir):
-            for filename in os.listdir(fixdir):
-                file_path = os.path.join(fixdir, filename)
-                fix_name, _ = os.path.splitext(filename)
-
-                # Fixes gets updated with the contents of the fix, if it is applicable
-                remediation.process_fix(fixes, args.remediation_type,
-                                        env_yaml, product, file_path,
-                                        fix_name)
-
-    # Walk the guide last, looking for rule folders as they have the highest priority
-    for _dir_path in ssg.rules.find_rule_dirs(guide_dir):
-        rule_id = ssg.rules.get_rule_dir_id(_dir_path)
-
-        contents = ssg.rules.get_rule_dir_remediations(_dir_path, args.remediation_type, product)
-        for _path in reversed(contents):
-            # To be compatible with the later checks, use the rule_id
-            # (i.e., the value of _dir) to create the fix_name
-            remediation.process_fix(fixes, args.remediation_type, env_yaml,
-                                    product, _path, rule_id)
-
-    remediation.write_fixes(args.remediation_type, args.build_dir,
-                            args.output, fixes)
-
-    sys.stderr.write("Merged %d %s remediations.\n" % (len(fixes), args.remediation_type))
-
-    sys.exit(0)
+    # The guide is walked only once for all the remediation types
+    rule_dirs = ssg.rules.find_rule_dirs(guide_dir)
+    _shared_content.update(
+        env_yaml=env_yaml,
+        product_yaml=args.product_yaml,
+        build_dir=args.build_dir,
+        rule_remediations=remediation.collect_rule_dir_remediations(
+            rule_dirs, args.remediation_type, product),
+        remediation_functions=remediation.get_available_functions(args.build_dir),
+    )
+
+    tasks = []
+    for remediation_type in args.remediation_type:
+        if args.output:
+            output = args.output
+            fix_dirs = args.fixdirs
+        else:
+            output = os.path.join(args.output_dir, "%s-fixes.xml" % remediation_type)
+            fix_dirs = [os.path.join(fixdir, remediation_type)
+                        for fixdir in args.fixdirs]
+        tasks.append((remediation_type, output, fix_dirs))
+
+    jobs = max(1, min(args.jobs, len(tasks)))
+    if jobs == 1:
+        for task in tasks:
+            count = combine_remediation_type(*task)
+            sys.stderr.write("Merged %d %s remediations.\n" % (count, task[0]))
+        sys.exit(0)
+
+    pool = multiprocessing.Pool(
+        jobs, initializer=_init_worker, initargs=(_shared_content,))
+    results = [(task[0], pool.apply_async(combine_remediation_type_task, task))
+               for task in tasks]
+    pool.close()
+
+    failed = False
+    for remediation_type, result in results:
+        try:
+            count = result.get()
+        except Exception as exc:
+            sys.stderr.write("%s\n" % exc)
+            failed = True
+            continue
+        sys.stderr.write("Merged %d %s remediations.\n" % (count, remediation_type))
+    pool.join()
+
+    sys.exit(1 if failed else 0)
 
 
 if __name__ == "__main__":
@@ -86,17 +86,15 @@ def main():
     ssg.xccdf.scrape_benchmarks(root, XCCDF11_NS, benchmarks)
     ssg.xccdf.scrape_benchmarks(root, XCCDF12_NS, benchmarks)
 
-    # Remove CCEs and DISA STIG IDs from derivatives as these are specific to
-    # the vendor/OS.
-    ssg.build_derivatives.remove_idents(root, XCCDF11_NS)
-    ssg.build_derivatives.remove_idents(root, XCCDF12_NS)
-
     if len(benchmarks) == 0:
         raise RuntimeError("No Benchmark found!")
 
     for namespace, benchmark in benchmarks:
         ssg.build_derivatives.profile_handling(benchmark, namespace)
-        if not ssg.build_derivatives.add_cpes(benchmark, namespace, mapping):
+        # Remove CCEs and DISA STIG IDs from derivatives as these are specific
+        # to the vendor/OS.
+        if not ssg.build_derivatives.add_cpes_and_remove_idents(
+                benchmark, namespace, mapping):
             raise RuntimeError(
                 "Could not add derivative OS CPEs to Benchmark '%s'."
                 % (benchmark)
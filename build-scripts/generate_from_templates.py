@@ -32,6 +32,19 @@ def parse_args():
                    help="List of output directories")
     p.add_argument("--shared", metavar="PATH", required=True,
                    help="Full absolute path to SSG shared directory")
+    p.add_argument(
+        "-j", "--jobs", type=int, action="store",
+        default=1,
+        help="how many processes should render templates in parallel, "
+        "the default is 1 as the build system runs the products in "
+        "parallel already"
+    )
+    p.add_argument(
+        "--incremental", action="store_true",
+        help="Generate only outputs whose CSV row, template or product "
+        "values changed since the previous build, and remove outputs "
+        "that are no longer generated"
+    )
     p.add_argument(
         "--build-config-yaml", required=True, dest="build_config_yaml",
         help="YAML file with information about the build configuration. "
@@ -65,6 +78,8 @@ if __name__ == "__main__":
         builder.set_input_dir(args.input[index])
         builder.output_dir = args.output[index]
         builder.ssg_shared = args.shared
+        builder.incremental = args.incremental
+        builder.jobs = args.jobs
 
         func = getattr(builder, args.cmd)
         func()
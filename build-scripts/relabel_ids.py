@@ -36,16 +36,17 @@ def main():
 
     # Step over xccdf file, and find referenced check files
     xccdftree = ssg.xml.parse_file(xccdffile)
+    xccdf_index = ssg.build_renumber.XCCDFIndex(xccdftree)
 
     if 'unlinked-ocilref' not in xccdffile:
-        ssg.build_renumber.check_that_oval_and_rule_id_match(xccdftree)
+        ssg.build_renumber.check_that_oval_and_rule_id_match(xccdf_index)
 
-    checks = xccdftree.findall(".//{%s}check" % ssg.constants.XCCDF11_NS)
+    checks = xccdf_index.checks
 
     translator = ssg.id_translate.IDTranslator(idname)
 
     oval_linker = ssg.build_renumber.OVALFileLinker(translator, xccdftree,
-                                                    checks)
+                                                    checks, xccdf_index)
     oval_linker.link()
     oval_linker.save_linked_tree()
     oval_linker.link_xccdf()
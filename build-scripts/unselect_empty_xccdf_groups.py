@@ -30,39 +30,89 @@ XCCDF11_NS = ssg.constants.XCCDF11_NS
 TRUE_STRINGS = ["true", "1", "True", "TRUE"]
 
 
-def is_rule_selected(root_element, profile_element, rule_element):
-    rule_id = rule_element.get("id")
-
-    select_state = rule_element.get("selected") in TRUE_STRINGS
-
+def get_profile_selections(profile_element):
+    """
+    Maps IDs referenced by the profile's <select> elements to the selection
+    state, the last <select> of an ID wins.
+    """
+    selections = {}
     for selector in profile_element.findall("./{%s}select" % (XCCDF11_NS)):
-        if selector.get("idref") == rule_id:
-            select_state = selector.get("selected") in TRUE_STRINGS
-
-    return select_state
-
-
-def any_nested_selected_rules(root_element, profile_element, group_element,
-                              group_cache):
-    group_id = group_element.get("id")
-    if group_id in group_cache:
-        return group_cache[group_id]
-
-    for child_group in group_element.findall("./{%s}Group" % (XCCDF11_NS)):
-        if any_nested_selected_rules(
-            root_element, profile_element, child_group,
-            group_cache
-        ):
-            group_cache[group_id] = True
-            return True
-
-    for child_rule in group_element.findall("./{%s}Rule" % (XCCDF11_NS)):
-        if is_rule_selected(root_element, profile_element, child_rule):
-            group_cache[group_id] = True
-            return True
-
-    group_cache[group_id] = False
-    return False
+        selections[selector.get("idref")] = \
+            selector.get("selected") in TRUE_STRINGS
+    return selections
+
+
+def _collect_groups(element, groups_preorder, groups_postorder):
+    for child in element:
+        if child.tag != "{%s}Group" % (XCCDF11_NS):
+            continue
+
+        groups_preorder.append(child)
+        child_groups = []
+        rules = []
+        for grandchild in child:
+            if grandchild.tag == "{%s}Group" % (XCCDF11_NS):
+                child_groups.append(grandchild)
+            elif grandchild.tag == "{%s}Rule" % (XCCDF11_NS):
+                rules.append((grandchild.get("id"),
+                              grandchild.get("selected") in TRUE_STRINGS))
+
+        _collect_groups(child, groups_preorder, groups_postorder)
+        groups_postorder.append((child, child_groups, rules))
+
+
+def get_group_structure(root_element):
+    """
+    Returns groups of the benchmark in document order and, separately,
+    groups with their child groups and rules ordered so that each group
+    comes after all groups nested in it.
+    """
+    groups_preorder = []
+    groups_postorder = []
+    _collect_groups(root_element, groups_preorder, groups_postorder)
+    return groups_preorder, groups_postorder
+
+
+def get_groups_with_selected_rules(groups_postorder, selections):
+    selected_groups = set()
+    for group_element, child_groups, rules in groups_postorder:
+        if any(child in selected_groups for child in child_groups):
+            selected_groups.add(group_element)
+            continue
+
+        for rule_id, default_selected in rules:
+            if selections.get(rule_id, default_selected):
+                selected_groups.add(group_element)
+                break
+    return selected_groups
+
+
+def unselect_groups(profile_element, group_elements):
+    existing_selects = profile_element.findall("./{%s}select" % (XCCDF11_NS))
+
+    # prevent idref duplication
+    selects_by_idref = {}
+    for existing_select in existing_selects:
+        selects_by_idref.setdefault(existing_select.get("idref"), existing_select)
+
+    new_selects = []
+    for group_element in group_elements:
+        group_id = group_element.get("id")
+        select = selects_by_idref.get(group_id)
+        if select is None:
+            select = ssg.xml.ElementTree.Element("{%s}select" % (XCCDF11_NS))
+            selects_by_idref[group_id] = select
+            new_selects.append(select)
+
+        select.set("idref", group_id)
+        select.set("selected", "false")
+        select.tail = "\n"
+
+    index = 0
+    if existing_selects:
+        # insert before the first notice
+        index = list(profile_element).index(existing_selects[-1]) + 1
+    profile_element[index:index] = new_selects
 
 
 def main():
@@ -103,40 +153,16 @@ def main():
     root_element.set("resolved", "0")
 
     affected_profiles = []
-    group_elements = root_element.findall(".//{%s}Group" % (XCCDF11_NS))
+    groups_preorder, groups_postorder = get_group_structure(root_element)
 
     for profile_element in root_element.findall("./{%s}Profile" % (XCCDF11_NS)):
-        # maps group IDs to number of nested selected XCCDF rules
-        group_cache = {}
-
-        for group_element in group_elements:
-            if not any_nested_selected_rules(
-                root_element, profile_element, group_element,
-                group_cache
-            ):
-                existing_selects = \
-                    list(profile_element.findall("./{%s}select" % (XCCDF11_NS)))
-
-                new_select = None
-                for existing_select in existing_selects:
-                    # prevent idref duplication
-                    if existing_select.get("idref") == group_element.get("id"):
-                        new_select = existing_select
-                        break
-
-                if new_select is None:
-                    new_select = \
-                        ssg.xml.ElementTree.Element("{%s}select" % (XCCDF11_NS))
-                    index = 0
-                    if len(existing_selects) > 0:
-                        prev_element = existing_selects[-1]
-                        # insert before the first notice
-                        index = list(profile_element).index(prev_element) + 1
-                    profile_element.insert(index, new_select)
-
-                new_select.set("idref", group_element.get("id"))
-                new_select.set("selected", "false")
-                new_select.tail = "\n"
+        selected_groups = get_groups_with_selected_rules(
+            groups_postorder, get_profile_selections(profile_element))
+
+        unselect_groups(
+            profile_element,
+            [group_element for group_element in groups_preorder
+             if group_element not in selected_groups])
 
         affected_profiles.append(profile_element.get("id"))
 
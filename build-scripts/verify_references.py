@@ -2,6 +2,8 @@
 
 from __future__ import print_function
 
+import collections
+import json
 import sys
 import optparse
 import os.path
@@ -45,8 +47,48 @@ ocil_cs = ssg.constants.ocil_cs
 nist_ref_href = "http://nvlpubs.nist.gov/nistpubs/SpecialPublications/NIST.SP.800-53r4.pdf"
 disa_ref_href = "http://iase.disa.mil/stigs/cci/Pages/index.aspx"
 
-# default exit value - success
-exit_value = 0
+RULE_TAG = "{%s}Rule" % xccdf_ns
+CHECK_TAG = "{%s}check" % xccdf_ns
+CHECK_CONTENT_REF_TAG = "{%s}check-content-ref" % xccdf_ns
+REFERENCE_TAG = "{%s}reference" % xccdf_ns
+PROFILE_TAG = "{%s}Profile" % xccdf_ns
+SELECT_TAG = "{%s}select" % xccdf_ns
+
+# sections of the report, in the order in which they are printed;
+# messages of categories in one section are printed as they were found
+REPORT_SECTIONS = [
+    ["non_oval_check_systems"],
+    ["rules_with_invalid_checks"],
+    ["rules_without_checks"],
+    ["rules_without_severity"],
+    ["rules_without_nistrefs", "rules_without_disarefs"],
+    ["nistrefs_not_in_profile", "disarefs_not_in_profile"],
+    ["ovaldefs_unused"],
+]
+
+REPORT_MESSAGES = {
+    "non_oval_check_systems":
+        "ERROR: Non-OVAL checking system found: %(item)s",
+    "rules_with_invalid_checks":
+        "ERROR: Invalid OVAL definition referenced by XCCDF Rule: %(item)s",
+    "rules_without_checks":
+        "ERROR: No reference to OVAL definition in XCCDF Rule: %(item)s",
+    "rules_without_severity":
+        "ERROR: No severity assigned to XCCDF Rule: %(item)s",
+    "rules_without_nistrefs":
+        "ERROR: No valid NIST reference in XCCDF Rule: %(item)s",
+    "rules_without_disarefs":
+        "ERROR: No valid DISA CCI reference in XCCDF Rule: %(item)s",
+    "nistrefs_not_in_profile":
+        "ERROR: XCCDF Rule found with NIST reference outside Profile %(profile)s: %(item)s",
+    "disarefs_not_in_profile":
+        "ERROR: XCCDF Rule found with DISA CCI reference outside Profile %(profile)s: %(item)s",
+    # Do not treat this as error but only as a warning
+    "ovaldefs_unused":
+        "WARNING: OVAL Check is not referenced by XCCDF: %(item)s",
+}
+
+WARNING_CATEGORIES = set(["ovaldefs_unused"])
 
 
 def parse_options():
@@ -83,6 +125,10 @@ def parse_options():
     parser.add_option("--all-checks", default=False, action="store_true",
                       dest="all_checks",
                       help="perform all checks on the given XCCDF file")
+    parser.add_option("--json-report", default=None, action="store",
+                      dest="json_report",
+                      help="write the findings of the performed checks as "
+                      "JSON to this file")
     (options, args) = parser.parse_args()
     if len(args) < 1:
         parser.print_help()
@@ -90,209 +136,269 @@ def parse_options():
     return (options, args)
 
 
-def get_ovalfiles(checks):
-    global exit_value
-    # Iterate over all checks, grab the OVAL files referenced within
-    ovalfiles = set()
-    for check in checks:
-        if check.get("system") == oval_ns:
-            checkcontentref = check.find("./{%s}check-content-ref" % xccdf_ns)
-            checkcontentref_hrefattr = checkcontentref.get("href")
-            # Include the file in the particular check system only if it's NOT
-            # a remotely located file (to allow OVAL checks to reference http://
-            # and https:// formatted URLs)
-            if not checkcontentref_hrefattr.startswith("http://") and \
-               not checkcontentref_hrefattr.startswith("https://"):
-                ovalfiles.add(checkcontentref_hrefattr)
-        elif check.get("system") != ocil_cs:
-            print("ERROR: Non-OVAL checking system found: %s"
-                  % (check.get("system")))
-            exit_value = 1
-    return ovalfiles
-
-
-def get_profileruleids(xccdftree, profile_name):
-    ruleids = []
-
-    while profile_name:
-        profile = None
-        for el in xccdftree.findall(".//{%s}Profile" % xccdf_ns):
-            if el.get("id") != profile_name:
+def is_remote_href(href):
+    return href.startswith("http://") or href.startswith("https://")
+
+
+class Report(object):
+    """
+    Findings of the performed checks, grouped by their category.
+    """
+
+    def __init__(self):
+        self.findings = collections.OrderedDict()
+        self._sections = []
+        self._category_section = {}
+        for categories in REPORT_SECTIONS:
+            self._sections.append([])
+            for category in categories:
+                self.findings[category] = []
+                self._category_section[category] = self._sections[-1]
+
+    def add(self, category, item):
+        self.findings[category].append(item)
+        self._category_section[category].append((category, item))
+
+    def print_messages(self, profile_name):
+        for section in self._sections:
+            for category, item in section:
+                print(REPORT_MESSAGES[category]
+                      % dict(item=item, profile=profile_name))
+
+    def get_exit_value(self):
+        for category, items in self.findings.items():
+            if items and category not in WARNING_CATEGORIES:
+                return 1
+        return 0
+
+    def write_json(self, fname):
+        with open(fname, "w") as f:
+            json.dump(dict(findings=self.findings,
+                           exit_value=self.get_exit_value()),
+                      f, indent=4)
+
+
+class ReferenceIndex(object):
+    """
+    Index of the XCCDF and OVAL elements the checks of this script work
+    with. Each document is traversed only once.
+    """
+
+    def __init__(self, xccdftree):
+        self.rules = []
+        self.rule_has_check = {}
+        self.rule_ref_hrefs = {}
+        self.checks = []
+        # tuples of <check-content-ref>, its <check> and its Rule
+        self.check_content_refs = []
+        self.profiles = {}
+        self.profile_selects = {}
+
+        self.ovaldef_ids = set()
+        self.ovaldef_ids_extended = set()
+
+        self._index_xccdf(xccdftree.getroot(), None, None, None)
+
+    def _index_xccdf(self, element, rule, check, profile):
+        for child in element:
+            tag = child.tag
+            if tag == RULE_TAG:
+                self.rules.append(child)
+                self.rule_has_check[child] = False
+                self.rule_ref_hrefs[child] = set()
+                self._index_xccdf(child, child, None, profile)
                 continue
-            profile = el
-            break
 
-        if profile is None:
-            sys.exit("Specified XCCDF Profile %s was not found.")
-        for select in profile.findall(".//{%s}select" % xccdf_ns):
-            ruleids.append(select.get("idref"))
-        profile_name = profile.get("extends")
+            if tag == CHECK_TAG:
+                self.checks.append(child)
+                if element is rule:
+                    self.rule_has_check[rule] = True
+                self._index_xccdf(child, rule, child, profile)
+                continue
+
+            if tag == CHECK_CONTENT_REF_TAG:
+                parent_check = element if element is check else None
+                self.check_content_refs.append((child, parent_check, rule))
+            elif tag == REFERENCE_TAG and rule is not None:
+                self.rule_ref_hrefs[rule].add(child.get("href"))
+            elif tag == PROFILE_TAG:
+                self.profiles.setdefault(child.get("id"), child)
+                self.profile_selects[child] = []
+                self._index_xccdf(child, rule, check, child)
+                continue
+            elif tag == SELECT_TAG and profile is not None:
+                self.profile_selects[profile].append(child.get("idref"))
+
+            self._index_xccdf(child, rule, check, profile)
+
+    def index_oval(self, ovaltree):
+        definition_tag = "{%s}definition" % oval_ns
+        extend_definition_tag = "{%s}extend_definition" % oval_ns
+        for el in ovaltree.iter():
+            # collect all compliance checks (not inventory checks, which are
+            # needed by CPE)
+            if el.tag == definition_tag:
+                if el.get("class") == "compliance":
+                    self.ovaldef_ids.add(el.get("id"))
+            elif el.tag == extend_definition_tag:
+                self.ovaldef_ids_extended.add(el.get("definition_ref"))
+
+    def get_ovalfiles(self, report):
+        # Iterate over all checks, grab the OVAL files referenced within
+        ovalfiles = set()
+        for check in self.checks:
+            if check.get("system") == oval_ns:
+                checkcontentref = check.find("./{%s}check-content-ref" % xccdf_ns)
+                checkcontentref_hrefattr = checkcontentref.get("href")
+                # Include the file in the particular check system only if it's NOT
+                # a remotely located file (to allow OVAL checks to reference http://
+                # and https:// formatted URLs)
+                if not is_remote_href(checkcontentref_hrefattr):
+                    ovalfiles.add(checkcontentref_hrefattr)
+            elif check.get("system") != ocil_cs:
+                report.add("non_oval_check_systems", check.get("system"))
+        return ovalfiles
+
+    def get_profileruleids(self, profile_name):
+        ruleids = set()
+
+        while profile_name:
+            profile = self.profiles.get(profile_name)
+            if profile is None:
+                sys.exit("Specified XCCDF Profile %s was not found." % profile_name)
+            ruleids.update(self.profile_selects[profile])
+            profile_name = profile.get("extends")
+
+        return ruleids
+
+
+def find_rules_with_invalid_checks(index, report):
+    for check_content_ref, check, rule in index.check_content_refs:
+        # Skip those <check-content-ref> elements using OCIL as the checksystem
+        # (since we are checking just referenced OVAL definitions)
+        if check is not None and check.get("system") == ocil_cs:
+            continue
+
+        # Don't attempt to obtain refname on <check-content-ref> element
+        # having its "href" attribute set either to "http://" or to
+        # "https://" values (since the "name" attribute will be empty for
+        # these two cases)
+        if is_remote_href(check_content_ref.get("href")):
+            continue
+
+        if check_content_ref.get("name") not in index.ovaldef_ids:
+            report.add("rules_with_invalid_checks", rule.get("id"))
+
+
+def check_rules(index, rules, profile_ruleids, options, report):
+    """
+    Runs all checks of individual rules during a single pass over them.
+    Rules outside the profile are looked for only if profile_ruleids
+    isn't None.
+    """
+    check_checks = options.rules_without_checks or options.all_checks
+    check_severity = options.rules_without_severity or options.all_checks
+    selected_rules = set(rules)
+
+    for rule in index.rules:
+        rule_id = rule.get("id")
+        ref_hrefs = index.rule_ref_hrefs[rule]
+
+        if profile_ruleids is not None and rule_id not in profile_ruleids:
+            # print warning if Rule is outside Profile and has a NIST reference
+            if options.nistrefs_not_in_profile and nist_ref_href in ref_hrefs:
+                report.add("nistrefs_not_in_profile", rule_id)
+            # print warning if Rule is outside Profile and has a DISA reference
+            if options.disarefs_not_in_profile and disa_ref_href in ref_hrefs:
+                report.add("disarefs_not_in_profile", rule_id)
+
+        if rule not in selected_rules:
+            continue
 
-    return ruleids
+        if check_checks and not index.rule_has_check[rule]:
+            report.add("rules_without_checks", rule_id)
+        if check_severity and rule.get("severity") is None:
+            report.add("rules_without_severity", rule_id)
+        # print warning if rule does not have a NIST reference
+        if options.rules_without_nistrefs and nist_ref_href not in ref_hrefs:
+            report.add("rules_without_nistrefs", rule_id)
+        # print warning if rule does not have a DISA reference
+        if options.rules_without_disarefs and disa_ref_href not in ref_hrefs:
+            report.add("rules_without_disarefs", rule_id)
+
+
+def find_unused_ovaldefs(index, report):
+    # the OVAL compliance checks that are not referenced by any XCCDF rule
+    referenced_names = set(
+        check_content_ref.get("name")
+        for check_content_ref, _, _ in index.check_content_refs)
+    for oval_id in sorted(index.ovaldef_ids - referenced_names):
+        # don't print out the OVAL defs that are extended by others,
+        # as they're not unused
+        if oval_id not in index.ovaldef_ids_extended:
+            report.add("ovaldefs_unused", oval_id)
+
+
+def finish(report, options, message=None):
+    """
+    Print the findings, write the JSON report if requested and exit. If
+    the script can't go on, message is the error it stops with.
+    """
+    report.print_messages(options.profile_name)
+    if options.json_report:
+        report.write_json(options.json_report)
+    if message is not None:
+        sys.exit(message)
+    sys.exit(report.get_exit_value())
 
 
 def main():
-    global exit_value
     (options, args) = parse_options()
     xccdffilename = args[0]
 
-    # extract all of the rules within the xccdf
+    # index all of the rules and checks within the xccdf
     xccdftree = ssg.xml.ElementTree.parse(xccdffilename)
-    rules = xccdftree.findall(".//{%s}Rule" % xccdf_ns)
+    index = ReferenceIndex(xccdftree)
+    report = Report()
 
     # if a profile was specified, get rid of any Rules that aren't in it
+    rules = index.rules
+    profile_ruleids = None
     if options.profile_name:
-        profile_ruleids = get_profileruleids(xccdftree, options.profile_name)
-        prunedrules = rules[:]
-        for rule in rules:
-            if rule.get("id") not in profile_ruleids:
-                prunedrules.remove(rule)
-        rules = prunedrules
+        profile_ruleids = index.get_profileruleids(options.profile_name)
+        rules = [rule for rule in rules if rule.get("id") in profile_ruleids]
 
     # step over xccdf file, and find referenced oval files
-    checks = xccdftree.findall(".//{%s}check" % xccdf_ns)
-    ovalfiles = get_ovalfiles(checks)
+    ovalfiles = index.get_ovalfiles(report)
 
     # this script only supports the inclusion of one OVAL file
     if len(ovalfiles) > 1:
-        sys.exit("Referencing more than one OVAL file is not yet " +
-                 "supported by this script.")
+        finish(report, options, "Referencing more than one OVAL file is not yet " +
+               "supported by this script.")
 
-    # find important elements within the XCCDF and the OVAL
+    # find important elements within the OVAL
     ovalfile = os.path.join(os.path.dirname(xccdffilename), ovalfiles.pop())
-    ovaltree = ssg.xml.ElementTree.parse(ovalfile)
-    # collect all compliance checks (not inventory checks, which are
-    # needed by CPE)
-    ovaldefs = []
-    for el in ovaltree.findall(".//{%s}definition" % oval_ns):
-        if el.get("class") != "compliance":
-            continue
-
-        ovaldefs.append(el)
-
-    ovaldef_ids = [ovaldef.get("id") for ovaldef in ovaldefs]
-
-    oval_extenddefs = ovaltree.findall(".//{%s}extend_definition" % oval_ns)
-    ovaldef_ids_extended = [oval_extenddef.get("definition_ref") for oval_extenddef in oval_extenddefs]
-    ovaldef_ids_extended = list(set(ovaldef_ids_extended))
+    index.index_oval(ssg.xml.ElementTree.parse(ovalfile))
 
-    check_content_refs = xccdftree.findall(".//{%s}check-content-ref"
-                                           % xccdf_ns)
-
-    xccdf_parent_map = dict((c, p) for p in xccdftree.getiterator() for c in p)
     # now we can actually do the verification work here
     if options.rules_with_invalid_checks or options.all_checks:
-        for check_content_ref in check_content_refs:
-
-            # Skip those <check-content-ref> elements using OCIL as the checksystem
-            # (since we are checking just referenced OVAL definitions)
-            if xccdf_parent_map[check_content_ref].get("system") == ocil_cs:
-                continue
+        find_rules_with_invalid_checks(index, report)
 
-            # Obtain the value of the 'href' attribute of particular
-            # <check-content-ref> element
-            check_content_ref_href_attr = check_content_ref.get("href")
+    if options.disarefs_not_in_profile or options.nistrefs_not_in_profile:
+        if not options.profile_name:
+            finish(report, options,
+                   "The options for finding Rules with a reference, "
+                   "but which are not in a Profile, requires specifying a Profile.")
+    else:
+        profile_ruleids = None
 
-            # Don't attempt to obtain refname on <check-content-ref> element
-            # having its "href" attribute set either to "http://" or to
-            # "https://" values (since the "name" attribute will be empty for
-            # these two cases)
-            if check_content_ref_href_attr.startswith("http://") or \
-               check_content_ref_href_attr.startswith("https://"):
-                continue
+    check_rules(index, rules, profile_ruleids, options, report)
 
-            refname = check_content_ref.get("name")
-            if refname not in ovaldef_ids:
-                rule = xccdf_parent_map[
-                    xccdf_parent_map[check_content_ref]
-                ]
-                print("ERROR: Invalid OVAL definition referenced by XCCDF Rule: %s"
-                      % (rule.get("id")))
-                exit_value = 1
-
-    if options.rules_without_checks or options.all_checks:
-        for rule in rules:
-            check = rule.find("./{%s}check" % xccdf_ns)
-            if check is None:
-                print("ERROR: No reference to OVAL definition in XCCDF Rule: %s"
-                      % (rule.get("id")))
-                exit_value = 1
-
-    if options.rules_without_severity or options.all_checks:
-        for rule in rules:
-            if rule.get("severity") is None:
-                print("ERROR: No severity assigned to XCCDF Rule: %s"
-                      % (rule.get("id")))
-                exit_value = 1
-
-    if options.rules_without_nistrefs or options.rules_without_disarefs or options.all_checks:
-        for rule in rules:
-            # find all references in the current rule
-            refs = rule.findall(".//{%s}reference" % xccdf_ns)
-            if refs is None:
-                print("ERROR: No reference assigned to XCCDF Rule: %s"
-                      % (rule.get("id")))
-                exit_value = 1
-            else:
-                # loop through the Rule's references and put their hrefs
-                # in a list
-                ref_href_list = [ref.get("href") for ref in refs]
-                # print warning if rule does not have a NIST reference
-                if (not nist_ref_href in ref_href_list) and options.rules_without_nistrefs:
-                    print("ERROR: No valid NIST reference in XCCDF Rule: " +
-                          rule.get("id"))
-                    exit_value = 1
-                # print warning if rule does not have a DISA reference
-                if (not disa_ref_href in ref_href_list) and options.rules_without_disarefs:
-                    print("ERROR: No valid DISA CCI reference in XCCDF Rule: " +
-                          rule.get("id"))
-                    exit_value = 1
+    if options.ovaldefs_unused or options.all_checks:
+        find_unused_ovaldefs(index, report)
 
-    if options.disarefs_not_in_profile or options.nistrefs_not_in_profile:
-        if options.profile_name is None:
-            sys.exit("The options for finding Rules with a reference, "
-                     "but which are not in a Profile, requires specifying a Profile.")
-        allrules = xccdftree.findall(".//{%s}Rule" % xccdf_ns)
-        for rule in allrules:
-            # find all references in the current rule
-            refs = rule.findall(".//{%s}reference" % xccdf_ns)
-            ref_href_list = [ref.get("href") for ref in refs]
-            # print warning if Rule is outside Profile and has a NIST reference
-            if options.nistrefs_not_in_profile:
-                if (nist_ref_href in ref_href_list) and (rule.get("id") not in profile_ruleids):
-                    print("ERROR: XCCDF Rule found with NIST reference outside Profile %s: "
-                           % options.profile_name + rule.get("id"))
-                    exit_value = 1
-            # print warning if Rule is outside Profile and has a DISA reference
-            if options.disarefs_not_in_profile:
-                if (disa_ref_href in ref_href_list) and (rule.get("id") not in profile_ruleids):
-                    print("ERROR: XCCDF Rule found with DISA CCI reference outside Profile %s: "
-                           % options.profile_name + rule.get("id"))
-                    exit_value = 1
+    finish(report, options)
 
-    if options.ovaldefs_unused or options.all_checks:
-        # create a list of all of the OVAL compliance check ids that are
-        # defined in the oval file
-        oval_checks_list = [ovaldef.get("id") for ovaldef in ovaldefs]
-        # now loop through the xccdf rules; if a rule references an oval check
-        # we remove the oval check from our list
-        for check_content in check_content_refs:
-            # remove from the list
-            if check_content.get("name") in oval_checks_list:
-                oval_checks_list.remove(check_content.get("name"))
-        # the list should now contain the OVAL checks that are not referenced
-        # by any XCCDF rule
-        oval_checks_list.sort()
-        for oval_id in oval_checks_list:
-            # don't print out the OVAL defs that are extended by others,
-            # as they're not unused
-            if oval_id not in ovaldef_ids_extended:
-                print("WARNING: OVAL Check is not referenced by XCCDF: %s"
-                      % (oval_id))
-                # Do not treat this as error but only as a warning
-                #exit_value = 1
-
-    sys.exit(exit_value)
 
 if __name__ == "__main__":
     main()
@@ -34,6 +34,11 @@ def parse_args():
     parser.add_argument("--output", required=True,
                         help="Output XCCDF shorthand file. "
                         "e.g.: /tmp/shorthand.xml")
+    parser.add_argument("-j", "--jobs", type=int, action="store",
+                        default=1,
+                        help="how many processes should load the YAML files "
+                        "in parallel, the default is 1 as the build system "
+                        "runs the products in parallel already")
     parser.add_argument("action",
                         choices=["build", "list-inputs", "list-outputs"],
                         help="Which action to perform.")
@@ -63,7 +68,7 @@ def main():
 
     ssg.build_yaml.add_from_directory(args.action, None, benchmark_root,
                                       profiles_root, args.bash_remediation_fns,
-                                      args.output, env_yaml)
+                                      args.output, env_yaml, args.jobs)
 
 
 if __name__ == "__main__":
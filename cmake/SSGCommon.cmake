@@ -220,9 +220,8 @@ macro(_ssg_build_remediations_for_language PRODUCT LANGUAGES)
 
     add_custom_command(
         OUTPUT ${LANGUAGE_REMEDIATIONS_OUTPUTS}
-        # We have to remove the entire dir to avoid keeping remediations when user removes something from the CSV
-        COMMAND "${CMAKE_COMMAND}" -E remove_directory "${BUILD_REMEDIATIONS_DIR}"
-        COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/generate_from_templates.py" --languages ${LANGUAGES} --input "${CMAKE_CURRENT_SOURCE_DIR}/templates" "${SSG_SHARED}/templates" --output "${BUILD_REMEDIATIONS_DIR}" "${BUILD_REMEDIATIONS_DIR}/shared" --shared "${SSG_SHARED}" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" build
+        # The manifest kept by --incremental removes remediations when user removes something from the CSV
+        COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/generate_from_templates.py" --languages ${LANGUAGES} --input "${CMAKE_CURRENT_SOURCE_DIR}/templates" "${SSG_SHARED}/templates" --output "${BUILD_REMEDIATIONS_DIR}" "${BUILD_REMEDIATIONS_DIR}/shared" --shared "${SSG_SHARED}" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" --incremental build
         DEPENDS generate-internal-bash-remediation-functions.xml
         DEPENDS "${CMAKE_BINARY_DIR}/bash-remediation-functions.xml"
         DEPENDS ${LANGUAGE_REMEDIATIONS_DEPENDS}
@@ -235,25 +234,30 @@ macro(_ssg_build_remediations_for_language PRODUCT LANGUAGES)
         generate-internal-language-remedations-${PRODUCT}
         DEPENDS ${LANGUAGE_REMEDIATIONS_OUTPUTS}
     )
+    set(LANGUAGE_FIXES_OUTPUTS)
     foreach(LANGUAGE ${LANGUAGES})
-      file(GLOB EXTRA_LANGUAGE_DEPENDS "${CMAKE_CURRENT_SOURCE_DIR}/fixes/${LANGUAGE}/*")
-      file(GLOB EXTRA_SHARED_LANGUAGE_DEPENDS "${SSG_SHARED}/fixes/${LANGUAGE}/*")
-
-      add_custom_command(
-          OUTPUT "${CMAKE_CURRENT_BINARY_DIR}/${LANGUAGE}-fixes.xml"
-          COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/combine_remediations.py" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" --remediation_type "${LANGUAGE}" --build_dir "${CMAKE_BINARY_DIR}" --output "${CMAKE_CURRENT_BINARY_DIR}/${LANGUAGE}-fixes.xml" "${BUILD_REMEDIATIONS_DIR}/shared/${LANGUAGE}" "${SSG_SHARED}/fixes/${LANGUAGE}" "${BUILD_REMEDIATIONS_DIR}/${LANGUAGE}" "${CMAKE_CURRENT_SOURCE_DIR}/fixes/${LANGUAGE}"
-          DEPENDS ${LANGUAGE_REMEDIATIONS_DEPENDS}
-          DEPENDS ${LANGUAGE_REMEDIATIONS_OUTPUTS}
-          DEPENDS ${EXTRA_LANGUAGE_DEPENDS}
-          DEPENDS ${EXTRA_SHARED_LANGUAGE_DEPENDS}
-          DEPENDS "${SSG_BUILD_SCRIPTS}/combine_remediations.py"
-          DEPENDS generate-internal-language-remedations-${PRODUCT}
-          COMMENT "[${PRODUCT}-content] generating ${LANGUAGE}-fixes.xml"
-      )
-      add_custom_target(
-          generate-internal-${PRODUCT}-${LANGUAGE}-fixes.xml
-          DEPENDS "${CMAKE_CURRENT_BINARY_DIR}/${LANGUAGE}-fixes.xml"
-      )
+        list(APPEND LANGUAGE_FIXES_OUTPUTS "${CMAKE_CURRENT_BINARY_DIR}/${LANGUAGE}-fixes.xml")
+    endforeach()
+
+    # All languages are combined by one invocation, it walks the guide only once
+    add_custom_command(
+        OUTPUT ${LANGUAGE_FIXES_OUTPUTS}
+        COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/combine_remediations.py" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" --remediation_type ${LANGUAGES} --build_dir "${CMAKE_BINARY_DIR}" --output-dir "${CMAKE_CURRENT_BINARY_DIR}" "${BUILD_REMEDIATIONS_DIR}/shared" "${SSG_SHARED}/fixes" "${BUILD_REMEDIATIONS_DIR}" "${CMAKE_CURRENT_SOURCE_DIR}/fixes"
+        DEPENDS ${LANGUAGE_REMEDIATIONS_DEPENDS}
+        DEPENDS ${LANGUAGE_REMEDIATIONS_OUTPUTS}
+        DEPENDS ${EXTRA_DEPENDS}
+        DEPENDS ${EXTRA_SHARED_DEPENDS}
+        DEPENDS "${SSG_BUILD_SCRIPTS}/combine_remediations.py"
+        DEPENDS generate-internal-language-remedations-${PRODUCT}
+        COMMENT "[${PRODUCT}-content] generating fixes: ${LANGUAGES}"
+    )
+    add_custom_target(
+        generate-internal-${PRODUCT}-fixes
+        DEPENDS ${LANGUAGE_FIXES_OUTPUTS}
+    )
+    foreach(LANGUAGE ${LANGUAGES})
+      add_custom_target(generate-internal-${PRODUCT}-${LANGUAGE}-fixes.xml)
+      add_dependencies(generate-internal-${PRODUCT}-${LANGUAGE}-fixes.xml generate-internal-${PRODUCT}-fixes)
     endforeach()
 endmacro()
 
@@ -334,10 +338,8 @@ macro(ssg_build_oval_unlinked PRODUCT)
     add_custom_command(
         OUTPUT "${CMAKE_CURRENT_BINARY_DIR}/oval-unlinked.xml"
         OUTPUT ${OVAL_CHECKS_OUTPUTS}
-        # We have to remove all old checks in case the user removed something from the CSV files
-        COMMAND "${CMAKE_COMMAND}" -E remove_directory "${BUILD_CHECKS_DIR}/oval"
-        COMMAND "${CMAKE_COMMAND}" -E remove_directory "${BUILD_CHECKS_DIR}/shared/oval"
-        COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/generate_from_templates.py" --languages oval --input "${CMAKE_CURRENT_SOURCE_DIR}/templates" "${SSG_SHARED}/templates" --output "${BUILD_CHECKS_DIR}" "${BUILD_CHECKS_DIR}/shared" --shared "${SSG_SHARED}" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" build
+        # The manifest kept by --incremental removes old checks in case the user removed something from the CSV files
+        COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/generate_from_templates.py" --languages oval --input "${CMAKE_CURRENT_SOURCE_DIR}/templates" "${SSG_SHARED}/templates" --output "${BUILD_CHECKS_DIR}" "${BUILD_CHECKS_DIR}/shared" --shared "${SSG_SHARED}" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" --incremental build
         COMMAND env "PYTHONPATH=$ENV{PYTHONPATH}" "${PYTHON_EXECUTABLE}" "${SSG_BUILD_SCRIPTS}/combine_ovals.py" --build-config-yaml "${CMAKE_BINARY_DIR}/build_config.yml" --product-yaml "${CMAKE_CURRENT_SOURCE_DIR}/product.yml" --output "${CMAKE_CURRENT_BINARY_DIR}/oval-unlinked.xml" ${OVAL_COMBINE_PATHS}
         COMMAND "${XMLLINT_EXECUTABLE}" --format --output "${CMAKE_CURRENT_BINARY_DIR}/oval-unlinked.xml" "${CMAKE_CURRENT_BINARY_DIR}/oval-unlinked.xml"
         DEPENDS ${OVAL_CHECKS_DEPENDS}
@@ -44,6 +44,14 @@ class FilesGenerator(object):
         self.delimiter = ','
         self.reset()
         self.env_yaml = {}
+        # When set, outputs that are up to date according to the manifest
+        # are not generated again, see ssg.build_templates.TemplatesManifest
+        self.manifest = None
+        self.csv_source = None
+        # When set, outputs are appended to it as (output_filepath,
+        # template_filepath, constants) tasks instead of being generated,
+        # see ssg.build_templates.render_templates
+        self.render_tasks = None
 
     def reset(self):
         self.files = []
@@ -96,6 +104,16 @@ class FilesGenerator(object):
             self.files.append(output_filepath)
             return
 
+        if self.manifest is not None and self.manifest.add_output(
+                output_filepath, template_filepath, constants, self.env_yaml,
+                self.csv_source):
+            return
+
+        if self.render_tasks is not None:
+            self.render_tasks.append(
+                (output_filepath, template_filepath, constants))
+            return
+
         try:
             jinja_dict = ssg.utils.merge_dicts(self.env_yaml, constants)
             filled_template = ssg.jinja.process_file(template_filepath,
@@ -154,6 +172,7 @@ class FilesGenerator(object):
 
             try:
                 for csv_line in csv_lines_content:
+                    self.csv_source = (filename, language, csv_line)
                     self.generate(language, csv_line)
 
             except UnknownTargetError as e:
@@ -19,21 +19,51 @@
 # Authors:
 #      Martin Preisler <mpreisle@redhat.com>
 
+import collections
 import logging
-from xml.etree import cElementTree as ElementTree
 import json
 import sys
 import os
-import copy
 
 import ssg.constants
+from ssg.xml import ElementTree
 
 XCCDF_NAMESPACE = ssg.constants.XCCDF12_NS
 FILENAME = "PCI_DSS_v3.pdf"
 REMOTE_URL = "https://www.pcisecuritystandards.org/documents/PCI_DSS_v3-1.pdf"
 
 
-def construct_xccdf_group(id_, desc, children, rules, rule_usage_map):
+def get_requirement_rules(rules):
+    """
+    Maps texts of PCI-DSS references, e.g. "Req-1.1.1", to the rules
+    referencing them, in the order of the rules.
+    """
+    requirement_rules = collections.defaultdict(list)
+    for rule in rules:
+        rule_requirements = set()
+        for ref in rule.findall("./{%s}reference" % (XCCDF_NAMESPACE)):
+            if ref.get("href") != REMOTE_URL or ref.text in rule_requirements:
+                continue
+            rule_requirements.add(ref.text)
+            requirement_rules[ref.text].append(rule)
+    return requirement_rules
+
+
+def copy_rule(rule, id_):
+    """
+    Returns a shallow copy of the rule with a different ID. The children are
+    shared with the original rule, they are never modified.
+    """
+    copied_rule = ElementTree.Element(rule.tag, dict(rule.attrib))
+    copied_rule.text = rule.text
+    copied_rule.tail = rule.tail
+    copied_rule.extend(list(rule))
+    copied_rule.set("id", id_)
+    return copied_rule
+
+
+def construct_xccdf_group(id_, desc, children, requirement_rules,
+                          rule_usage_map):
     ret = ElementTree.Element("{%s}Group" % (XCCDF_NAMESPACE))
     ret.set("id", ssg.constants.OSCAP_GROUP_PCIDSS + "-%s" % (id_))
     ret.set("selected", "true")
@@ -44,30 +74,21 @@ def construct_xccdf_group(id_, desc, children, rules, rule_usage_map):
     description.text = desc
     ret.append(description)
 
-    for rule in rules:
-        pci_dss_req_related = False
-        for ref in rule.findall("./{%s}reference" % (XCCDF_NAMESPACE)):
-            if ref.get("href") == REMOTE_URL and \
-                    ref.text == "Req-" + id_:
-                pci_dss_req_related = True
-                break
-
-        if pci_dss_req_related:
-            suffix = ""
-            if rule.get("id") not in rule_usage_map:
-                rule_usage_map[rule.get("id")] = 1
-            else:
-                rule_usage_map[rule.get("id")] += 1
-                suffix = "_%i" % (rule_usage_map[rule.get("id")])
-
-            copied_rule = copy.deepcopy(rule)
-            copied_rule.set("id", rule.get("id") + suffix)
-            ret.append(copied_rule)
+    for rule in requirement_rules.get("Req-" + id_, []):
+        if rule.get("id") not in rule_usage_map:
+            # the rule is no longer part of the benchmark, the first use
+            # can take the original element
+            rule_usage_map[rule.get("id")] = 1
+            ret.append(rule)
+        else:
+            rule_usage_map[rule.get("id")] += 1
+            suffix = "_%i" % (rule_usage_map[rule.get("id")])
+            ret.append(copy_rule(rule, rule.get("id") + suffix))
 
     for child_id, child_desc, child_children in children:
         child_element = construct_xccdf_group(
             child_id, child_desc, child_children,
-            rules, rule_usage_map
+            requirement_rules, rule_usage_map
         )
         ret.append(child_element)
 
@@ -89,41 +110,25 @@ def main():
 
     benchmark = ElementTree.parse(sys.argv[2])
 
-    rules = []
-    for rule in \
-            benchmark.findall(".//{%s}Rule" % (XCCDF_NAMESPACE)):
-        rules.append(rule)
+    root_element = benchmark.getroot()
+    rules = list(root_element.iter("{%s}Rule" % (XCCDF_NAMESPACE)))
+    values = list(root_element.iter("{%s}Value" % (XCCDF_NAMESPACE)))
     rule_usage_map = {}
 
-    # only PCI-DSS related rules in that list, to speed-up processing
-    filtered_rules = []
-    for rule in rules:
-        for ref in rule.findall("./{%s}reference" % (XCCDF_NAMESPACE)):
-            if ref.get("href") == REMOTE_URL:
-                filtered_rules.append(rule)
-                break
-
-    values = []
-    for value in \
-            benchmark.findall(".//{%s}Value" % (XCCDF_NAMESPACE)):
-        values.append(value)
-
-    parent_map = dict((c, p) for p in benchmark.getiterator() for c in p)
-    for rule in \
-            benchmark.findall(".//{%s}Rule" % (XCCDF_NAMESPACE)):
-        parent_map[rule].remove(rule)
-    for value in \
-            benchmark.findall(".//{%s}Value" % (XCCDF_NAMESPACE)):
-        parent_map[value].remove(value)
-    for group in \
-            benchmark.findall(".//{%s}Group" % (XCCDF_NAMESPACE)):
-        parent_map[group].remove(group)
+    # only PCI-DSS related rules are in the buckets
+    requirement_rules = get_requirement_rules(rules)
+
+    # Rules, Values and Groups are children of the Benchmark or of Groups,
+    # removing them from the Benchmark removes all of them
+    removed_tags = set(["{%s}%s" % (XCCDF_NAMESPACE, tag)
+                        for tag in ("Rule", "Value", "Group")])
+    root_element[:] = [child for child in root_element
+                       if child.tag not in removed_tags]
 
-    root_element = benchmark.getroot()
     for id_, desc, children in id_tree:
         element = \
             construct_xccdf_group(id_, desc, children,
-                                  filtered_rules, rule_usage_map)
+                                  requirement_rules, rule_usage_map)
         root_element.append(element)
 
     if len(values) > 0:
@@ -137,9 +142,8 @@ def main():
         description.text = "Group of values used in PCI-DSS profile"
         group.append(description)
 
-        for value in values:
-            copied_value = copy.deepcopy(value)
-            group.append(copied_value)
+        # the values are no longer part of the benchmark, no need to copy them
+        group.extend(values)
 
         root_element.append(group)
 
@@ -176,9 +180,8 @@ def main():
         description.text = "Rules that are not part of PCI-DSS"
         group.append(description)
 
-        for rule in unused_rules:
-            copied_rule = copy.deepcopy(rule)
-            group.append(copied_rule)
+        # unused rules are no longer part of the benchmark either
+        group.extend(unused_rules)
 
         root_element.append(group)
 
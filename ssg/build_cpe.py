@@ -5,6 +5,30 @@ Common functions for building CPEs
 from __future__ import absolute_import
 from __future__ import print_function
 
+import itertools
+import os
+import sys
+
+from .constants import oval_namespace as oval_ns
+from .constants import OVALREFATTR_TO_TAG
+from .id_translate import IDTranslator
+from .parse_oval import CONTAINER_GROUPS, get_container_groups_from_root
+from .xml import ElementTree, parse_file
+
+cpe_ns = "http://cpe.mitre.org/dictionary/2.0"
+
+SSG_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Attributes referring to OVAL entities, mapped to their container groups
+OVAL_REF_ATTR_TO_GROUP = dict(
+    (attr, tag + "s") for attr, tag in OVALREFATTR_TO_TAG.items())
+
+# Elements whose text refers to an OVAL entity
+OVAL_TEXT_REF_TAG_TO_GROUP = {
+    "{%s}filter" % oval_ns: "states",
+    "{%s#independent}var_ref" % oval_ns: "variables",
+}
+
 
 def extract_subelement(objects, sub_elem_type):
     """
@@ -17,7 +41,7 @@ def extract_subelement(objects, sub_elem_type):
     """
 
     for obj in objects:
-        for subelement in obj.getiterator():
+        for subelement in obj.iter():
             if subelement.get(sub_elem_type):
                 sub_element = subelement.get(sub_elem_type)
                 return sub_element
@@ -41,16 +65,177 @@ def extract_referred_nodes(tree_with_refs, tree_with_ids, attrname):
     from tree_with_refs via the element attribute 'attrname'.
     """
 
-    reflist = []
+    reflist = set()
     elementlist = []
 
-    for element in tree_with_refs.getiterator():
+    for element in tree_with_refs.iter():
         value = element.get(attrname)
         if value is not None:
-            reflist.append(value)
+            reflist.add(value)
 
-    for element in tree_with_ids.getiterator():
+    for element in tree_with_ids.iter():
         if element.get("id") in reflist:
             elementlist.append(element)
 
     return elementlist
+
+
+def extract_referred_entities(element):
+    """
+    Return (container group, ID) tuples of OVAL entities referenced
+    from the subtree of element.
+    """
+
+    refs = set()
+    for subelement in element.iter():
+        group_name = OVAL_TEXT_REF_TAG_TO_GROUP.get(subelement.tag)
+        if group_name is not None:
+            refs.add((group_name, subelement.text))
+        for attr, value in subelement.items():
+            group_name = OVAL_REF_ATTR_TO_GROUP.get(attr)
+            if group_name is not None:
+                refs.add((group_name, value))
+    return refs
+
+
+def get_referred_closure(oval_groups, entities):
+    """
+    Return the (container group, ID) tuples of given OVAL entities and of all
+    entities they reference, directly or through other entities.
+
+    Every entity is examined only once, references to entities missing
+    in oval_groups are ignored.
+    """
+
+    closure = set()
+    queue = list(entities)
+    while queue:
+        entity = queue.pop()
+        if entity in closure:
+            continue
+        group_name, entity_id = entity
+        element = oval_groups.get(group_name, {}).get(entity_id)
+        if element is None:
+            continue
+        closure.add(entity)
+        queue.extend(extract_referred_entities(element) - closure)
+    return closure
+
+
+class FileNameIndex(object):
+    """
+    Names of files below the given directories. The directories are walked
+    lazily, only as far as needed to find the names looked up so far.
+    """
+
+    def __init__(self, directories):
+        self._walks = itertools.chain.from_iterable(
+            os.walk(directory) for directory in directories)
+        self._names = set()
+
+    def __contains__(self, name):
+        if name in self._names:
+            return True
+        for dirpath, dirnames, filenames in self._walks:
+            self._names.update(filenames)
+            if name in filenames:
+                return True
+        return False
+
+
+def generate_cpe_files(product, idname, cpe_out_dir, oval_file, cpe_dict_file,
+                       oval_search_dir=os.curdir):
+    """
+    Extract inventory definitions and the tests, states, objects and variables
+    they reference from oval_file and write them into a standalone OVAL CPE
+    file in cpe_out_dir, along with a CPE dictionary synchronized with it.
+
+    CPE checks referring to other OVAL files are checked to exist below
+    oval_search_dir or the SSG root directory.
+    """
+
+    # parse oval file
+    ovaltree = parse_file(oval_file)
+    oval_groups = get_container_groups_from_root(ovaltree)
+
+    # extract inventory definitions
+    # making (dubious) assumption that all inventory defs are CPE
+    # Keep the list of 'id' attributes from untranslated inventory def elements
+    inventory_defs_id_attrs = []
+    defs = ovaltree.find("./{%s}definitions" % oval_ns)
+    for el in defs:
+        if el.get("class") != "inventory":
+            continue
+        inventory_defs_id_attrs.append(el.get("id"))
+    inventory_defs_ids = set(inventory_defs_id_attrs)
+
+    # keep only the inventory definitions and the entities they need
+    cpe_entities = get_referred_closure(
+        oval_groups,
+        [("definitions", def_id) for def_id in inventory_defs_id_attrs])
+    for container in list(ovaltree):
+        group_name = container.tag.split("}", 1)[-1]
+        if group_name not in CONTAINER_GROUPS:
+            continue
+        cpe_elements = [
+            el for el in container if (group_name, el.get("id")) in cpe_entities]
+        if cpe_elements or container is defs:
+            container[:] = cpe_elements
+        else:
+            ovaltree.remove(container)
+
+    # turn IDs into meaningless numbers
+    translator = IDTranslator(idname)
+    ovaltree = translator.translate(ovaltree)
+
+    newovalfile = idname + "-" + product + "-" + os.path.basename(oval_file)
+    newovalfile = newovalfile.replace("oval-unlinked", "cpe-oval")
+    ElementTree.ElementTree(ovaltree).write(cpe_out_dir + "/" + newovalfile)
+
+    # replace and sync IDs, href filenames in input cpe dictionary file
+    cpedicttree = parse_file(cpe_dict_file)
+    newcpedictfile = idname + "-" + os.path.basename(cpe_dict_file)
+    oval_file_names = FileNameIndex([oval_search_dir, SSG_DIR])
+    for check in cpedicttree.findall(".//{%s}check" % cpe_ns):
+        checkhref = check.get("href")
+        # If CPE OVAL references another OVAL file
+        if checkhref == 'filename':
+            # Sanity check -- Verify the referenced OVAL is truly defined
+            # somewhere in the (sub)directory tree below CWD. In correct
+            # scenario is should be located:
+            # * either in input/oval/*.xml
+            # * or copied by former run of "combine_ovals.py" script from
+            #   shared/ directory into build/ subdirectory
+            refovalfilename = check.text
+            refovalfilefound = refovalfilename + ".xml" in oval_file_names
+
+            # Referenced OVAL doesn't exist in the subdirtree below CWD:
+            # * there's either typo in the refenced OVAL filename, or
+            # * is has been forgotten to be placed into input/oval, or
+            # * the <platform> tag of particular shared/ OVAL wasn't modified
+            #   to include the necessary referenced file.
+            # Therefore display an error and exit with failure in such cases
+            if not refovalfilefound:
+                error_msg = "\n\tError: Can't locate \"%s\" OVAL file in the \
+                \n\tlist of OVAL checks for this product! Exiting..\n" % refovalfilename
+                sys.stderr.write(error_msg)
+                # sys.exit(1)
+        check.set("href", os.path.basename(newovalfile))
+
+        # Sanity check to verify if inventory check OVAL id is present in the
+        # list of known "id" attributes of inventory definitions. If not it
+        # means provided ovalfile (sys.argv[1]) doesn't contain this OVAL
+        # definition (it wasn't included due to <platform> tag restrictions)
+        # Therefore display an error and exit with failure, since otherwise
+        # we might end up creating invalid $(ID)-$(PROD)-cpe-oval.xml file
+        if check.text not in inventory_defs_ids:
+            error_msg = "\n\tError: Can't locate \"%s\" definition in \"%s\". \
+            \n\tEnsure <platform> element is configured properly for \"%s\".  \
+            \n\tExiting..\n" % (check.text, oval_file, check.text)
+            sys.stderr.write(error_msg)
+            # sys.exit(1)
+
+        # Referenced OVAL checks passed both of the above sanity tests
+        check.text = translator.generate_id("{" + oval_ns + "}definition", check.text)
+
+    ElementTree.ElementTree(cpedicttree).write(cpe_out_dir + '/' + newcpedictfile)
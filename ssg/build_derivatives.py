@@ -10,35 +10,76 @@ from .xml import ElementTree
 from .constants import standard_profiles, OSCAP_VENDOR
 
 
+def _find_rules_and_platform_parents(elem, namespace, mapping):
+    """
+    Returns XCCDF rules and parents of platforms which have a derivative
+    CPE in mapping, in a single traversal of elem.
+    """
+    rule_tag = "{%s}Rule" % (namespace)
+    platform_tag = "{%s}platform" % (namespace)
+
+    rules = []
+    platform_parents = []
+    for element in elem.iter():
+        if element.tag == rule_tag:
+            rules.append(element)
+        for child in element:
+            if child.tag == platform_tag and child.get("idref") in mapping:
+                platform_parents.append(element)
+                break
+    return rules, platform_parents
+
+
+def _add_cpes_to_parent(parent, namespace, mapping):
+    platform_tag = "{%s}platform" % (namespace)
+
+    children = []
+    for child in parent:
+        children.append(child)
+        idref = child.get("idref")
+        if child.tag != platform_tag or idref not in mapping:
+            continue
+
+        new_platform = ElementTree.Element(platform_tag)
+        new_platform.set("idref", mapping[idref])
+        # this is done for the newline and indentation
+        new_platform.tail = child.tail
+        # insert it right after the respective RHEL CPE
+        children.append(new_platform)
+
+    parent[:] = children
+
+
 def add_cpes(elem, namespace, mapping):
     """
     Adds derivative CPEs next to RHEL ones, checks XCCDF elements of given
     namespace.
     """
 
-    affected = False
+    _, platform_parents = _find_rules_and_platform_parents(elem, namespace, mapping)
+    for parent in platform_parents:
+        _add_cpes_to_parent(parent, namespace, mapping)
 
-    for child in list(elem):
-        affected = affected or add_cpes(child, namespace, mapping)
+    return bool(platform_parents)
 
-    # precompute this so that we can affect the tree while iterating
-    children = list(elem.findall(".//{%s}platform" % (namespace)))
 
-    for child in children:
-        idref = child.get("idref")
-        if idref in mapping:
-            new_platform = ElementTree.Element("{%s}platform" % (namespace))
-            new_platform.set("idref", mapping[idref])
-            # this is done for the newline and indentation
-            new_platform.tail = child.tail
+def add_cpes_and_remove_idents(elem, namespace, mapping, prod="RHEL"):
+    """
+    Does the work of add_cpes and remove_idents on elem in a single
+    traversal of the tree.
+    """
 
-            index = list(elem).index(child)
-            # insert it right after the respective RHEL CPE
-            elem.insert(index + 1, new_platform)
+    rules, platform_parents = _find_rules_and_platform_parents(
+        elem, namespace, mapping)
+    for parent in platform_parents:
+        _add_cpes_to_parent(parent, namespace, mapping)
 
-            affected = True
+    ident_exp = re.compile('.*' + prod + '-*')
+    ref_exp = re.compile(prod + '-*')
+    for rule in rules:
+        _remove_rule_idents(rule, namespace, ident_exp, ref_exp)
 
-    return affected
+    return bool(platform_parents)
 
 
 def add_notice(benchmark, namespace, notice, warning):
@@ -77,35 +118,52 @@ def add_notice(benchmark, namespace, notice, warning):
     return True
 
 
+CCE_IDENT_RE = re.compile(r'CCE-*')
+CCE_LINE_RE = re.compile(r"[\s]+- CCE-.*")
+CCE_ID_RE = re.compile(r"CCE-[0-9]*-[0-9]*")
+
+
+def _remove_cces_from_text(text):
+    if text is None:
+        return None
+    text = CCE_LINE_RE.sub("", text)
+    return CCE_ID_RE.sub("", text)
+
+
+def _remove_rule_idents(rule, namespace, ident_exp, ref_exp):
+    ident_tag = "{%s}ident" % (namespace)
+    reference_tag = "{%s}reference" % (namespace)
+    fix_tag = "{%s}fix" % (namespace)
+
+    for child in list(rule):
+        if child.tag == ident_tag:
+            if child.text is not None:
+                if CCE_IDENT_RE.search(child.text) or ident_exp.search(child.text):
+                    rule.remove(child)
+
+        elif child.tag == reference_tag:
+            if child.text is not None:
+                if ref_exp.search(child.text):
+                    rule.remove(child)
+
+        elif child.tag == fix_tag:
+            if "fips" in (child.get("id") or ""):
+                rule.remove(child)
+                continue
+            for sub_elem in child.iter("{%s}sub" % (namespace)):
+                sub_elem.tail = _remove_cces_from_text(sub_elem.tail)
+            child.text = _remove_cces_from_text(child.text)
+
+
 def remove_idents(tree_root, namespace, prod="RHEL"):
     """
     Remove product identifiers from rules in XML tree
     """
 
-    ident_exp = '.*' + prod + '-*'
-    ref_exp = prod + '-*'
+    ident_exp = re.compile('.*' + prod + '-*')
+    ref_exp = re.compile(prod + '-*')
     for rule in tree_root.findall(".//{%s}Rule" % (namespace)):
-        for ident in rule.findall(".//{%s}ident" % (namespace)):
-            if ident is not None:
-                if (re.search(r'CCE-*', ident.text) or
-                        re.search(ident_exp, ident.text)):
-                    rule.remove(ident)
-
-        for ref in rule.findall(".//{%s}reference" % (namespace)):
-            if ref.text is not None:
-                if re.search(ref_exp, ref.text):
-                    rule.remove(ref)
-
-        for fix in rule.findall(".//{%s}fix" % (namespace)):
-            if "fips" in fix.get("id"):
-                rule.remove(fix)
-            sub_elems = fix.findall(".//{%s}sub" % (namespace))
-            for sub_elem in sub_elems:
-                sub_elem.tail = re.sub(r"[\s]+- CCE-.*", "", sub_elem.tail)
-                sub_elem.tail = re.sub(r"CCE-[0-9]*-[0-9]*", "", sub_elem.tail)
-            if fix.text is not None:
-                fix.text = re.sub(r"[\s]+- CCE-.*", "", fix.text)
-                fix.text = re.sub(r"CCE-[0-9]*-[0-9]*", "", fix.text)
+        _remove_rule_idents(rule, namespace, ident_exp, ref_exp)
 
 
 def profile_handling(tree_root, namespace):
@@ -1,14 +1,22 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import json
+import multiprocessing
 import os
 import sys
+import time
 from collections import namedtuple
 
-from .shims import subprocess_check_output, Queue
+from .shims import subprocess_check_output
 from .xccdf import get_profile_choices_for_input, get_profile_short_id
 from .xccdf import PROFILE_ID_BLACKLIST
-from .constants import OSCAP_DS_STRING, OSCAP_PATH
+from .constants import OSCAP_DS_STRING, OSCAP_PATH, XCCDF11_NS, XCCDF12_NS
+
+
+GuideTask = namedtuple('GuideTask', ['benchmark_id', 'profile_id', 'input_path',
+                                     'output_path', 'cost'])
+TaskResult = namedtuple('TaskResult', ['task', 'duration', 'attempts', 'error'])
 
 
 def get_path_args(args):
@@ -52,38 +60,107 @@ def generate_for_input_content(input_content, benchmark_id, profile_id):
     return subprocess_check_output(args).decode("utf-8")
 
 
-def builder(queue):
+def generate_guide(task):
+    """
+    Generate the HTML guide of a GuideTask and write it to its output_path.
     """
-    Fetch from a queue of tasks, process tasks until the queue is empty.
-    Each task is processed with generate_for_input_content, and the
-    guide is written as output.
+    guide_html = generate_for_input_content(
+        task.input_path, task.benchmark_id, task.profile_id
+    )
 
-    Raises: when an error occurred when processing a task.
+    with open(task.output_path, "wb") as guide_file:
+        guide_file.write(guide_html.encode("utf-8"))
+
+
+def _run_task(args):
+    """
+    Run function on the task, retrying it at most retries times, and return
+    a TaskResult. Errors are returned as strings instead of being raised,
+    so that one failing task doesn't stop the others.
     """
-    while True:
+    function, task, retries = args
+
+    start = time.time()
+    attempts = 0
+    error = None
+    while attempts <= retries:
+        attempts += 1
         try:
-            benchmark_id, profile_id, input_path, guide_path = \
-                queue.get(False)
+            function(task)
+            error = None
+            break
+        except Exception as exc:
+            error = str(exc)
 
-            guide_html = generate_for_input_content(
-                input_path, benchmark_id, profile_id
-            )
+    return TaskResult(task, time.time() - start, attempts, error)
 
-            with open(guide_path, "wb") as guide_file:
-                guide_file.write(guide_html.encode("utf-8"))
 
-            queue.task_done()
-        except Queue.Empty:
-            break
-        except Exception as error:
-            sys.stderr.write(
-                "Fatal error encountered when generating guide '%s'. "
-                "Error details:\n%s\n\n" % (guide_path, error)
-            )
-            queue.task_done()
-            with queue.mutex:
-                queue.queue.clear()
-            raise error
+def run_tasks(function, tasks, jobs, retries=0):
+    """
+    Process tasks with function in a pool of jobs processes. The tasks with
+    the highest cost are started first, so that the long running ones don't
+    end up at the tail of the build. The function has to be defined at
+    the module level, and the tasks have to be namedtuples with output_path
+    and cost fields.
+
+    Progress is reported on the standard output, failures on the standard
+    error. Returns the list of TaskResults in the order of completion.
+    """
+    tasks = sorted(tasks, key=lambda task: task.cost, reverse=True)
+    args = [(function, task, retries) for task in tasks]
+
+    pool = None
+    if jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(tasks)))
+        task_results = pool.imap_unordered(_run_task, args)
+    else:
+        task_results = (_run_task(arg) for arg in args)
+
+    results = []
+    try:
+        for result in task_results:
+            results.append(result)
+            if result.error is not None:
+                sys.stderr.write(
+                    "Fatal error encountered when generating '%s' "
+                    "(%d attempts). Error details:\n%s\n\n"
+                    % (result.task.output_path, result.attempts, result.error)
+                )
+                continue
+            print("[%d/%d] Generated %s in %.2f s" %
+                  (len(results), len(tasks), result.task.output_path,
+                   result.duration))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return results
+
+
+def write_timing_report(results, wall_time, jobs, report_path):
+    """
+    Write a JSON report with the duration and number of attempts of every
+    task, slowest first.
+    """
+    tasks = []
+    for result in sorted(results, key=lambda result: result.duration,
+                         reverse=True):
+        entry = dict(result.task._asdict())
+        entry["duration"] = round(result.duration, 3)
+        entry["attempts"] = result.attempts
+        entry["error"] = result.error
+        tasks.append(entry)
+
+    report = {
+        "jobs": jobs,
+        "wall_time": round(wall_time, 3),
+        "task_time": round(sum(result.duration for result in results), 3),
+        "failed": len([result for result in results if result.error is not None]),
+        "tasks": tasks,
+    }
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=4, sort_keys=True)
 
 
 def _benchmark_profile_pair_sort_key(benchmark_id, profile_id, profile_title):
@@ -118,6 +195,39 @@ def get_benchmark_profile_pairs(input_tree, benchmarks):
                   _benchmark_profile_pair_sort_key(x[0], x[1], x[2]))
 
 
+def get_benchmark_profile_costs(input_tree, benchmarks):
+    """
+    Return a dictionary that maps (benchmark_id, profile_id) pairs to the
+    number of rules oscap has to render for them. That is the number of
+    selected rules of a profile, and the number of all rules of the
+    benchmark for the default profile.
+    """
+    costs = {}
+
+    input_root = input_tree.getroot()
+    for namespace in [XCCDF11_NS, XCCDF12_NS]:
+        candidates = list(input_root.findall(".//{%s}Benchmark" % namespace))
+        if input_root.tag == "{%s}Benchmark" % namespace:
+            candidates.append(input_root)
+
+        for benchmark in candidates:
+            benchmark_id = benchmark.get("id")
+            if benchmark_id not in benchmarks:
+                continue
+
+            costs[(benchmark_id, "")] = \
+                len(benchmark.findall(".//{%s}Rule" % namespace))
+            for profile in benchmark.findall(".//{%s}Profile" % namespace):
+                selects = [
+                    select for select in
+                    profile.findall("{%s}select" % namespace)
+                    if select.get("selected") == "true"
+                ]
+                costs[(benchmark_id, profile.get("id"))] = len(selects)
+
+    return costs
+
+
 def _is_blacklisted_profile(profile_id):
     for blacklisted_id in PROFILE_ID_BLACKLIST:
         if profile_id.endswith(blacklisted_id):
@@ -165,22 +275,23 @@ def get_output_guide_paths(benchmarks, benchmark_profile_pairs, path_base,
     return guide_paths
 
 
-def fill_queue(benchmarks, benchmark_profile_pairs, input_path, path_base,
-               output_dir):
+def get_build_tasks(benchmarks, benchmark_profile_pairs, input_path, path_base,
+                    output_dir, costs=None):
     """
-    For each benchmark and profile in the benchmark, create a queue of
-    tasks for later processing. A task is a named tuple (benchmark_id,
-    profile_id, input_path, guide_path).
+    For each benchmark and profile in the benchmark, create a GuideTask for
+    later processing with run_tasks. The cost of a task is looked up in
+    costs, see get_benchmark_profile_costs.
 
-    Returns: queue of tasks.
+    Returns: index links, index options, initial index source and
+    the list of tasks.
     """
+    if costs is None:
+        costs = {}
 
     index_links = []
     index_options = {}
     index_initial_src = None
-    queue = Queue.Queue()
-
-    task = namedtuple('task', ['benchmark_id', 'profile_id', 'input_path', 'guide_path'])
+    tasks = []
 
     for benchmark_id, profile_id, profile_title in benchmark_profile_pairs:
         if _is_blacklisted_profile(profile_id):
@@ -208,9 +319,10 @@ def fill_queue(benchmarks, benchmark_profile_pairs, input_path, path_base,
         if index_initial_src is None:
             index_initial_src = guide_filename
 
-        queue.put(task(benchmark_id, profile_id, input_path, guide_path))
+        tasks.append(GuideTask(benchmark_id, profile_id, input_path, guide_path,
+                               costs.get((benchmark_id, profile_id), 0)))
 
-    return index_links, index_options, index_initial_src, queue
+    return index_links, index_options, index_initial_src, tasks
 
 
 def build_index(benchmarks, input_basename, index_links, index_options,
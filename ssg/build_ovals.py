@@ -4,7 +4,6 @@ from __future__ import print_function
 import os
 import os.path
 import sys
-from copy import deepcopy
 import collections
 
 from .constants import oval_namespace as oval_ns
@@ -15,7 +14,7 @@ from .products import parse_name, map_name
 from .jinja import process_file
 from .rules import get_rule_dir_id, get_rule_dir_ovals, find_rule_dirs
 from .utils import required_key
-from .xml import ElementTree
+from .xml import ElementTree, oval_generated_header
 
 
 def _check_is_applicable_for_product(oval_check_def, product):
@@ -81,45 +80,38 @@ def finalize_affected_platforms(xml_tree, env_yaml):
     return xml_tree
 
 
+# Per https://github.com/OpenSCAP/scap-security-guide/pull/1343#issuecomment-234541909
+# and https://github.com/OpenSCAP/scap-security-guide/pull/1343#issuecomment-234545296
+# ignore the differences in 'comment', 'version', 'state_operator', and
+# 'deprecated' attributes, since they don't affect the semantics of the OVAL
+# entities
+IGNORED_OVAL_ENTITY_ATTRIBUTES = frozenset(
+    ["comment", "version", "state_operator", "deprecated"])
+
+
+def _significant_attributes(elem):
+    return dict((key, value) for key, value in elem.items()
+                if key not in IGNORED_OVAL_ENTITY_ATTRIBUTES)
+
+
 def oval_entities_are_identical(firstelem, secondelem):
     """Check if OVAL entities represented by XML elements are identical
        Return: True if identical, False otherwise
        Based on: http://stackoverflow.com/a/24349916"""
 
-    # Per https://github.com/OpenSCAP/scap-security-guide/pull/1343#issuecomment-234541909
-    # and https://github.com/OpenSCAP/scap-security-guide/pull/1343#issuecomment-234545296
-    # ignore the differences in 'comment', 'version', 'state_operator', and
-    # 'deprecated' attributes. Also ignore different nsmap, since all these
-    # don't affect the semantics of the OVAL entities
-
-    # Operate on copies of the elements (since we will modify
-    # some attributes). Deepcopy will also reset the namespace map
-    # on copied elements for us
-    firstcopy = deepcopy(firstelem)
-    secondcopy = deepcopy(secondelem)
-
-    # Ignore 'comment', 'version', 'state_operator', and 'deprecated'
-    # attributes since they don't change the semantics of an element
-    for copy in [firstcopy, secondcopy]:
-        for key in copy.keys():
-            if key in ["comment", "version", "state_operator",
-                       "deprecated"]:
-                del copy.attrib[key]
-
-    # Compare the equality of the copies
-    if firstcopy.tag != secondcopy.tag:
+    if firstelem.tag != secondelem.tag:
         return False
-    if firstcopy.text != secondcopy.text:
+    if firstelem.text != secondelem.text:
         return False
-    if firstcopy.tail != secondcopy.tail:
+    if firstelem.tail != secondelem.tail:
         return False
-    if firstcopy.attrib != secondcopy.attrib:
+    if _significant_attributes(firstelem) != _significant_attributes(secondelem):
         return False
-    if len(firstcopy) != len(secondcopy):
+    if len(firstelem) != len(secondelem):
         return False
 
     return all(oval_entities_are_identical(
-        fchild, schild) for fchild, schild in zip(firstcopy, secondcopy))
+        fchild, schild) for fchild, schild in zip(firstelem, secondelem))
 
 
 def oval_entity_is_extvar(elem):
@@ -218,11 +210,46 @@ def _check_is_loaded(loaded_dict, filename, version):
     return False
 
 
-def _check_oval_version_from_oval(xml_content, oval_version):
+def _check_tree_is_applicable_for_product(oval_check_tree, product):
+    """Same as _check_is_applicable_for_product(), but the texts of the
+    <platform> and <product> elements of the parsed OVAL check are examined
+    instead of the rendered source."""
+
+    product, product_version = parse_name(product)
+
+    platforms = [elem.text or "" for elem in
+                 oval_check_tree.iter("{%s}platform" % oval_ns)]
+    products = [elem.text or "" for elem in
+                oval_check_tree.iter("{%s}product" % oval_ns)]
+
+    if product in MULTI_PLATFORM_LIST:
+        for multi_prod in ["multi_platform_all", "multi_platform_" + product]:
+            if any(text.startswith(multi_prod) for text in platforms):
+                return True
+
+    product_name = map_name(product)
+    if product_version is not None:
+        product_name += ' ' + product_version
+
+    for texts in [platforms, products]:
+        if any(text.startswith(product_name) for text in texts):
+            return True
+
+    return False
+
+
+def _parse_oval_check(xml_content, product):
+    """Parse the rendered OVAL check wrapped in the OVAL header and footer.
+
+    Return: The root element, or None if the check couldn't be parsed, but
+    isn't applicable for the product anyway"""
+
+    argument = oval_header + xml_content + oval_footer
     try:
-        argument = oval_header + xml_content + oval_footer
-        oval_file_tree = ElementTree.fromstring(argument)
+        return ElementTree.fromstring(argument.encode("utf-8"))
     except ElementTree.ParseError as error:
+        if not _check_is_applicable_for_product(xml_content, product):
+            return None
         line, column = error.position
         lines = argument.splitlines()
         before = '\n'.join(lines[:line])
@@ -231,7 +258,10 @@ def _check_oval_version_from_oval(xml_content, oval_version):
             "%s\n%s\nError when parsing OVAL file.\n" %
             (before, column_pointer))
         sys.exit(1)
-    for defgroup in oval_file_tree.findall("./{%s}def-group" % oval_ns):
+
+
+def _check_oval_version_from_tree(oval_check_tree, oval_version):
+    for defgroup in oval_check_tree.findall("./{%s}def-group" % oval_ns):
         file_oval_version = defgroup.get("oval_version")
 
     if file_oval_version is None:
@@ -244,67 +274,137 @@ def _check_oval_version_from_oval(xml_content, oval_version):
         return True
 
 
-def checks(env_yaml, yaml_path, oval_version, oval_dirs):
+def _find_oval_checks(env_yaml, yaml_path, oval_dirs, rule_dirs):
     """
-    Concatenate all XML files in the oval directory, to create the document
-    body. Then concatenates this with all XML files in the guide directories,
-    preferring {{{ product }}}.xml to shared.xml.
-
-    oval_dirs: list of directory with oval files (later has higher priority)
-
-    Return: The document body
+    Generate (filename, path) pairs of all OVAL checks of the product in the
+    order of their priority. OVALs in rule directories are named after the
+    rule, so that they override the ones in oval_dirs.
     """
-
-    body = []
     product = required_key(env_yaml, "product")
-    included_checks_count = 0
-    reversed_dirs = oval_dirs[::-1]  # earlier directory has higher priority
-    already_loaded = dict()  # filename -> oval_version
 
     product_dir = os.path.dirname(yaml_path)
     relative_guide_dir = required_key(env_yaml, "benchmark_root")
     guide_dir = os.path.abspath(os.path.join(product_dir, relative_guide_dir))
 
-    for _dir_path in find_rule_dirs(guide_dir):
-        rule_id = get_rule_dir_id(_dir_path)
+    if rule_dirs is None:
+        rule_dirs = find_rule_dirs(guide_dir)
 
+    for _dir_path in rule_dirs:
+        rule_id = get_rule_dir_id(_dir_path)
         for _path in get_rule_dir_ovals(_dir_path, product):
-            # To be compatible with the later checks, use the rule_id
-            # (i.e., the value of _dir) to recreate the expected filename if
-            # this OVAL was in a rule directory.
-            filename = "%s.xml" % rule_id
-
-            xml_content = process_file(_path, env_yaml)
-
-            if not _check_is_applicable_for_product(xml_content, product):
-                continue
-            if _check_is_loaded(already_loaded, filename, oval_version):
-                continue
-            if not _check_oval_version_from_oval(xml_content, oval_version):
-                continue
-
-            body.append(xml_content)
-            included_checks_count += 1
-            already_loaded[filename] = oval_version
+            yield "%s.xml" % rule_id, _path
 
-    for oval_dir in reversed_dirs:
+    # earlier directory has higher priority
+    for oval_dir in oval_dirs[::-1]:
         if os.path.isdir(oval_dir):
             # sort the files to make output deterministic
             for filename in sorted(os.listdir(oval_dir)):
                 if filename.endswith(".xml"):
-                    xml_content = process_file(
-                        os.path.join(oval_dir, filename), env_yaml
-                    )
-
-                    if not _check_is_applicable_for_product(xml_content, product):
-                        continue
-                    if _check_is_loaded(already_loaded, filename, oval_version):
-                        continue
-                    if not _check_oval_version_from_oval(xml_content, oval_version):
-                        continue
-                    body.append(xml_content)
-                    included_checks_count += 1
-                    already_loaded[filename] = oval_version
+                    yield filename, os.path.join(oval_dir, filename)
+
+
+def load_checks(env_yaml, yaml_path, oval_version, oval_dirs, rule_dirs=None):
+    """
+    Render and parse the OVAL checks applicable for the product, each of them
+    exactly once.
+
+    oval_dirs: list of directory with oval files (later has higher priority)
+    rule_dirs: optional list of rule directories of the product's guide
+        directory, for callers that already walked it
+
+    Return: Generator of (rendered check, root element of the parsed check)
+    """
+    product = required_key(env_yaml, "product")
+    included_checks_count = 0
+    already_loaded = dict()  # filename -> oval_version
+
+    for filename, path in _find_oval_checks(env_yaml, yaml_path, oval_dirs, rule_dirs):
+        # Overridden checks don't have to be rendered at all
+        if _check_is_loaded(already_loaded, filename, oval_version):
+            continue
+
+        xml_content = process_file(path, env_yaml)
+        oval_check_tree = _parse_oval_check(xml_content, product)
+        if oval_check_tree is None:
+            continue
+
+        if not _check_tree_is_applicable_for_product(oval_check_tree, product):
+            continue
+        if not _check_oval_version_from_tree(oval_check_tree, oval_version):
+            continue
+
+        included_checks_count += 1
+        already_loaded[filename] = oval_version
+        yield xml_content, oval_check_tree
+
     sys.stderr.write("Merged %d OVAL checks.\n" % (included_checks_count))
 
-    return "".join(body)
+
+def checks(env_yaml, yaml_path, oval_version, oval_dirs, rule_dirs=None):
+    """
+    Concatenate all XML files in the oval directory, to create the document
+    body. Then concatenates this with all XML files in the guide directories,
+    preferring {{{ product }}}.xml to shared.xml.
+
+    oval_dirs: list of directory with oval files (later has higher priority)
+    rule_dirs: optional list of rule directories of the product's guide
+        directory, for callers that already walked it
+
+    Return: The document body
+    """
+
+    return "".join(xml_content for xml_content, _ in load_checks(
+        env_yaml, yaml_path, oval_version, oval_dirs, rule_dirs))
+
+
+def combine_ovals(env_yaml, yaml_path, oval_dirs, rule_dirs=None):
+    """
+    Build the unlinked OVAL document of the product described by env_yaml
+    out of the checks found by load_checks(). Elements of all def-groups are
+    sorted into definitions, tests, objects, states and variables.
+
+    Return: The root element of the document
+    """
+    oval_version = required_key(env_yaml, "target_oval_version_str")
+    header = oval_generated_header(
+        "combine_ovals.py", oval_version, required_key(env_yaml, "ssg_version"))
+
+    definitions = ElementTree.Element("{%s}definitions" % oval_ns)
+    tests = ElementTree.Element("{%s}tests" % oval_ns)
+    objects = ElementTree.Element("{%s}objects" % oval_ns)
+    states = ElementTree.Element("{%s}states" % oval_ns)
+    variables = ElementTree.Element("{%s}variables" % oval_ns)
+
+    for _, oval_check_tree in load_checks(
+            env_yaml, yaml_path, oval_version, oval_dirs, rule_dirs):
+        tree = finalize_affected_platforms(oval_check_tree, env_yaml)
+        for childnode in tree.findall("./{%s}def-group/*" % oval_ns):
+            if childnode.tag is ElementTree.Comment:
+                continue
+            elif childnode.tag.endswith("definition"):
+                append(definitions, childnode)
+            elif childnode.tag.endswith("_test"):
+                append(tests, childnode)
+            elif childnode.tag.endswith("_object"):
+                append(objects, childnode)
+            elif childnode.tag.endswith("_state"):
+                append(states, childnode)
+            elif childnode.tag.endswith("_variable"):
+                append(variables, childnode)
+            else:
+                sys.stderr.write("Warning: Unknown element '%s'\n"
+                                 % (childnode.tag))
+
+    root = ElementTree.fromstring(("%s%s" % (header, oval_footer)).encode("utf-8"))
+    root.append(definitions)
+    root.append(tests)
+    root.append(objects)
+    root.append(states)
+    if list(variables):
+        root.append(variables)
+
+    # The cache is only needed while the containers are being filled
+    for container in (definitions, tests, objects, states, variables):
+        element_child_cache.pop(container, None)
+
+    return root
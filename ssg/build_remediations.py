@@ -5,13 +5,13 @@ import sys
 import os
 import os.path
 import re
-import codecs
 from collections import defaultdict, namedtuple
 
 from .jinja import process_file as jinja_process_file
 from .xml import ElementTree
 from .products import parse_name, map_name
 from .constants import MULTI_PLATFORM_LIST
+from .utils import required_key
 
 REMEDIATION_TO_EXT_MAP = {
     'anaconda': '.anaconda',
@@ -85,20 +85,72 @@ def get_available_functions(build_dir):
                          "The file was not found!\n" % (xmlfilepath))
         sys.exit(1)
 
+    # Attributes of the <Value> elements can't be relied on to be serialized
+    # in any particular order, parse the file to find the functions
     remediation_functions = []
-    with codecs.open(xmlfilepath, "r", encoding="utf-8") as xmlfile:
-        filestring = xmlfile.read()
-        # This regex looks implementation dependent but we can rely on
-        # ElementTree sorting XML attrs alphabetically. Hidden is guaranteed
-        # to be the first attr and ID is guaranteed to be second.
-        remediation_functions = re.findall(
-            r'<Value hidden=\"true\" id=\"function_(\S+)\"',
-            filestring, re.DOTALL
-        )
+    for value in ElementTree.parse(xmlfilepath).getroot().iter():
+        if not value.tag.endswith("Value") or value.get("hidden") != "true":
+            continue
+        value_id = value.get("id", "")
+        if value_id.startswith("function_"):
+            remediation_functions.append(value_id[len("function_"):])
 
     return remediation_functions
 
 
+class RemediationFunctionIndex(object):
+    """
+    Matchers of calls of the internal remediation functions compiled once
+    for a list of remediation functions.
+    """
+
+    def __init__(self, remediation_functions):
+        self.functions = tuple(remediation_functions)
+
+        alternation = r'|'.join(re.escape(func) for func in self.functions)
+        self.call_pattern = re.compile(
+            r'\n+(\s*(?:' + alternation + r')[^\n]*)\n', re.DOTALL)
+
+        # Longest names first, so that the scanner reports the longest
+        # function name starting at each position of the text. The shorter
+        # names it contains as a prefix are looked up in the prefix map.
+        by_length = sorted(set(self.functions), key=len, reverse=True)
+        self._scanner = None
+        if by_length:
+            self._scanner = re.compile(
+                r'(?=(' + r'|'.join(re.escape(func) for func in by_length) + r'))')
+        self._prefixes = dict(
+            (name, [func for func in by_length if name.startswith(func)])
+            for name in by_length)
+
+    def find_functions(self, text):
+        """
+        Return the set of remediation functions whose names occur anywhere in
+        the text, text is scanned only once.
+        """
+        found = set()
+        if self._scanner is None:
+            return found
+        for match in self._scanner.finditer(text):
+            found.update(self._prefixes[match.group(1)])
+        return found
+
+
+def get_remediation_function_index(remediation_functions):
+    """
+    Return the RemediationFunctionIndex of remediation_functions, it is built
+    only once for each list of functions.
+    """
+    key = tuple(remediation_functions)
+    cache = get_remediation_function_index.cache
+    if key not in cache:
+        cache[key] = RemediationFunctionIndex(key)
+    return cache[key]
+
+
+get_remediation_function_index.cache = dict()
+
+
 def get_fixgroup_for_type(fixcontent, remediation_type):
     """
     For a given remediation type, return a new subelement of that type.
@@ -226,17 +278,99 @@ def process_fix(fixes, remediation_type, env_yaml, product, file_path, fix_name)
         fixes[fix_name] = result
 
 
-def write_fixes(remediation_type, build_dir, output_path, fixes):
+def collect_rule_dir_remediations(rule_dirs, remediation_types, product):
+    """
+    Find remediations of all remediation_types in the rule directories of
+    the product's guide, so that the directories are walked only once when
+    several types of remediations are combined.
+
+    Return: dictionary of remediation type -> list of (rule_id, remediation
+        paths in order of priority) pairs
+    """
+    # ssg.rules imports this module, it can't be imported at the top level
+    from . import rules
+
+    rule_remediations = dict(
+        (remediation_type, []) for remediation_type in remediation_types)
+    for _dir_path in rule_dirs:
+        rule_id = rules.get_rule_dir_id(_dir_path)
+        for remediation_type in remediation_types:
+            contents = rules.get_rule_dir_remediations(
+                _dir_path, remediation_type, product)
+            if contents:
+                rule_remediations[remediation_type].append((rule_id, contents))
+    return rule_remediations
+
+
+def combine_fixes(env_yaml, yaml_path, remediation_type, fix_dirs, rule_dirs=None,
+                  rule_remediations=None):
+    """
+    Collect all fixes of the given remediation_type applicable to the product
+    described by env_yaml. Fixes from later fix_dirs override the earlier ones
+    and fixes from rule directories of the product's guide override all of them.
+
+    rule_dirs: optional list of rule directories of the product's guide
+        directory, for callers that already walked it
+    rule_remediations: optional list of remediations of remediation_type in
+        the rule directories as returned by collect_rule_dir_remediations()
+
+    Return: dictionary of fix name -> parsed remediation
+    """
+    # ssg.rules imports this module, it can't be imported at the top level
+    from . import rules
+
+    product = required_key(env_yaml, "product")
+
+    product_dir = os.path.dirname(yaml_path)
+    relative_guide_dir = required_key(env_yaml, "benchmark_root")
+    guide_dir = os.path.abspath(os.path.join(product_dir, relative_guide_dir))
+
+    # As fixes is continually updated, the last seen fix that is applicable for a
+    # given fix_name is chosen to replace newer fix_names
+    fixes = dict()
+    for fixdir in fix_dirs:
+        if os.path.isdir(fixdir):
+            for filename in os.listdir(fixdir):
+                file_path = os.path.join(fixdir, filename)
+                fix_name, _ = os.path.splitext(filename)
+
+                # Fixes gets updated with the contents of the fix, if it is applicable
+                process_fix(fixes, remediation_type, env_yaml, product,
+                            file_path, fix_name)
+
+    if rule_remediations is None:
+        if rule_dirs is None:
+            rule_dirs = rules.find_rule_dirs(guide_dir)
+        rule_remediations = collect_rule_dir_remediations(
+            rule_dirs, [remediation_type], product)[remediation_type]
+
+    # Walk the guide last, looking for rule folders as they have the highest priority
+    for rule_id, contents in rule_remediations:
+        for _path in reversed(contents):
+            # To be compatible with the later checks, use the rule_id
+            # (i.e., the value of _dir) to create the fix_name
+            process_fix(fixes, remediation_type, env_yaml, product, _path,
+                        rule_id)
+
+    return fixes
+
+
+def write_fixes(remediation_type, build_dir, output_path, fixes,
+                remediation_functions=None):
     """
     Builds a fix-content XML tree from the contents of fixes
     and writes it to output_path.
+
+    remediation_functions can be passed by callers writing several fix
+    files, so that they are loaded from build_dir only once.
     """
 
     fixcontent = ElementTree.Element("fix-content", system="urn:xccdf:fix:script:sh",
                                      xmlns="http://checklists.nist.gov/xccdf/1.1")
     fixgroup = get_fixgroup_for_type(fixcontent, remediation_type)
 
-    remediation_functions = get_available_functions(build_dir)
+    if remediation_functions is None:
+        remediation_functions = get_available_functions(build_dir)
 
     for fix_name in fixes:
         fix_contents, config = fixes[fix_name]
@@ -383,8 +517,8 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
         # This remediation script utilizes some of internal remediation functions
         # Expand shell variables and remediation functions calls with <xccdf:sub>
         # elements
-        pattern = r'\n+(\s*(?:' + r'|'.join(remediation_functions) + r')[^\n]*)\n'
-        patcomp = re.compile(pattern, re.DOTALL)
+        function_index = get_remediation_function_index(remediation_functions)
+        patcomp = function_index.call_pattern
         fixparts = re.split(patcomp, fix.text)
         if fixparts[0] is not None:
             # Split the portion of fix.text from fix start to first call of
@@ -425,7 +559,7 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
                 fixparts[idx] = "\n%s\n" % fixparts[idx]
                 # Sanity check (verify the first field truly contains call of
                 # some of the remediation functions)
-                if re.match(pattern, fixparts[idx], re.DOTALL) is not None:
+                if patcomp.match(fixparts[idx]) is not None:
                     # This chunk contains call of 'populate' function
                     if "populate" in fixparts[idx]:
                         varname, fixtextcontrib = get_populate_replacement(remediation_type,
@@ -436,7 +570,7 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
                         # If this is first sub element,
                         # the textcontribution needs to go to fix text
                         # otherwise, append to last subelement
-                        nfixchildren = len(list(fix))
+                        nfixchildren = len(fix)
                         if nfixchildren == 0:
                             fix.text += fixtextcontrib
                         else:
@@ -476,7 +610,9 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
                         # being added as child of <fix> and fix.text doesn't
                         # end up with newline character, append the newline
                         # to the fix.text
-                        if list(fix).index(xccdffuncsub) == 0:
+                        # The new subelement is always the last child
+                        nfixchildren = len(fix)
+                        if nfixchildren == 1:
                             if re.search(r'.*\n$', fix.text) is None:
                                 fix.text += '\n'
                         # If xccdffuncsub isn't the first child (first
@@ -484,7 +620,7 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
                         # child doesn't end up with newline, append the newline
                         # to the tail of previous child
                         else:
-                            previouselem = fix[list(fix).index(xccdffuncsub) - 1]
+                            previouselem = fix[nfixchildren - 2]
                             if re.search(r'.*\n$', previouselem.tail) is None:
                                 previouselem.tail += '\n'
 
@@ -494,18 +630,23 @@ def expand_xccdf_subs(fix, remediation_type, remediation_functions):
         # First concat output form of modified fix text (including text appended
         # to all children of the fix)
         modfix = [fix.text]
-        for child in fix.getchildren():
+        for child in fix:
             if child is not None and child.text is not None:
                 modfix.append(child.text)
         modfixtext = "".join(modfix)
+        # Only the functions occurring in the text can fail the check
+        found_functions = get_remediation_function_index(
+            remediation_functions).find_functions(modfixtext)
         for func in remediation_functions:
+            if func not in found_functions:
+                continue
             # Then efine expected XCCDF sub element form for this function
             funcxccdfsub = "<sub idref=\"function_%s\"" % func
             # Finally perform the sanity check -- if function was properly XCCDF
             # substituted both the original function call and XCCDF <sub> element
             # for that function need to be present in the modified text of the fix
             # Otherwise something went wrong, thus exit with failure
-            if func in modfixtext and funcxccdfsub not in modfixtext:
+            if funcxccdfsub not in modfixtext:
                 sys.stderr.write("Error performing XCCDF <sub> substitution "
                                  "for function %s in %s fix. Exiting...\n"
                                  % (func, fix.get("rule")))
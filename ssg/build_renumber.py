@@ -5,8 +5,8 @@ import sys
 
 from .constants import oval_namespace, XCCDF11_NS, cce_uri, ocil_cs, ocil_namespace
 from .constants import OVAL_TO_XCCDF_DATATYPE_CONSTRAINTS
-from .parse_oval import resolve_definition, find_extending_defs, get_container_groups
-from .xml import parse_file, map_elements_to_their_ids
+from .parse_oval import OVALDependencyGraph, get_container_groups_from_root
+from .xml import parse_file
 
 
 from .checks import get_content_ref_if_exists_and_not_remote, is_cce_valid
@@ -16,6 +16,57 @@ oval_ns = oval_namespace
 oval_cs = oval_namespace
 
 
+class XCCDFIndex(object):
+    """
+    Index of the XCCDF elements the linkers work with, built by a single
+    traversal of the XCCDF tree. Rules, their CCE identifiers and checks,
+    all checks of the document and the values indexed by IDs are
+    available without searching the tree again.
+    """
+
+    def __init__(self, xccdftree):
+        self.rules = []
+        self.checks = []
+        self.values = {}
+        self.rule_checks = {}
+        self.rule_identcce = {}
+
+        rule_tag = "{%s}Rule" % XCCDF11_NS
+        check_tag = "{%s}check" % XCCDF11_NS
+        value_tag = "{%s}Value" % XCCDF11_NS
+        for element in xccdftree.iter():
+            if element.tag == rule_tag:
+                self._index_rule(element, check_tag)
+            elif element.tag == check_tag:
+                self.checks.append(element)
+            elif element.tag == value_tag:
+                value_id = element.get("id")
+                assert value_id is not None, \
+                    "Element '{0}' doesn't have the id attribute".format(element.tag)
+                self.values[value_id] = element
+
+    def _index_rule(self, rule, check_tag):
+        self.rules.append(rule)
+        self.rule_checks[rule] = [child for child in rule if child.tag == check_tag]
+        identcce = _find_identcce(rule)
+        if identcce is not None:
+            self.rule_identcce[rule] = identcce
+
+    def rules_with_ids(self):
+        for rule in self.rules:
+            xccdfid = rule.get("id")
+            if xccdfid is None:
+                continue
+            yield xccdfid, rule
+
+    def remove_rule_check(self, rule, check):
+        rule.remove(check)
+        self.rule_checks[rule].remove(check)
+
+    def remove_rule_identcce(self, rule):
+        rule.remove(self.rule_identcce.pop(rule))
+
+
 class FileLinker(object):
     """
     Bass class which represents the linking of checks to their identifiers.
@@ -111,22 +162,30 @@ class OVALFileLinker(FileLinker):
     CHECK_SYSTEM = oval_cs
     CHECK_NAMESPACE = oval_ns
 
-    def __init__(self, translator, xccdftree, checks):
+    def __init__(self, translator, xccdftree, checks, xccdf_index=None):
         super(OVALFileLinker, self).__init__(translator, xccdftree, checks)
+        if xccdf_index is None:
+            xccdf_index = XCCDFIndex(xccdftree)
+        self.xccdf_index = xccdf_index
         self.oval_groups = None
+        self.oval_graph = None
+        self.check_exports = {}
 
     def _get_checkid_string(self):
         return "{%s}definition" % self.CHECK_NAMESPACE
 
     def link(self):
-        self.oval_groups = get_container_groups(self.fname)
+        # The container groups share their elements with the tree,
+        # everything that needs the untranslated IDs has to be done
+        # before the translation.
         self.tree = parse_file(self.fname)
+        self.oval_groups = get_container_groups_from_root(self.tree)
         try:
             self._link_oval_tree()
 
             # Verify if CCE identifiers present in the XCCDF follow the required form
             # (either CCE-XXXX-X, or CCE-XXXXX-X). Drop from XCCDF those who don't follow it
-            verify_correct_form_of_referenced_cce_identifiers(self.xccdftree)
+            verify_correct_form_of_referenced_cce_identifiers(self.xccdf_index)
         except SSGError as exc:
             raise SSGError(
                 "Error processing {0}: {1}"
@@ -134,14 +193,15 @@ class OVALFileLinker(FileLinker):
         self.tree = self.translator.translate(self.tree, store_defname=True)
 
     def _link_oval_tree(self):
-        xccdf_to_cce_id_mapping = create_xccdf_id_to_cce_id_mapping(self.xccdftree)
+        xccdf_to_cce_id_mapping = create_xccdf_id_to_cce_id_mapping(self.xccdf_index)
 
-        indexed_oval_defs = map_elements_to_their_ids(
-            self.tree, ".//{0}".format(self._get_checkid_string()))
+        indexed_oval_defs = dict(self.oval_groups["definitions"])
 
         drop_oval_checks_extending_non_existing_checks(
             self.tree, self.oval_groups, indexed_oval_defs)
 
+        self._resolve_check_exports()
+
         self._add_cce_id_refs_to_oval_checks(xccdf_to_cce_id_mapping)
 
         # Verify all by XCCDF referenced (local) OVAL checks are defined in OVAL file
@@ -149,7 +209,8 @@ class OVALFileLinker(FileLinker):
         self._ensure_by_xccdf_referenced_oval_def_is_defined_in_oval_file(
             indexed_oval_defs)
 
-        check_and_correct_xccdf_to_oval_data_export_matching_constraints(self.xccdftree, self.tree)
+        check_and_correct_xccdf_to_oval_data_export_matching_constraints(
+            self.xccdf_index, self.tree)
 
     def _add_cce_id_refs_to_oval_checks(self, idmappingdict):
         """
@@ -163,8 +224,7 @@ class OVALFileLinker(FileLinker):
         where "CCE-ID" is the CCE identifier for that particular rule
         retrieved from the XCCDF file
         """
-        ovalrules = self.tree.findall(".//{0}".format(self._get_checkid_string()))
-        for rule in ovalrules:
+        for rule in list(self.oval_groups["definitions"].values()):
             ovalid = rule.get("id")
             assert ovalid is not None, \
                 "An OVAL rule doesn't have an ID"
@@ -186,37 +246,44 @@ class OVALFileLinker(FileLinker):
                 metadata.append(ccerefelem)
 
     def get_nested_definitions(self, oval_def_id):
-        processed_def_ids = set()
-        queue = set([oval_def_id])
-        while queue:
-            def_id = queue.pop()
-            processed_def_ids.add(def_id)
-            definition_tree = self.oval_groups["definitions"].get(def_id)
-            if definition_tree is None:
+        processed_def_ids = self.oval_graph.extended_definitions(oval_def_id)
+        for def_id in processed_def_ids:
+            if not self.oval_graph.has_definition(def_id):
                 print("WARNING: Definition '%s' was not found, can't figure "
                       "out what depends on it." % (def_id), file=sys.stderr)
+        return set(processed_def_ids)
+
+    def _get_check_variables(self, check_name):
+        for def_id in self.get_nested_definitions(check_name):
+            if not self.oval_graph.has_definition(def_id):
+                print("WARNING: Definition '%s' was not found, can't figure "
+                      "out which variables it needs." % (def_id), file=sys.stderr)
+        return set(self.oval_graph.needed_variables(check_name))
+
+    def _resolve_check_exports(self):
+        """
+        Find the external variables needed by each OVAL check referenced
+        from the XCCDF, while the OVAL tree still has the original IDs.
+        """
+        self.oval_graph = OVALDependencyGraph(self.oval_groups)
+        for check in self.checks_related_to_us:
+            checkcontentref = get_content_ref_if_exists_and_not_remote(check)
+            if checkcontentref is None:
+                continue
+            check_name = checkcontentref.get("name")
+            if check_name is None or check_name in self.check_exports:
                 continue
-            extensions = find_extending_defs(self.oval_groups, definition_tree)
-            if not extensions:
+            if check_name not in self.oval_groups["definitions"]:
                 continue
-            queue |= extensions - processed_def_ids
-        return processed_def_ids
+            self.check_exports[check_name] = self._get_check_variables(check_name)
 
     def add_missing_check_exports(self, check, checkcontentref):
         check_name = checkcontentref.get("name")
         if check_name is None:
             return
-        oval_def = self.oval_groups["definitions"].get(check_name)
-        if oval_def is None:
+        all_vars = self.check_exports.get(check_name)
+        if all_vars is None:
             return
-        all_vars = set()
-        for def_id in self.get_nested_definitions(check_name):
-            extended_def = self.oval_groups["definitions"].get(def_id)
-            if extended_def is None:
-                print("WARNING: Definition '%s' was not found, can't figure "
-                      "out which variables it needs." % (def_id), file=sys.stderr)
-                continue
-            all_vars |= resolve_definition(self.oval_groups, extended_def)
         for varname in all_vars:
             export = ET.Element("{%s}check-export" % XCCDF11_NS)
             export.attrib["export-name"] = varname
@@ -231,14 +298,14 @@ class OVALFileLinker(FileLinker):
         # * That OVAL definition doesn't constitute a remote OVAL
         #   (@href of <check-content-ref> doesn't start with 'http'
 
-        for xccdfid, rule in rules_with_ids_generator(self.xccdftree):
+        for xccdfid, rule in self.xccdf_index.rules_with_ids():
             # Search OVAL ID in OVAL document
             ovalid = indexed_oval_defs.get(xccdfid)
             if ovalid is not None:
                 # The OVAL check was found, we can continue
                 continue
 
-            for check in rule.findall(".//{%s}check" % (XCCDF11_NS)):
+            for check in list(self.xccdf_index.rule_checks[rule]):
                 if check.get("system") != oval_cs:
                     continue
 
@@ -252,7 +319,7 @@ class OVALFileLinker(FileLinker):
                 print("WARNING: OVAL check '{0}' was not found, removing "
                       "<check-content> element from the XCCDF rule."
                       .format(xccdfid), file=sys.stderr)
-                rule.remove(check)
+                self.xccdf_index.remove_rule_check(rule, check)
 
 
 class OCILFileLinker(FileLinker):
@@ -283,7 +350,7 @@ def rules_with_ids_generator(xccdftree):
         yield xccdfid, rule
 
 
-def create_xccdf_id_to_cce_id_mapping(xccdftree):
+def create_xccdf_id_to_cce_id_mapping(xccdf_index):
     #
     # Create dictionary having form of
     #
@@ -293,8 +360,8 @@ def create_xccdf_id_to_cce_id_mapping(xccdftree):
     # element set in the XCCDF document
     xccdftocce_idmapping = {}
 
-    for xccdfid, rule in rules_with_ids_generator(xccdftree):
-        identcce = _find_identcce(rule)
+    for xccdfid, rule in xccdf_index.rules_with_ids():
+        identcce = xccdf_index.rule_identcce.get(rule)
         if identcce is None:
             continue
 
@@ -339,7 +406,7 @@ def drop_oval_checks_extending_non_existing_checks(ovaltree, oval_groups, indexe
         definitions.remove(definition)
 
 
-def check_and_correct_xccdf_to_oval_data_export_matching_constraints(xccdftree, ovaltree):
+def check_and_correct_xccdf_to_oval_data_export_matching_constraints(xccdf_index, ovaltree):
     """
     Verify if <xccdf:Value> 'type' to corresponding OVAL variable
     'datatype' export matching constraint:
@@ -360,8 +427,7 @@ def check_and_correct_xccdf_to_oval_data_export_matching_constraints(xccdftree,
 
     http://csrc.nist.gov/publications/nistpubs/800-126-rev2/SP800-126r2.pdf#page=30&zoom=auto,69,313
     """
-    indexed_xccdf_values = map_elements_to_their_ids(
-        xccdftree, ".//{%s}Value" % (XCCDF11_NS))
+    indexed_xccdf_values = xccdf_index.values
 
     # Loop through all <external_variables> in the OVAL document
     ovalextvars = ovaltree.findall(".//{%s}external_variable" % oval_ns)
@@ -412,7 +478,7 @@ def check_and_correct_xccdf_to_oval_data_export_matching_constraints(xccdftree,
             xccdfvar.attrib['type'] = reqxccdftype
 
 
-def verify_correct_form_of_referenced_cce_identifiers(xccdftree):
+def verify_correct_form_of_referenced_cce_identifiers(xccdf_index):
     """
     In SSG benchmarks, the CCEs till unassigned have the form of e.g. "RHEL7-CCE-TBD"
     (or any other format possibly not matching the above two requirements)
@@ -420,15 +486,14 @@ def verify_correct_form_of_referenced_cce_identifiers(xccdftree):
     If this is the case for specific SSG product, drop such CCE identifiers from the XCCDF
     since they are in invalid format!
     """
-    xccdfrules = xccdftree.findall(".//{%s}Rule" % XCCDF11_NS)
-    for rule in xccdfrules:
-        identcce = _find_identcce(rule)
+    for rule in xccdf_index.rules:
+        identcce = xccdf_index.rule_identcce.get(rule)
         if identcce is not None:
             cceid = identcce.text
             if not is_cce_valid(cceid):
                 print("Warning: CCE '{0}' is invalid for rule '{1}'. Removing CCE..."
                       .format(cceid, rule.get("id"), file=sys.stderr))
-                rule.remove(identcce)
+                xccdf_index.remove_rule_identcce(rule)
                 sys.exit(1)
 
 
@@ -451,9 +516,10 @@ def assert_that_check_ids_match_rule_id(checks, xccdf_rule):
             raise SSGError("\n".join(msg_lines))
 
 
-def check_that_oval_and_rule_id_match(xccdftree):
-    for xccdfid, rule in rules_with_ids_generator(xccdftree):
-        checks = rule.find("./{%s}check" % XCCDF11_NS)
+def check_that_oval_and_rule_id_match(xccdf_index):
+    for xccdfid, rule in xccdf_index.rules_with_ids():
+        rule_checks = xccdf_index.rule_checks[rule]
+        checks = rule_checks[0] if rule_checks else None
         if checks is None:
             print("Rule {0} doesn't have checks."
                   .format(xccdfid), file=sys.stderr)
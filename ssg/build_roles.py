@@ -2,16 +2,19 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import os
-import sys
 from collections import namedtuple
 
 from .ansible import add_minimum_version
-from .shims import subprocess_check_output, Queue
+from .shims import subprocess_check_output
 from .build_guides import _is_blacklisted_profile
 from .xccdf import get_profile_short_id
 from .constants import OSCAP_PATH, OSCAP_DS_STRING
 
 
+RoleTask = namedtuple('RoleTask', ['benchmark_id', 'profile_id', 'input_path',
+                                   'extension', 'output_path', 'template', 'cost'])
+
+
 def generate_for_input_content(input_content, benchmark_id, profile_id,
                                template):
     """Returns remediation role for given input_content and profile_id
@@ -75,16 +78,16 @@ def get_output_paths(benchmarks, benchmark_profile_pairs, path_base, extension,
     return role_paths
 
 
-def fill_queue(benchmarks, benchmark_profile_pairs, input_path, path_base,
-               extension, output_dir, template):
+def get_build_tasks(benchmarks, benchmark_profile_pairs, input_path, path_base,
+                    extension, output_dir, template, costs=None):
     """
-    Returns a queue containing tasks to create each role. A task is a
-    namedtuple of (benchmark_id, profile_id, input_path, extension, role_path,
-    template).
+    Returns a list of RoleTasks to create each role, to be processed with
+    ssg.build_guides.run_tasks. The cost of a task is looked up in costs,
+    see ssg.build_guides.get_benchmark_profile_costs.
     """
-    queue = Queue.Queue()
-    task = namedtuple('task', ['benchmark_id', 'profile_id', 'input_path',
-                               'extension', 'role_path', 'template'])
+    if costs is None:
+        costs = {}
+    tasks = []
 
     for benchmark_id, profile_id, _ in benchmark_profile_pairs:
         if _is_blacklisted_profile(profile_id):
@@ -94,45 +97,24 @@ def fill_queue(benchmarks, benchmark_profile_pairs, input_path, path_base,
                                       benchmark_id, benchmarks)
         role_path = os.path.join(output_dir, role_filename)
 
-        queue.put(task(benchmark_id, profile_id, input_path, extension,
-                       role_path, template))
+        tasks.append(RoleTask(benchmark_id, profile_id, input_path, extension,
+                              role_path, template,
+                              costs.get((benchmark_id, profile_id), 0)))
 
-    return queue
+    return tasks
 
 
-def builder(queue):
+def generate_role(task):
     """
-    While there are tasks in the queue, process them with
-    generate_input_for_content and write their output to the correct
-    location.
-
-    Raises any exceptions which occur during handling of a task.
+    Generate the remediation role of a RoleTask with
+    generate_for_input_content and write it to its output_path.
     """
-
-    while True:
-        try:
-            (benchmark_id, profile_id, input_path, extension, role_path,
-             template) = queue.get(False)
-
-            role_src = generate_for_input_content(
-                input_path, benchmark_id, profile_id, template
-            )
-
-            if extension == "yml" and \
-               template == "urn:xccdf:fix:script:ansible":
-                role_src = add_minimum_version(role_src)
-            with open(role_path, "wb") as role_file:
-                role_file.write(role_src.encode("utf-8"))
-
-            queue.task_done()
-        except Queue.Empty:
-            break
-        except Exception as error:
-            sys.stderr.write(
-                "Fatal error encountered when generating role '%s'. "
-                "Error details:\n%s\n\n" % (role_path, error)
-            )
-            queue.task_done()
-            with queue.mutex:
-                queue.queue.clear()
-            raise error
+    role_src = generate_for_input_content(
+        task.input_path, task.benchmark_id, task.profile_id, task.template
+    )
+
+    if task.extension == "yml" and \
+       task.template == "urn:xccdf:fix:script:ansible":
+        role_src = add_minimum_version(role_src)
+    with open(task.output_path, "wb") as role_file:
+        role_file.write(role_src.encode("utf-8"))
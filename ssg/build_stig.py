@@ -7,6 +7,62 @@ from .xml import ElementTree as ET
 from .constants import XCCDF11_NS, stig_ns, stig_refs
 
 
+def load_reference_rule_ids(reference):
+    """
+    Streams the given reference XCCDF file and returns a dictionary mapping
+    versions of its rules to IDs of the rules. Elements are cleared as soon
+    as they are processed, so that the whole file is never held in memory.
+    """
+    rule_tag = '{%s}Rule' % XCCDF11_NS
+    group_tag = '{%s}Group' % XCCDF11_NS
+    version_tag = '{%s}version' % XCCDF11_NS
+
+    dictionary = {}
+    rule_id = None
+    rule_version = None
+    in_rule = False
+    for event, elem in ET.iterparse(reference, events=("start", "end")):
+        if event == "start":
+            if elem.tag == rule_tag:
+                in_rule = True
+                rule_id = elem.get('id')
+                rule_version = None
+            continue
+
+        if elem.tag == version_tag:
+            # The first version found in the rule counts
+            if in_rule and rule_version is None:
+                rule_version = elem.text
+        elif elem.tag == rule_tag:
+            if rule_version:
+                dictionary[rule_version] = rule_id
+            in_rule = False
+            elem.clear()
+        elif elem.tag == group_tag:
+            elem.clear()
+
+    return dictionary
+
+
+def _add_rule_references(rule, dictionary):
+    reference_tag = '{%s}reference' % XCCDF11_NS
+
+    children = []
+    for child in rule:
+        children.append(child)
+        if child.tag != reference_tag:
+            continue
+        if (child.get('href', '').startswith(stig_refs) and
+                child.text in dictionary):
+            new_ref = ET.Element(reference_tag, {'href': stig_ns})
+            new_ref.text = dictionary[child.text]
+            new_ref.tail = child.tail
+            children.append(new_ref)
+
+    if len(children) != len(rule):
+        rule[:] = children
+
+
 def add_references(reference, destination):
     """
     For a given reference XCCDF file and destination file, process all
@@ -16,33 +72,13 @@ def add_references(reference, destination):
     Returns the updated ElementTree containing updated reference elements.
     """
     try:
-        reference_root = ET.parse(reference)
+        dictionary = load_reference_rule_ids(reference)
     except IOError:
         print("INFO: DISA STIG Reference file not found for this platform: %s" % reference)
         sys.exit(0)
 
-    reference_rules = reference_root.findall('.//{%s}Rule' % XCCDF11_NS)
-
-    dictionary = {}
-
-    for rule in reference_rules:
-        version = rule.find('.//{%s}version' % XCCDF11_NS)
-        if version is not None and version.text:
-            dictionary[version.text] = rule.get('id')
-
     target_root = ET.parse(destination)
-    target_rules = target_root.findall('.//{%s}Rule' % XCCDF11_NS)
-
-    for rule in target_rules:
-        refs = rule.findall('.//{%s}reference' % XCCDF11_NS)
-        for ref in refs:
-            if (ref.get('href').startswith(stig_refs) and
-                    ref.text in dictionary):
-                index = rule.getchildren().index(ref)
-                new_ref = ET.Element(
-                    '{%s}reference' % XCCDF11_NS, {'href': stig_ns})
-                new_ref.text = dictionary[ref.text]
-                new_ref.tail = ref.tail
-                rule.insert(index + 1, new_ref)
+    for rule in target_root.findall('.//{%s}Rule' % XCCDF11_NS):
+        _add_rule_references(rule, dictionary)
 
     return target_root
@@ -1,8 +1,16 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import hashlib
+import json
+import multiprocessing
 import os
+import shutil
 import sys
+from collections import OrderedDict
+
+import ssg.jinja
+import ssg.utils
 
 templates_dir = os.path.join(os.path.dirname(__file__), "..", "shared", "templates")
 sys.path.append(templates_dir)
@@ -32,6 +40,216 @@ from create_grub2_bootloader_argument import GRUB2BootloaderArgumentGenerator
 from create_ocp_service_runtime_config import OCPServiceRuntimeConfigGenerator
 
 
+# Environment used by the worker processes of Builder._render_parallel
+_worker_env_yaml = None
+
+
+def _init_render_worker(env_yaml):
+    global _worker_env_yaml
+    _worker_env_yaml = env_yaml
+
+
+def render_templates(tasks, env_yaml):
+    """
+    Fill the templates of (output_filepath, template_filepath, constants)
+    tasks with env_yaml and the constants, and write them to their output
+    files. The outputs are written by the rendering process, so that
+    the rendered contents don't have to be passed between processes.
+
+    Returns the number of written files.
+    """
+    for output_filepath, template_filepath, constants in tasks:
+        jinja_dict = ssg.utils.merge_dicts(env_yaml, constants)
+        filled_template = ssg.jinja.process_file(template_filepath,
+                                                 jinja_dict)
+
+        with open(output_filepath, "w") as f:
+            f.write(filled_template)
+    return len(tasks)
+
+
+# Fewer render tasks than this are rendered without a pool of processes
+MIN_PARALLEL_RENDER_TASKS = 64
+
+
+def _render_templates_task(tasks):
+    try:
+        return render_templates(tasks, _worker_env_yaml)
+    finally:
+        ssg.jinja.finish_render_cache()
+
+
+MANIFEST_FILENAME = ".templates-manifest.json"
+MANIFEST_VERSION = 1
+
+FILE_LISTS_CACHE_FILENAME = ".templates-file-lists.json"
+FILE_LISTS_CACHE_VERSION = 1
+FILE_LISTS_CACHE_KEYS = {
+    ActionType.INPUT: "inputs",
+    ActionType.OUTPUT: "outputs",
+}
+
+
+class TemplatesManifest(object):
+    """
+    Records, for every file generated from a template, the CSV row,
+    the template file and the env_yaml keys the file was generated from,
+    together with a digest of their contents.
+
+    With the manifest of the previous build loaded, only outputs whose
+    digest changed are generated again, and outputs that are no longer
+    generated can be removed.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self.previous = None
+        self.previous_templates = dict()
+        self.outputs = dict()
+        self.generated = 0
+        self.skipped = 0
+        self._templates = dict()
+        self._env_hashes = dict()
+
+    def load(self):
+        """
+        Load the manifest of the previous build and remove it, so that
+        an interrupted build can't leave behind a manifest which doesn't
+        match the outputs.
+
+        Returns False if there is no usable manifest.
+        """
+        try:
+            with open(self.path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+            os.remove(self.path)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            return False
+        self.previous = manifest["outputs"]
+        self.previous_templates = manifest["templates"]
+        return True
+
+    def save(self):
+        templates = dict(
+            (template_filepath, {"hash": template_hash, "variables": variables})
+            for template_filepath, (template_hash, variables)
+            in self._templates.items())
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "templates": templates,
+            "outputs": self.outputs,
+        }
+        with open(self.path, "w") as manifest_file:
+            manifest_file.write(json.dumps(manifest))
+
+    def _get_template_info(self, template_filepath, env_yaml):
+        """
+        Return the hash of the template and the sorted list of names it
+        takes from env_yaml or from the constants. Parsing the template
+        takes longer than rendering it, so the names are taken from the
+        previous manifest if the template didn't change.
+        """
+        if template_filepath not in self._templates:
+            with open(template_filepath, "rb") as template_file:
+                template_hash = hashlib.sha1(template_file.read()).hexdigest()
+
+            previous = self.previous_templates.get(template_filepath, {})
+            if previous.get("hash") == template_hash:
+                variables = previous["variables"]
+            else:
+                variables = ssg.jinja.get_template_variables(
+                    template_filepath, env_yaml)
+                if variables is not None:
+                    variables = sorted(variables)
+            self._templates[template_filepath] = (template_hash, variables)
+        return self._templates[template_filepath]
+
+    def _get_env_hash(self, env_yaml, env_keys):
+        cache_key = None if env_keys is None else tuple(env_keys)
+        if cache_key not in self._env_hashes:
+            self._env_hashes[cache_key] = \
+                ssg.jinja.get_substitutions_hash(env_yaml, env_keys)
+        return self._env_hashes[cache_key]
+
+    def _get_digest(self, template_hash, env_hash, constants):
+        constants_hash = ssg.jinja.get_substitutions_dict_hash(constants)
+        if env_hash is None or constants_hash is None:
+            return None
+        digest = hashlib.sha1(template_hash.encode("utf-8"))
+        digest.update(env_hash.encode("utf-8"))
+        digest.update(constants_hash.encode("utf-8"))
+        return digest.hexdigest()
+
+    def add_output(self, output_filepath, template_filepath, constants,
+                   env_yaml, csv_source):
+        """
+        Record that output_filepath is generated from the template with
+        the given constants and env_yaml, for the CSV row given as
+        csv_source, a tuple of (csv_filename, language, row).
+
+        Returns True if the output is up to date and doesn't have to be
+        generated again.
+        """
+        output = os.path.relpath(output_filepath, self.output_dir)
+        template_hash, variables = \
+            self._get_template_info(template_filepath, env_yaml)
+
+        # Constants override the values of env_yaml
+        env_keys = None
+        digest = None
+        # Templates that include or import other templates are always
+        # generated, the digest wouldn't cover the referenced files.
+        if variables is not None:
+            env_keys = sorted(set(variables) - set(constants))
+            digest = self._get_digest(
+                template_hash, self._get_env_hash(env_yaml, env_keys), constants)
+
+        # Outputs written more than once during a build are always
+        # generated, so that the last write wins as without the manifest.
+        up_to_date = (
+            digest is not None and
+            self.previous is not None and
+            output not in self.outputs and
+            self.previous.get(output, {}).get("digest") == digest and
+            os.path.isfile(output_filepath)
+        )
+
+        csv_filename, language, row = csv_source or (None, None, None)
+        self.outputs[output] = {
+            "csv": csv_filename,
+            "language": language,
+            "row": row,
+            "template": template_filepath,
+            "env_keys": env_keys,
+            "digest": digest,
+        }
+
+        if up_to_date:
+            # Keep the output newer than its inputs, as if it was generated
+            os.utime(output_filepath, None)
+            self.skipped += 1
+        else:
+            self.generated += 1
+        return up_to_date
+
+    def remove_stale_outputs(self):
+        """
+        Remove outputs of the previous build that weren't generated by
+        this build. Returns the number of removed files.
+        """
+        removed = 0
+        for output in set(self.previous or {}) - set(self.outputs):
+            output_filepath = os.path.join(self.output_dir, output)
+            if os.path.isfile(output_filepath):
+                os.remove(output_filepath)
+                removed += 1
+        return removed
+
+
 class Builder(object):
     """
     Class for building all templated content for a given product.
@@ -44,6 +262,18 @@ class Builder(object):
         list_inputs() -- to generate a list of inputs into the build process
         list_outputs() -- to generate a list of outputs from the build process
         build() -- to perform a build
+
+    With jobs greater than 1, build() first collects the outputs of all CSV
+    rows and languages, and renders them in a pool of jobs processes,
+    unless there are too few of them to make starting the pool worthwhile.
+
+    If incremental is set, build() keeps a TemplatesManifest in the output
+    directory and generates only the outputs whose inputs changed since
+    the previous build, removing the outputs that are no longer generated.
+
+    The lists of inputs and outputs are cached in the output directory,
+    they are collected again only when the CSV files, the generators or
+    the set of available templates change.
     """
 
     def __init__(self, env_yaml):
@@ -53,6 +283,9 @@ class Builder(object):
         self.output_dir = None
         self.ssg_shared = ""
         self.env_yaml = env_yaml
+        self.incremental = False
+        self.manifest = None
+        self.jobs = 1
 
         self.script_dict = {
             "sysctl_values.csv":                SysctlGenerator(),
@@ -153,11 +386,26 @@ class Builder(object):
         the output to the correct build directories.
         """
 
+        self.manifest = None
+        if self.incremental:
+            self.manifest = TemplatesManifest(self.output_dir)
+            if not self.manifest.load():
+                # Without a manifest, outputs of CSV rows removed since
+                # the previous build can't be told apart, start over.
+                for lang in self.langs:
+                    dir_ = os.path.join(self.output_dir, lang)
+                    if os.path.isdir(dir_):
+                        shutil.rmtree(dir_)
+
         for lang in self.langs:
             dir_ = os.path.join(self.output_dir, lang)
             if not os.path.exists(dir_):
                 os.makedirs(dir_)
 
+        render_tasks = None
+        if self.jobs > 1:
+            render_tasks = []
+
         for csv_filename in self._get_csv_list():
             generator = self._get_generator_for_csv(csv_filename)
             csv_filepath = os.path.join(self.csv_dir, csv_filename)
@@ -168,10 +416,128 @@ class Builder(object):
             generator.action = ActionType.BUILD
             generator.product_input_dir = self.template_dir
             generator.shared_dir = self.ssg_shared
+            generator.manifest = self.manifest
+            generator.render_tasks = render_tasks
 
             for lang in self.langs:
                 generator.csv_map(csv_filepath, language=lang)
 
+        if render_tasks:
+            self._render_parallel(render_tasks)
+
+        if self.manifest is not None:
+            self.manifest.remove_stale_outputs()
+            self.manifest.save()
+
+    def _render_parallel(self, render_tasks):
+        """
+        Render the collected tasks in a pool of processes. Each process
+        gets tasks of few templates, compiled before the pool is forked.
+        """
+        # An output written more than once gets the last write, as in
+        # a serial build.
+        tasks = list(OrderedDict(
+            (task[0], task) for task in render_tasks).values())
+        tasks.sort(key=lambda task: task[1])
+
+        if len(tasks) < MIN_PARALLEL_RENDER_TASKS:
+            # Starting the pool would take longer than the rendering
+            render_templates(tasks, self.env_yaml)
+            return
+
+        templates = sorted(set(task[1] for task in tasks))
+        ssg.jinja.preload_templates(templates, self.env_yaml)
+
+        jobs = min(self.jobs, len(tasks))
+        chunk_count = jobs * 4
+        chunk_size = (len(tasks) + chunk_count - 1) // chunk_count
+        chunks = [tasks[index:index + chunk_size]
+                  for index in range(0, len(tasks), chunk_size)]
+
+        # Macros can't be passed to other processes
+        worker_env_yaml = dict(
+            (key, value) for key, value in self.env_yaml.items()
+            if not callable(value))
+        pool = multiprocessing.Pool(
+            jobs, initializer=_init_render_worker, initargs=(worker_env_yaml,))
+        try:
+            pool.map(_render_templates_task, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _get_template_search_dirs(self):
+        """
+        Returns the directories get_template_filename of the generators
+        looks for templates in.
+        """
+        dirs = [self.template_dir]
+        if self.template_dir.endswith("oval_5.11_templates"):
+            dirs.append(os.path.dirname(self.template_dir))
+            dirs.append(os.path.join(self.ssg_shared, "templates",
+                                     "oval_5.11_templates"))
+        dirs.append(os.path.join(self.ssg_shared, "templates"))
+        return dirs
+
+    def _get_file_lists_stamp(self):
+        """
+        Returns a hash of everything the lists of inputs and outputs
+        depend on: the CSV files, the generator modules, the names of
+        available templates and the builder settings. Only directory
+        listings and stats are needed, no file is read.
+        """
+        def stat_files(dir_, suffix):
+            stats = []
+            if not os.path.isdir(dir_):
+                return stats
+            for name in sorted(os.listdir(dir_)):
+                if name.endswith(suffix):
+                    stat = os.stat(os.path.join(dir_, name))
+                    stats.append((name, stat.st_size, stat.st_mtime))
+            return stats
+
+        template_names = []
+        for dir_ in self._get_template_search_dirs():
+            names = sorted(os.listdir(dir_)) if os.path.isdir(dir_) else []
+            template_names.append((dir_, names))
+
+        stamp = {
+            "version": FILE_LISTS_CACHE_VERSION,
+            "langs": list(self.langs),
+            "dirs": [os.path.abspath(dir_) for dir_ in
+                     (self.input_dir, self.output_dir, self.ssg_shared)],
+            "csvs": stat_files(self.csv_dir, ""),
+            "generators": stat_files(templates_dir, ".py") +
+            stat_files(os.path.dirname(__file__), "build_templates.py"),
+            "templates": template_names,
+        }
+        return hashlib.sha1(
+            json.dumps(stamp, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _load_file_lists_cache(self, stamp):
+        path = os.path.join(self.output_dir, FILE_LISTS_CACHE_FILENAME)
+        try:
+            with open(path, "r") as cache_file:
+                cache = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return dict()
+        if cache.get("stamp") != stamp:
+            return dict()
+        return cache["lists"]
+
+    def _save_file_lists_cache(self, stamp, lists):
+        path = os.path.join(self.output_dir, FILE_LISTS_CACHE_FILENAME)
+        tmp_path = path + ".tmp"
+        try:
+            if not os.path.isdir(self.output_dir):
+                os.makedirs(self.output_dir)
+            with open(tmp_path, "w") as cache_file:
+                json.dump({"stamp": stamp, "lists": lists}, cache_file)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            # The cache is only an optimization, listing must not fail
+            pass
+
     def get_file_list(self, action):
         """
         For a given action (INPUT or OUTPUT), get the list of
@@ -182,9 +548,20 @@ class Builder(object):
         """
         assert(action in [ActionType.INPUT, ActionType.OUTPUT])
 
+        stamp = self._get_file_lists_stamp()
+        lists = self._load_file_lists_cache(stamp)
+        key = FILE_LISTS_CACHE_KEYS[action]
+        if key not in lists:
+            lists[key] = sorted(self._collect_file_list(action))
+            self._save_file_lists_cache(stamp, lists)
+        return set(lists[key])
+
+    def _collect_file_list(self, action):
+        """
+        Runs the generators for the given action (INPUT or OUTPUT) to
+        collect the list of files, without rendering any template.
+        """
         list_ = []
-        if action == ActionType.INPUT:
-            pass
 
         for csv in self._get_csv_list():
             csv_filepath = os.path.join(self.csv_dir, csv)
@@ -199,6 +576,8 @@ class Builder(object):
             generator.action = action
             generator.product_input_dir = self.template_dir
             generator.shared_dir = self.ssg_shared
+            generator.manifest = None
+            generator.render_tasks = None
 
             for lang in self.langs:
                 generator.csv_map(csv_filepath, language=lang)
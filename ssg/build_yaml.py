@@ -4,13 +4,17 @@ from __future__ import print_function
 import os
 import os.path
 import datetime
+import multiprocessing
 import sys
+from collections import namedtuple
 
 from .constants import XCCDF_PLATFORM_TO_CPE
 from .constants import PRODUCT_TO_CPE_MAPPING
 from .rules import get_rule_dir_id, get_rule_dir_yaml, is_rule_dir
+from .rules import get_rule_index, list_dir
 
 from .checks import is_cce_valid
+from .jinja import finish_render_cache
 from .yaml import open_and_expand, open_and_macro_expand
 from .utils import required_key
 
@@ -18,6 +22,14 @@ from .xml import ElementTree as ET
 from .shims import unicode_func
 
 
+# Content of a guide directory, as sorted by _get_directory_items
+DirectoryItems = namedtuple(
+    "DirectoryItems",
+    ["benchmark_file", "group_file", "values", "rules", "subdirectories"])
+# Guide directory with its items and DirectoryNodes of its subdirectories
+DirectoryNode = namedtuple("DirectoryNode", ["path", "items", "subdirectories"])
+
+
 def add_sub_element(parent, tag, data):
     """
     Creates a new child element under parent with tag tag, and sets
@@ -678,20 +690,17 @@ def load_benchmark_or_group(group_file, benchmark_file, guide_directory, action,
     return group
 
 
-def add_from_directory(action, parent_group, guide_directory, profiles_dir,
-                       bash_remediation_fns, output_file, env_yaml):
+def _get_directory_items(guide_directory):
     """
-    Process Variables, Benchmarks, and Rules in a given subdirectory,
-    recursing as necessary.
-
-    Behavior is dependent upon the value of action.
+    Sort the content of guide_directory into the benchmark file, the group file,
+    values, rules and subdirectories that need to be processed.
     """
     benchmark_file = None
     group_file = None
     rules = []
     values = []
     subdirectories = []
-    for dir_item in os.listdir(guide_directory):
+    for dir_item, is_dir in list_dir(guide_directory):
         dir_item_path = os.path.join(guide_directory, dir_item)
         _, extension = os.path.splitext(dir_item)
 
@@ -707,10 +716,10 @@ def add_from_directory(action, parent_group, guide_directory, profiles_dir,
             group_file = dir_item_path
         elif extension == '.rule':
             rules.append(dir_item_path)
-        elif is_rule_dir(dir_item_path):
+        elif is_dir and is_rule_dir(dir_item_path):
             rules.append(get_rule_dir_yaml(dir_item_path))
         elif dir_item != "tests":
-            if os.path.isdir(dir_item_path):
+            if is_dir:
                 subdirectories.append(dir_item_path)
             else:
                 sys.stderr.write(
@@ -719,25 +728,52 @@ def add_from_directory(action, parent_group, guide_directory, profiles_dir,
                     % (dir_item, extension)
                 )
 
-    group = load_benchmark_or_group(group_file, benchmark_file, guide_directory, action,
-                                    profiles_dir, env_yaml, bash_remediation_fns)
+    return DirectoryItems(benchmark_file, group_file, values, rules, subdirectories)
+
+
+def add_from_directory(action, parent_group, guide_directory, profiles_dir,
+                       bash_remediation_fns, output_file, env_yaml, jobs=1):
+    """
+    Process Variables, Benchmarks, and Rules in a given subdirectory,
+    recursing as necessary.
+
+    Behavior is dependent upon the value of action.
+
+    When building the top level directory with jobs > 1, the YAML files are
+    loaded by a pool of that many processes, see _add_from_directory_parallel.
+    """
+    if parent_group is None:
+        # The directories of the whole guide are listed from its index
+        get_rule_index(guide_directory)
+
+    if jobs > 1 and action == "build" and parent_group is None:
+        _add_from_directory_parallel(guide_directory, profiles_dir,
+                                     bash_remediation_fns, output_file,
+                                     env_yaml, jobs)
+        return
+
+    items = _get_directory_items(guide_directory)
+
+    group = load_benchmark_or_group(items.group_file, items.benchmark_file,
+                                    guide_directory, action, profiles_dir,
+                                    env_yaml, bash_remediation_fns)
 
     if group is not None:
         if parent_group:
             parent_group.add_group(group)
-        for value_yaml in values:
+        for value_yaml in items.values:
             if action == "list-inputs":
                 print(value_yaml)
             else:
                 value = Value.from_yaml(value_yaml, env_yaml)
                 group.add_value(value)
 
-        for subdir in subdirectories:
+        for subdir in items.subdirectories:
             add_from_directory(action, group, subdir, profiles_dir,
                                bash_remediation_fns, output_file,
                                env_yaml)
 
-        for rule_yaml in rules:
+        for rule_yaml in items.rules:
             if action == "list-inputs":
                 print(rule_yaml)
             else:
@@ -749,3 +785,140 @@ def add_from_directory(action, parent_group, guide_directory, profiles_dir,
             # Lets dump the XCCDF group or benchmark to a file
             if action == "build":
                 group.to_file(output_file)
+
+
+def _discover_directories(guide_directory):
+    """
+    Walk guide_directory the same way add_from_directory does and return
+    the tree of DirectoryNode objects rooted in it. Only directories with
+    a benchmark or a group are descended into.
+    """
+    items = _get_directory_items(guide_directory)
+    if items.group_file and items.benchmark_file:
+        raise ValueError("A .benchmark file and a .group file were found in "
+                         "the same directory '%s'" % (guide_directory))
+
+    subdirectories = []
+    if items.group_file or items.benchmark_file:
+        subdirectories = [_discover_directories(subdir)
+                          for subdir in items.subdirectories]
+    return DirectoryNode(guide_directory, items, subdirectories)
+
+
+# Environment used by the worker processes of _add_from_directory_parallel
+_worker_env_yaml = None
+
+
+def _init_yaml_loader_worker(env_yaml):
+    global _worker_env_yaml
+    _worker_env_yaml = env_yaml
+
+
+def _load_yaml_item(item):
+    loaders = {
+        "group": Group.from_yaml,
+        "value": Value.from_yaml,
+        "rule": Rule.from_yaml,
+    }
+    kind, yaml_file = item
+    try:
+        return loaders[kind](yaml_file, _worker_env_yaml)
+    except SystemExit as exc:
+        # Pool workers would die on sys.exit() and the pool would
+        # wait for their result forever
+        raise RuntimeError("Loading '%s' exited with %s" % (yaml_file, exc.code))
+
+
+def _load_yaml_chunk(items):
+    try:
+        return [_load_yaml_item(item) for item in items]
+    finally:
+        # Pool workers don't run atexit handlers
+        finish_render_cache()
+
+
+# Number of YAML files loaded by a worker at once
+YAML_LOAD_CHUNK_SIZE = 8
+
+
+def _load_yaml_items(pool, items):
+    """
+    Load (kind, yaml_file) items in the pool, return a yaml_file -> object dict.
+    """
+    chunks = [items[start:start + YAML_LOAD_CHUNK_SIZE]
+              for start in range(0, len(items), YAML_LOAD_CHUNK_SIZE)]
+    loaded = [obj for chunk in pool.map(_load_yaml_chunk, chunks) for obj in chunk]
+    return dict((yaml_file, obj) for (_, yaml_file), obj in zip(items, loaded))
+
+
+def _add_from_directory_parallel(guide_directory, profiles_dir,
+                                 bash_remediation_fns, output_file, env_yaml,
+                                 jobs):
+    """
+    Same as add_from_directory with the "build" action, but the directory
+    tree is discovered first and groups, values and rules are loaded by
+    a pool of jobs processes. The tree is then assembled in the order
+    add_from_directory would use, so the output is the same.
+    """
+    root = _discover_directories(guide_directory)
+
+    nodes = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        nodes.append(node)
+        pending.extend(reversed(node.subdirectories))
+
+    # Macros can't be passed to other processes, the workers add their own
+    worker_env_yaml = dict(
+        (key, value) for key, value in env_yaml.items() if not callable(value))
+    pool = multiprocessing.Pool(
+        jobs, initializer=_init_yaml_loader_worker, initargs=(worker_env_yaml,))
+    try:
+        # Groups are loaded first, values and rules are needed only
+        # for directories whose group and all its parents loaded.
+        loaded = _load_yaml_items(
+            pool, [("group", node.items.group_file) for node in nodes
+                   if node.items.group_file and not node.items.benchmark_file])
+        groups = dict()
+        for node in nodes:
+            if node.items.benchmark_file:
+                groups[node.path] = load_benchmark_or_group(
+                    None, node.items.benchmark_file, node.path, "build",
+                    profiles_dir, env_yaml, bash_remediation_fns)
+            elif node.items.group_file:
+                groups[node.path] = loaded[node.items.group_file]
+
+        items = []
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            if groups.get(node.path) is None:
+                continue
+            items.extend(("value", value_yaml) for value_yaml in node.items.values)
+            items.extend(("rule", rule_yaml) for rule_yaml in node.items.rules)
+            pending.extend(node.subdirectories)
+        loaded.update(_load_yaml_items(pool, items))
+    finally:
+        pool.close()
+        pool.join()
+
+    group = _assemble_directory(root, None, groups, loaded)
+    if group is not None:
+        group.to_file(output_file)
+
+
+def _assemble_directory(node, parent_group, groups, loaded):
+    group = groups.get(node.path)
+    if group is None:
+        return None
+
+    if parent_group:
+        parent_group.add_group(group)
+    for value_yaml in node.items.values:
+        group.add_value(loaded[value_yaml])
+    for subdir in node.subdirectories:
+        _assemble_directory(subdir, group, groups, loaded)
+    for rule_yaml in node.items.rules:
+        group.add_rule(loaded[rule_yaml])
+    return group
@@ -48,6 +48,22 @@ def _tagname_to_abbrev(tag):
     )
 
 
+# Elements whose text refers to an ID, mapped to the tag of the referred
+# element and whether their attributes are translated as well
+_TEXT_REF_TAGS = {
+    "{%s}filter" % oval_ns: ("{%s}state" % oval_ns, False),
+    "{%s#independent}var_ref" % oval_ns: ("{%s}variable" % oval_ns, False),
+    "{%s}test_action_ref" % ocil_ns: ("{%s}action" % ocil_ns, True),
+}
+
+# Attributes referring to an ID, mapped to the tags of the referred elements
+_REF_ATTR_TAGS = dict()
+for _namespace, _refattr_to_tag in ((oval_ns, OVALREFATTR_TO_TAG),
+                                    (ocil_ns, OCILREFATTR_TO_TAG)):
+    for _attr, _tag in _refattr_to_tag.items():
+        _REF_ATTR_TAGS.setdefault(_attr, []).append("{%s}%s" % (_namespace, _tag))
+
+
 class IDTranslator(object):
     """This class is designed to handle the mapping of meaningful, human-readable
     names to IDs in the formats required by the SCAP checking systems, such as
@@ -55,21 +71,35 @@ class IDTranslator(object):
 
     def __init__(self, content_id):
         self.content_id = content_id
+        # tag -> (prefix, abbreviation)
+        self._tag_parts = dict()
+        # (tag, name) -> generated ID
+        self._ids = dict()
 
     def generate_id(self, tagname, name):
-        return "%s:%s-%s:%s:1" % (
-            _namespace_to_prefix(tagname),
-            self.content_id, name,
-            _tagname_to_abbrev(tagname)
-        )
+        key = (tagname, name)
+        try:
+            return self._ids[key]
+        except KeyError:
+            pass
+
+        parts = self._tag_parts.get(tagname)
+        if parts is None:
+            parts = (_namespace_to_prefix(tagname), _tagname_to_abbrev(tagname))
+            self._tag_parts[tagname] = parts
+
+        new_id = "%s:%s-%s:%s:1" % (parts[0], self.content_id, name, parts[1])
+        self._ids[key] = new_id
+        return new_id
 
     def translate(self, tree, store_defname=False):
-        for element in tree.getiterator():
+        generate_id = self.generate_id
+        definition_tag = "{%s}definition" % oval_ns
+        for element in tree.iter():
             idname = element.get("id")
             if idname:
                 # store the old name if requested (for OVAL definitions)
-                if store_defname and \
-                        element.tag == "{%s}definition" % oval_ns:
+                if store_defname and element.tag == definition_tag:
                     metadata = element.find("{%s}metadata" % oval_ns)
                     if metadata is None:
                         metadata = ElementTree.SubElement(element, "metadata")
@@ -78,27 +108,21 @@ class IDTranslator(object):
                     metadata.append(defnam)
 
                 # set the element to the new identifier
-                element.set("id", self.generate_id(element.tag, idname))
-                # continue
-            if element.tag == "{%s}filter" % oval_ns:
-                element.text = self.generate_id("{%s}state" % oval_ns,
-                                                element.text)
-                continue
-            if element.tag == "{%s#independent}var_ref" % oval_ns:
-                element.text = self.generate_id("{%s}variable" % oval_ns,
-                                                element.text)
-                continue
-            for attr in element.keys():
-                if attr in OVALREFATTR_TO_TAG.keys():
-                    element.set(attr, self.generate_id(
-                        "{%s}%s" % (oval_ns, OVALREFATTR_TO_TAG[attr]),
-                        element.get(attr)))
-                if attr in OCILREFATTR_TO_TAG.keys():
-                    element.set(attr, self.generate_id(
-                        "{%s}%s" % (ocil_ns, OCILREFATTR_TO_TAG[attr]),
-                        element.get(attr)))
-            if element.tag == "{%s}test_action_ref" % ocil_ns:
-                element.text = self.generate_id("{%s}action" % ocil_ns,
-                                                element.text)
+                element.set("id", generate_id(element.tag, idname))
+
+            text_ref = _TEXT_REF_TAGS.get(element.tag)
+            if text_ref is not None:
+                ref_tag, translate_attributes = text_ref
+                element.text = generate_id(ref_tag, element.text)
+                if not translate_attributes:
+                    continue
+
+            for attr, value in element.items():
+                ref_tags = _REF_ATTR_TAGS.get(attr)
+                if ref_tags is None:
+                    continue
+                for ref_tag in ref_tags:
+                    value = generate_id(ref_tag, value)
+                element.set(attr, value)
 
         return tree
@@ -1,12 +1,26 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import atexit
+import hashlib
+import io
+import json
 import os.path
+import tempfile
+import time
+
 import jinja2
+import jinja2.meta
 
+from .constants import (JINJA_MACROS_BASE_DEFINITIONS,
+                        JINJA_MACROS_HIGHLEVEL_DEFINITIONS)
 from .utils import required_key
 
 
+# in MiB
+DEFAULT_RENDER_CACHE_MAX_SIZE = 1024
+
+
 class AbsolutePathFileSystemLoader(jinja2.BaseLoader):
     """Loads templates from the file system. This loader insists on absolute
     paths and fails if a relative path is provided.
@@ -68,12 +82,373 @@ def _get_jinja_environment(substitutions_dict):
 _get_jinja_environment.env = None
 
 
+def _hash_file(filepath):
+    digest = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _get_macros_hash():
+    """
+    Return a hash of both macro definition files. The hash is recomputed only
+    when the mtime or size of one of the files changes.
+    """
+    stamps = []
+    for filename in (JINJA_MACROS_BASE_DEFINITIONS, JINJA_MACROS_HIGHLEVEL_DEFINITIONS):
+        try:
+            stat = os.stat(filename)
+            stamps.append((filename, stat.st_mtime, stat.st_size))
+        except OSError:
+            stamps.append((filename, None, None))
+    stamps = tuple(stamps)
+
+    if _get_macros_hash.stamps != stamps:
+        digest = hashlib.sha1()
+        for filename, mtime, _ in stamps:
+            if mtime is not None:
+                digest.update(_hash_file(filename).encode("utf-8"))
+        _get_macros_hash.stamps = stamps
+        _get_macros_hash.value = digest.hexdigest()
+    return _get_macros_hash.value
+
+
+_get_macros_hash.stamps = None
+_get_macros_hash.value = None
+
+
+def _stable_json_default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if callable(obj):
+        # Macros are covered by the hash of the macro files, only note their presence.
+        return "<callable>"
+    return repr(obj)
+
+
+def get_substitutions_dict_hash(substitutions_dict):
+    """
+    Return a hash of the substitutions_dict that doesn't depend on the
+    order of keys or on the identity of its values, so it can be compared
+    across processes. Keys starting with jinja2_ configure the templating
+    itself and don't affect the rendered output, so they are left out.
+
+    Returns None if the dictionary can't be serialized.
+    """
+    relevant = dict(
+        (key, value) for key, value in substitutions_dict.items()
+        if not str(key).startswith("jinja2_"))
+    try:
+        serialized = json.dumps(
+            relevant, sort_keys=True, default=_stable_json_default)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+def get_substitutions_hash(substitutions_dict, names=None):
+    """
+    Return a hash of the values of the given names in substitutions_dict,
+    or of the whole dictionary if names is None. If one of the values is
+    a macro, the hash covers the macro definition files as well.
+
+    Returns None if the values can't be serialized.
+    """
+    if names is not None:
+        substitutions_dict = dict(
+            (name, substitutions_dict.get(name)) for name in names)
+    dict_hash = get_substitutions_dict_hash(substitutions_dict)
+    if dict_hash is None:
+        return None
+    if any(callable(value) for value in substitutions_dict.values()):
+        digest = hashlib.sha1(dict_hash.encode("utf-8"))
+        digest.update(_get_macros_hash().encode("utf-8"))
+        dict_hash = digest.hexdigest()
+    return dict_hash
+
+
+class RenderCache(object):
+    """
+    On-disk cache of rendered templates, shared by all processes and products
+    that point to the same cache_dir.
+
+    Entries are addressed by a hash of the template source and of the
+    substitutions the template looks up, including those looked up by the
+    macro files if the template calls a macro. Templates that include or
+    import other templates are not cached, as the key wouldn't cover the
+    referenced files; for all others a stale entry can never be returned
+    and no explicit invalidation is needed. Every hit refreshes the
+    mtime of the entry, and when the cache grows beyond max_size bytes the
+    least recently used entries are removed.
+    """
+
+    STATS_FILENAME = "stats.log"
+    PRUNE_STAMP_FILENAME = ".last-prune"
+    # Pruning has to stat every entry, don't do it more often than this (seconds)
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def get_key(self, source, substitutions_dict, names=None):
+        """
+        Return the key of the output of the template source rendered with
+        substitutions_dict. If names is given, only the values of these
+        names are taken into account.
+        """
+        dict_hash = get_substitutions_hash(substitutions_dict, names)
+        if dict_hash is None:
+            return None
+        digest = hashlib.sha1(source)
+        digest.update(dict_hash.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def load(self, key):
+        path = self._get_entry_path(key)
+        try:
+            with io.open(path, "r", encoding="utf-8") as f:
+                contents = f.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return contents
+
+    def store(self, key, contents):
+        path = self._get_entry_path(key)
+        entry_dir = os.path.dirname(path)
+        try:
+            if not os.path.isdir(entry_dir):
+                os.makedirs(entry_dir)
+        except OSError:
+            # another process might have created it in the meantime
+            if not os.path.isdir(entry_dir):
+                return
+        # Write to a temporary file first so that concurrent readers never
+        # see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, prefix=".tmp-")
+        try:
+            with io.open(fd, "w", encoding="utf-8") as f:
+                f.write(contents)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.stores += 1
+
+    def _prune_is_due(self):
+        stamp = os.path.join(self.cache_dir, self.PRUNE_STAMP_FILENAME)
+        try:
+            if time.time() - os.path.getmtime(stamp) < self.PRUNE_INTERVAL:
+                return False
+        except OSError:
+            pass
+        with open(stamp, "w"):
+            pass
+        return True
+
+    def prune(self):
+        """
+        Remove least recently used entries until the cache fits into max_size.
+        """
+        entries = []
+        total_size = 0
+        for subdir in os.listdir(self.cache_dir):
+            subdir_path = os.path.join(self.cache_dir, subdir)
+            if not os.path.isdir(subdir_path):
+                continue
+            for name in os.listdir(subdir_path):
+                path = os.path.join(subdir_path, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            self.evictions += 1
+
+    def finish(self):
+        """
+        Prune the cache if this process added entries to it and record
+        the statistics of this process.
+        """
+        try:
+            if self.stores and self._prune_is_due():
+                self.prune()
+            if not (self.hits or self.misses):
+                return
+            line = "%d %d %d %d\n" % (self.hits, self.misses, self.stores, self.evictions)
+            with open(os.path.join(self.cache_dir, self.STATS_FILENAME), "a") as f:
+                f.write(line)
+            self.hits = self.misses = self.stores = self.evictions = 0
+        except (IOError, OSError):
+            # The cache is only an optimization, failing here must not fail the build
+            pass
+
+
+def get_render_cache_stats(cache_dir):
+    """
+    Sum up statistics recorded by all processes that used the render cache
+    in cache_dir. Returns a dictionary with hits, misses, stores and evictions.
+    """
+    stats = dict(hits=0, misses=0, stores=0, evictions=0)
+    stats_path = os.path.join(cache_dir, RenderCache.STATS_FILENAME)
+    if not os.path.exists(stats_path):
+        return stats
+    with open(stats_path, "r") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 4:
+                continue
+            hits, misses, stores, evictions = [int(field) for field in fields]
+            stats["hits"] += hits
+            stats["misses"] += misses
+            stats["stores"] += stores
+            stats["evictions"] += evictions
+    return stats
+
+
+def _get_render_cache(substitutions_dict):
+    if not _get_render_cache.initialized:
+        _get_render_cache.initialized = True
+        if substitutions_dict.get("jinja2_render_cache_enabled") in (True, "true"):
+            cache_dir = required_key(substitutions_dict, "jinja2_render_cache_dir")
+            max_size = int(substitutions_dict.get(
+                "jinja2_render_cache_max_size", DEFAULT_RENDER_CACHE_MAX_SIZE))
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            _get_render_cache.cache = RenderCache(cache_dir, max_size * 1024 * 1024)
+            atexit.register(_get_render_cache.cache.finish)
+
+    return _get_render_cache.cache
+
+
+_get_render_cache.initialized = False
+_get_render_cache.cache = None
+
+
+def finish_render_cache():
+    """
+    Record statistics and prune the render cache, if it is in use. This
+    happens automatically at exit, but worker processes that never exit
+    normally (e.g. members of a multiprocessing pool) have to call it.
+    """
+    if _get_render_cache.cache is not None:
+        _get_render_cache.cache.finish()
+
+
+def preload_templates(filenames, substitutions_dict):
+    """
+    Compile the given templates ahead of time, so that processes forked
+    afterwards don't have to compile them again.
+    """
+    env = _get_jinja_environment(substitutions_dict)
+    for filename in filenames:
+        env.get_template(os.path.abspath(filename))
+
+
+def _get_source_variables(source, substitutions_dict):
+    ast = _get_jinja_environment(substitutions_dict).parse(source)
+    if list(jinja2.meta.find_referenced_templates(ast)):
+        return None
+    return jinja2.meta.find_undeclared_variables(ast)
+
+
+def get_template_variables(filepath, substitutions_dict):
+    """
+    Return the set of names the template in filepath looks up in the
+    substitutions dictionary, or None if the template includes or imports
+    other templates, as their names aren't known without loading them.
+    """
+    with io.open(filepath, "r", encoding="utf-8") as f:
+        return _get_source_variables(f.read(), substitutions_dict)
+
+
+def _get_cached_template_variables(filepath, source, substitutions_dict):
+    """
+    Same as get_template_variables for the given source of the template,
+    but the source is parsed only once per process.
+    """
+    cache = _get_cached_template_variables.cache
+    key = (filepath, hashlib.sha1(source).hexdigest())
+    if key not in cache:
+        cache[key] = _get_source_variables(source.decode("utf-8"), substitutions_dict)
+    return cache[key]
+
+
+_get_cached_template_variables.cache = dict()
+
+
+def _get_macros_variables(substitutions_dict):
+    """
+    Return the set of names the macro definition files look up in the
+    substitutions dictionary, they are parsed again only when they change.
+    """
+    macros_hash = _get_macros_hash()
+    if _get_macros_variables.hash != macros_hash:
+        variables = set()
+        for filename in (JINJA_MACROS_BASE_DEFINITIONS, JINJA_MACROS_HIGHLEVEL_DEFINITIONS):
+            if os.path.isfile(filename):
+                variables |= get_template_variables(filename, substitutions_dict) or set()
+        _get_macros_variables.hash = macros_hash
+        _get_macros_variables.value = frozenset(variables)
+    return _get_macros_variables.value
+
+
+_get_macros_variables.hash = None
+_get_macros_variables.value = None
+
+
+def _get_macros_cache_key(filename, substitutions_dict):
+    dict_hash = get_substitutions_dict_hash(substitutions_dict)
+    if dict_hash is None:
+        return None
+    try:
+        mtime = os.path.getmtime(filename)
+    except OSError:
+        return None
+    # Macros present in substitutions_dict are only noted by name in dict_hash,
+    # the hash of the macro files makes sure they are up to date as well.
+    return (os.path.abspath(filename), mtime, _get_macros_hash(), dict_hash)
+
+
 def extract_substitutions_dict_from_template(filename, substitutions_dict):
     """
     Treat the given filename as a jinja2 file containing macro definitions,
     and export definitions that don't start with _ as a name->macro dictionary.
     During macro compilation, symbols from substitutions_dict may be used in those definitions.
+
+    The definitions are cached, they are compiled again only if the file
+    or the content of substitutions_dict changes.
     """
+    cache = extract_substitutions_dict_from_template.cache
+    key = _get_macros_cache_key(filename, substitutions_dict)
+    if key is not None and key in cache:
+        return dict(cache[key])
+
     template = _get_jinja_environment(substitutions_dict).get_template(filename)
     all_symbols = template.make_module(substitutions_dict).__dict__
     symbols_to_export = dict()
@@ -81,10 +456,42 @@ def extract_substitutions_dict_from_template(filename, substitutions_dict):
         if name.startswith("_"):
             continue
         symbols_to_export[name] = symbol
-    return symbols_to_export
+
+    if key is not None:
+        cache[key] = symbols_to_export
+    return dict(symbols_to_export)
+
+
+extract_substitutions_dict_from_template.cache = dict()
 
 
 def process_file(filepath, substitutions_dict):
     filepath = os.path.abspath(filepath)
-    template = _get_jinja_environment(substitutions_dict).get_template(filepath)
-    return template.render(substitutions_dict)
+    render_cache = _get_render_cache(substitutions_dict)
+    if render_cache is None:
+        template = _get_jinja_environment(substitutions_dict).get_template(filepath)
+        return template.render(substitutions_dict)
+
+    env = _get_jinja_environment(substitutions_dict)
+    with open(filepath, "rb") as f:
+        source = f.read()
+    # Hashing only the names the template looks up is much cheaper than
+    # hashing the whole substitutions_dict
+    names = _get_cached_template_variables(filepath, source, substitutions_dict)
+    if names is None:
+        # The key would only cover this file, not the ones it includes
+        key = None
+    else:
+        if any(callable(substitutions_dict.get(name)) for name in names):
+            # Macros look up names of their own
+            names = set(names) | _get_macros_variables(substitutions_dict)
+        key = render_cache.get_key(source, substitutions_dict, names)
+    if key is not None:
+        rendered = render_cache.load(key)
+        if rendered is not None:
+            return rendered
+
+    rendered = env.get_template(filepath).render(substitutions_dict)
+    if key is not None:
+        render_cache.store(key, rendered)
+    return rendered
@@ -4,13 +4,15 @@ from __future__ import print_function
 import sys
 import os
 import re
+import collections
 import argparse
+import json
 import tempfile
 import subprocess
 
 from .constants import oval_footer as footer
 from .constants import oval_namespace as ovalns
-from .rules import get_rule_dir_id, get_rule_dir_ovals, find_rule_dirs
+from .rules import get_rule_dir_id, get_rule_dir_ovals, get_rule_index
 from .xml import ElementTree as ET
 from .xml import oval_generated_header
 from .yaml import process_file
@@ -35,20 +37,28 @@ objects = ET.Element("oval:objects")
 states = ET.Element("oval:states")
 variables = ET.Element("oval:variables")
 silent_mode = False
+# File where the index of OVAL files is kept between runs, if set
+index_cache = None
+# IDs of all elements in the subtree of each of the above elements
+element_ids = collections.defaultdict(set)
+# Files already added because of extend_definition
+included_files = set()
 
 
 # append new child ONLY if it's not a duplicate
 def append(element, newchild):
     global silent_mode
     newid = newchild.get("id")
-    existing = element.find(".//*[@id='" + newid + "']")
-    if existing is not None:
+    ids = element_ids[element]
+    if newid in ids:
         if not silent_mode:
             sys.stderr.write("Notification: this ID is used more than once " +
                              "and should represent equivalent elements: " +
                              newid + "\n")
     else:
         element.append(newchild)
+        ids.update(node.get("id") for node in newchild.iter()
+                   if node.get("id") is not None)
 
 
 def _add_elements(body, header):
@@ -77,6 +87,11 @@ def _add_elements(body, header):
                                               % ovalns):
                 defid = defchild.get("definition_ref")
                 extend_ref = find_testfile_or_exit(defid)
+                # each file is added only once, also breaks cycles of
+                # definitions extending each other
+                if extend_ref in included_files:
+                    continue
+                included_files.add(extend_ref)
                 includedbody = read_ovaldefgroup_file(extend_ref)
                 # recursively add the elements in the other file
                 _add_elements(includedbody, header)
@@ -227,6 +242,146 @@ def find_testfile_or_exit(testfile):
         return _testfile
 
 
+class OVALFileIndex(object):
+    """
+    Index of files and rule directories under the paths searched by
+    find_testfile(), so that a lookup doesn't have to walk them. The index
+    of a path is valid as long as the modification times of all directories
+    under it are unchanged, which allows it to be kept between runs.
+    """
+
+    VERSION = 1
+
+    def __init__(self, paths):
+        self.paths = paths
+        # Relative paths index other directories once CWD changes
+        self.cwd = os.getcwd()
+        # abspath of a path -> index of the path
+        self.path_indexes = dict()
+
+    @staticmethod
+    def _index_path(path):
+        dirs = dict()
+        # file name -> (position of its directory in the walk, file path)
+        files = dict()
+        # rule id -> list of rule directories in the walk order
+        rule_dirs = dict()
+        rule_index = get_rule_index(path)
+        for position, (root, subdirs, filenames) in enumerate(rule_index.walk()):
+            dirs[root] = rule_index.dirs[root].mtime
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                if os.path.isfile(file_path):
+                    files[filename] = (position, file_path)
+            for dir_name in subdirs:
+                dir_path = os.path.join(root, dir_name)
+                if rule_index.is_rule_dir(dir_path):
+                    rule_dirs.setdefault(get_rule_dir_id(dir_path), []).append(dir_path)
+        return dict(path=path, dirs=dirs, files=files, rule_dirs=rule_dirs)
+
+    @staticmethod
+    def _path_index_is_valid(path_index):
+        for dir_path, mtime in path_index["dirs"].items():
+            try:
+                if os.path.getmtime(dir_path) != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def update(self):
+        """
+        (Re)index the paths whose index is missing or stale.
+
+        Return: True if any path was indexed
+        """
+        changed = False
+        for path in self.paths:
+            key = os.path.abspath(path)
+            path_index = self.path_indexes.get(key)
+            if path_index is None or path_index["path"] != path or \
+                    not self._path_index_is_valid(path_index):
+                self.path_indexes[key] = self._index_path(path)
+                changed = True
+        return changed
+
+    def find(self, oval_id):
+        """
+        Find the OVAL file of oval_id the same way as walking the paths does:
+        a file from a later directory of the walk and a later path wins, but
+        a rule directory's OVAL overrides files found in the same path.
+        """
+        candidates = [oval_id, "%s.xml" % oval_id]
+
+        found_file = None
+        for path in self.paths:
+            path_index = self.path_indexes[os.path.abspath(path)]
+
+            best = None
+            for candidate in candidates:
+                entry = path_index["files"].get(candidate)
+                if entry is not None and (best is None or entry[0] > best[0]):
+                    best = entry
+            if best is not None:
+                found_file = best[1]
+
+            for rule_dir in path_index["rule_dirs"].get(oval_id, []):
+                ovals = get_rule_dir_ovals(rule_dir, product="shared")
+                if ovals:
+                    found_file = ovals[0]
+                    break
+
+        return found_file
+
+    def load(self, filename):
+        """
+        Load indexes of paths stored by save(), stale ones get reindexed by
+        update().
+        """
+        try:
+            with open(filename, "r") as index_file:
+                data = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get("version") != self.VERSION:
+            return
+        self.path_indexes.update(data["paths"])
+
+    def save(self, filename):
+        data = dict(version=self.VERSION, paths=self.path_indexes)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as index_file:
+                json.dump(data, index_file)
+            os.rename(tmp_path, filename)
+        except (IOError, OSError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def get_oval_file_index():
+    """
+    Return the index of OVAL files used by find_testfile(). It is built once
+    and, if index_cache is set, stored there to be reused by the next run.
+    """
+    paths = ['.', SHARED_OVAL, LINUX_OS_GUIDE]
+    index = get_oval_file_index.index
+    if index is not None and index.cwd == os.getcwd():
+        return index
+
+    index = OVALFileIndex(paths)
+    if index_cache:
+        index.load(index_cache)
+    if index.update() and index_cache:
+        index.save(index_cache)
+    get_oval_file_index.index = index
+    return index
+
+
+get_oval_file_index.index = None
+
+
 def find_testfile(oval_id):
     """
     Find OVAL file by id in CWD, SHARED_OVAL, or LINUX_OS_GUIDE. Understands rule
@@ -241,26 +396,7 @@ def find_testfile(oval_id):
         oval_id, _ = os.path.splitext(oval_id)
         oval_id = os.path.basename(oval_id)
 
-    candidates = [oval_id, "%s.xml" % oval_id]
-
-    found_file = None
-    for path in ['.', SHARED_OVAL, LINUX_OS_GUIDE]:
-        for root, _, _ in os.walk(path):
-            for candidate in candidates:
-                search_file = os.path.join(root, candidate).strip()
-                if os.path.isfile(search_file):
-                    found_file = search_file
-                    break
-
-        for rule_dir in find_rule_dirs(path):
-            rule_id = get_rule_dir_id(rule_dir)
-            if rule_id == oval_id:
-                ovals = get_rule_dir_ovals(rule_dir, product="shared")
-                if ovals:
-                    found_file = ovals[0]
-                    break
-
-    return found_file
+    return get_oval_file_index().find(oval_id)
 
 
 def read_ovaldefgroup_file(testfile):
@@ -297,6 +433,9 @@ def parse_options():
     parser.add_argument("-q", "--quiet", "--silent", default=False,
                         action="store_true", dest="silent_mode",
                         help="Don't show any output when testing OVAL files")
+    parser.add_argument("--index-cache", dest="index_cache", action="store",
+                        help="File where the index of OVAL files is kept "
+                        "between runs, it's rebuilt for changed directories")
     parser.add_argument("xmlfile", metavar="XMLFILE", help="OVAL XML file")
     args = parser.parse_args()
 
@@ -310,14 +449,17 @@ def main():
     global states
     global variables
     global silent_mode
+    global index_cache
 
     args = parse_options()
     silent_mode = args.silent_mode
+    index_cache = args.index_cache
     oval_version = args.oval_version
 
     testfile = args.xmlfile
     header = oval_generated_header("testoval.py", oval_version, "0.0.1")
     testfile = find_testfile_or_exit(testfile)
+    included_files.add(testfile)
     body = read_ovaldefgroup_file(testfile)
 
     defname = _add_elements(body, header)
@@ -373,6 +515,8 @@ def main():
     objects = ET.Element("oval:objects")
     states = ET.Element("oval:states")
     variables = ET.Element("oval:variables")
+    element_ids.clear()
+    included_files.clear()
 
     # 'false' keyword wasn't found in oscap's command output
     # exit with '0' to indicate OVAL scan TRUE result
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import collections
+
 from .xml import ElementTree as ET
 
 
@@ -96,6 +98,166 @@ def find_extending_defs(oval_groups, defn):
     return finder.result
 
 
+class OVALDependencyGraph(object):
+    """
+    Graph of references between the entities of OVAL container groups.
+
+    Nodes are (group name, ID) tuples. References are followed in the same
+    way as ElementFinder does, but every entity is examined only once and
+    the transitive sets of external variables and extended definitions
+    are memoized, so entities shared by many definitions are not
+    traversed again for each of them.
+
+    The graph doesn't observe changes of the container groups done after
+    it has been built. A reference to an entity which doesn't exist
+    raises KeyError when the entity is needed to answer a query.
+    """
+
+    def __init__(self, oval_groups):
+        self.oval_groups = oval_groups
+        self._references = {}
+        self._variables = {}
+        self._extends = {}
+        for group_name, group in oval_groups.items():
+            for entity_id, entity in group.items():
+                self._add_entity((group_name, entity_id), entity)
+
+        self._closures = {}
+        self._resolving = set()
+        self._extended_definitions = {}
+        self._needed_variables = {}
+        self._extending_definitions = None
+
+    def _add_entity(self, node, entity):
+        references = set()
+        variables = set()
+        extends = set()
+        elements = [entity]
+        while elements:
+            element = elements.pop()
+            if element.tag.endswith("external_variable"):
+                variables.add(element.attrib["id"])
+                continue
+            if element.tag.endswith("extend_definition"):
+                extends.add(element.attrib["definition_ref"])
+                continue
+
+            name = _strip_ns_from_tag(element.tag)
+            if name in REFERENCE_TO_GROUP:
+                references.add((REFERENCE_TO_GROUP[name], element.text))
+            else:
+                _attr_group = _search_element_for_reference_attributes(element)
+                if _attr_group is not None:
+                    ref_attribute_name, entity_id = _attr_group
+                    references.add((REFERENCE_TO_GROUP[ref_attribute_name], entity_id))
+            elements.extend(element)
+
+        self._references[node] = references
+        self._variables[node] = variables
+        self._extends[node] = extends
+
+    def _get_closure(self, node):
+        """
+        Returns a tuple of external variable IDs and IDs of definitions
+        extended by the entity or by any entity it references.
+        """
+        closure = self._closures.get(node)
+        if closure is not None:
+            return closure
+        if node not in self._references:
+            raise KeyError(node[1])
+        if node in self._resolving:
+            raise ValueError(
+                "The OVAL entity '{0}' references itself.".format(node[1]))
+
+        self._resolving.add(node)
+        try:
+            variables = set(self._variables[node])
+            extends = set(self._extends[node])
+            for reference in self._references[node]:
+                reference_variables, reference_extends = self._get_closure(reference)
+                variables |= reference_variables
+                extends |= reference_extends
+        finally:
+            self._resolving.remove(node)
+
+        closure = (frozenset(variables), frozenset(extends))
+        self._closures[node] = closure
+        return closure
+
+    def has_definition(self, def_id):
+        return ("definitions", def_id) in self._references
+
+    def definition_variables(self, def_id):
+        """
+        Returns IDs of external variables referenced by the definition,
+        not considering the definitions it extends.
+        """
+        return self._get_closure(("definitions", def_id))[0]
+
+    def extended_definitions(self, def_id):
+        """
+        Returns IDs of the definition and of all definitions it extends,
+        directly or through other definitions. IDs of definitions which
+        don't exist are included, but can't be followed any further.
+        """
+        known = self._extended_definitions.get(def_id)
+        if known is not None:
+            return known
+
+        result = set()
+        queue = [def_id]
+        while queue:
+            current_id = queue.pop()
+            if current_id in result:
+                continue
+            result.add(current_id)
+            current_known = self._extended_definitions.get(current_id)
+            if current_known is not None:
+                result |= current_known
+                continue
+            if not self.has_definition(current_id):
+                continue
+            queue.extend(self._get_closure(("definitions", current_id))[1] - result)
+
+        result = frozenset(result)
+        self._extended_definitions[def_id] = result
+        return result
+
+    def needed_variables(self, def_id):
+        """
+        Returns IDs of external variables needed to evaluate the definition,
+        including those needed by definitions it extends.
+        """
+        known = self._needed_variables.get(def_id)
+        if known is not None:
+            return known
+
+        result = set()
+        for extended_id in self.extended_definitions(def_id):
+            if self.has_definition(extended_id):
+                result |= self.definition_variables(extended_id)
+
+        result = frozenset(result)
+        self._needed_variables[def_id] = result
+        return result
+
+    def extending_definitions(self, def_id):
+        """
+        Returns IDs of definitions which extend the given definition,
+        directly or through other definitions.
+        """
+        if self._extending_definitions is None:
+            self._extending_definitions = collections.defaultdict(set)
+            for node in self._references:
+                if node[0] != "definitions":
+                    continue
+                for extended_id in self.extended_definitions(node[1]):
+                    if extended_id != node[1]:
+                        self._extending_definitions[extended_id].add(node[1])
+        return frozenset(self._extending_definitions.get(def_id, ()))
+
+
 def get_container_groups(fname):
     return _get_container_oval_groups_from_tree(ET.parse(fname))
 
@@ -105,8 +267,17 @@ def _strip_ns_from_tag(tag_name):
 
 
 def _get_container_oval_groups_from_tree(element_tree):
-    root = element_tree.getroot()
+    return get_container_groups_from_root(element_tree.getroot())
+
+
+def get_container_groups_from_root(root):
+    """
+    Given the root element of an already parsed OVAL document, return
+    a dictionary mapping each container group name to a dictionary
+    of its elements indexed by their IDs.
 
+    The elements are shared with the tree, not copied.
+    """
     oval_groups = {}
     for child in root:
         group_name = _strip_ns_from_tag(child.tag)
@@ -117,9 +288,10 @@ def _get_container_oval_groups_from_tree(element_tree):
 
 
 def _get_resolved_definitions(oval_groups):
+    graph = OVALDependencyGraph(oval_groups)
     def_id_to_vars_ids = {}
-    for def_id, def_el in oval_groups["definitions"].items():
-        def_id_to_vars_ids[def_id] = resolve_definition(oval_groups, def_el)
+    for def_id in oval_groups["definitions"]:
+        def_id_to_vars_ids[def_id] = set(graph.definition_variables(def_id))
     return def_id_to_vars_ids
 
 
@@ -1,11 +1,19 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import hashlib
+import json
 import os
-
+import tempfile
+from collections import namedtuple
 
 from .build_remediations import REMEDIATION_TO_EXT_MAP as REMEDIATION_MAP
 from .build_remediations import is_applicable_for_product
+from .shims import scandir
+
+
+# Directory where get_rule_index() keeps the indexes between runs, if set
+index_cache_dir = None
 
 
 def is_applicable(platform, product):
@@ -58,6 +66,10 @@ def is_rule_dir(dir_path):
     To be valid, dir_path must exist and be a directory and the file
     returned by get_rule_dir_yaml(dir_path) must exist.
     """
+    index = _find_rule_index(dir_path)
+    if index is not None:
+        return index.is_rule_dir(dir_path)
+
     rule_yaml = get_rule_dir_yaml(dir_path)
 
     is_dir = os.path.isdir(dir_path)
@@ -76,37 +88,59 @@ def _applies_to_product(file_name, product):
     return not product or (file_name == "shared" or file_name == product)
 
 
-def get_rule_dir_ovals(dir_path, product=None):
+def _filter_rule_dir_files(files_dir, file_names, extension, product):
     """
-    Gets a list of OVALs contained in a rule directory. If product is
-    None, returns all OVALs. If product is not None, returns applicable
-    OVALs in order of priority:
+    Returns paths of the files in files_dir with the given extension that
+    apply to the product, the product specific ones first.
+    """
+    results = []
+    for file_name_ext in file_names:
+        file_name, file_ext = os.path.splitext(file_name_ext)
+        file_path = os.path.join(files_dir, file_name_ext)
 
-        {{{ product }}}.xml -> shared.xml
+        if file_ext == extension and _applies_to_product(file_name, product):
+            if file_name == 'shared':
+                results.append(file_path)
+            else:
+                results.insert(0, file_path)
 
-    Only returns OVALs which exist.
+    return results
+
+
+def _get_rule_dir_files(dir_path, subdir, extension, product):
+    """
+    Returns applicable files of the given subdirectory of a rule directory,
+    taken from the RuleIndex if the rule directory is indexed.
     """
+    index = _find_rule_index(dir_path)
+    if index is not None:
+        files = index.get_rule_dir_files(dir_path, subdir)
+        if files is not None:
+            return _filter_rule_dir_files(
+                os.path.join(dir_path, subdir), files, extension, product)
 
     if not is_rule_dir(dir_path):
         return []
 
-    oval_dir = os.path.join(dir_path, "oval")
-    has_oval_dir = os.path.isdir(oval_dir)
-    if not has_oval_dir:
+    files_dir = os.path.join(dir_path, subdir)
+    if not os.path.isdir(files_dir):
         return []
 
-    results = []
-    for oval_file in os.listdir(oval_dir):
-        file_name, ext = os.path.splitext(oval_file)
-        oval_path = os.path.join(oval_dir, oval_file)
+    return _filter_rule_dir_files(
+        files_dir, os.listdir(files_dir), extension, product)
 
-        if ext == ".xml" and _applies_to_product(file_name, product):
-            if file_name == 'shared':
-                results.append(oval_path)
-            else:
-                results.insert(0, oval_path)
 
-    return results
+def get_rule_dir_ovals(dir_path, product=None):
+    """
+    Gets a list of OVALs contained in a rule directory. If product is
+    None, returns all OVALs. If product is not None, returns applicable
+    OVALs in order of priority:
+
+        {{{ product }}}.xml -> shared.xml
+
+    Only returns OVALs which exist.
+    """
+    return _get_rule_dir_files(dir_path, "oval", ".xml", product)
 
 
 def get_rule_dir_remediations(dir_path, remediation_type, product=None):
@@ -120,36 +154,310 @@ def get_rule_dir_remediations(dir_path, remediation_type, product=None):
 
     Only returns remediations which exist.
     """
+    ext = REMEDIATION_MAP[remediation_type]
+    return _get_rule_dir_files(dir_path, remediation_type, ext, product)
 
-    if not is_rule_dir(dir_path):
-        return []
 
-    remediations_dir = os.path.join(dir_path, remediation_type)
-    has_remediations_dir = os.path.isdir(remediations_dir)
-    ext = REMEDIATION_MAP[remediation_type]
-    if not has_remediations_dir:
-        return []
+def get_rule_dir_tests(dir_path):
+    """
+    Gets a list of paths of the files in the tests directory of a rule
+    directory, or an empty list if it has none.
+    """
+    index = _find_rule_index(dir_path)
+    files = None
+    if index is not None:
+        files = index.get_rule_dir_files(dir_path, "tests")
+    if files is None:
+        if not is_rule_dir(dir_path):
+            return []
+        tests_dir = os.path.join(dir_path, "tests")
+        if not os.path.isdir(tests_dir):
+            return []
+        files = os.listdir(tests_dir)
+
+    return [os.path.join(dir_path, "tests", file_name) for file_name in files]
+
+
+def list_dir(dir_path):
+    """
+    Returns a list of (name, is_dir) pairs of the entries of dir_path in
+    the os.listdir order, taken from the RuleIndex if dir_path is indexed.
+    """
+    index = _find_rule_index(dir_path)
+    if index is not None:
+        return index.listdir(dir_path)
+    return [(entry.name, entry.is_dir()) for entry in scandir(dir_path)]
 
-    results = []
-    for remediation_file in os.listdir(remediations_dir):
-        file_name, file_ext = os.path.splitext(remediation_file)
-        remediation_path = os.path.join(remediations_dir, remediation_file)
 
-        if file_ext == ext and _applies_to_product(file_name, product):
-            if file_name == 'shared':
-                results.append(remediation_path)
-            else:
-                results.insert(0, remediation_path)
+def find_rule_dirs(base_dir):
+    """
+    Generator which yields all rule_directories within a given base_dir,
+    in the order os.walk visits them.
+    """
+    for dir_path in get_rule_index(base_dir).get_rule_dirs():
+        yield dir_path
 
-    return results
 
+_DirRecord = namedtuple("_DirRecord", ["mtime", "entries", "subdirs", "links"])
 
-def find_rule_dirs(base_dir):
+
+class RuleIndex(object):
+    """
+    Index of all directories under base_dir, built with one scandir pass.
+    For every directory it records the names of its entries in the order
+    os.listdir returns them, which of them are directories and its
+    modification time. That is enough to find rule directories with their
+    rule.yml, OVALs, remediations and tests, and to walk the tree exactly
+    like os.walk does, without touching the file system again.
+
+    The index stays valid as long as the modification times of all
+    directories are unchanged, which allows it to be kept between runs.
+    """
+
+    VERSION = 1
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        # directory path -> _DirRecord
+        self.dirs = dict()
+
+    def _index_dir(self, dir_path):
+        try:
+            mtime = os.stat(dir_path).st_mtime
+            entries = []
+            subdirs = []
+            links = []
+            for entry in scandir(dir_path):
+                entries.append(entry.name)
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                    if entry.is_symlink():
+                        links.append(entry.name)
+        except OSError:
+            # os.walk skips directories it can't list as well
+            return
+
+        self.dirs[dir_path] = _DirRecord(mtime, entries, subdirs, links)
+        for name in subdirs:
+            # os.walk doesn't follow symbolic links to directories
+            if name not in links:
+                self._index_dir(os.path.join(dir_path, name))
+
+    def is_valid(self):
+        if self.base_dir not in self.dirs:
+            return False
+        for dir_path, record in self.dirs.items():
+            try:
+                if os.stat(dir_path).st_mtime != record.mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def update(self):
+        """
+        Index base_dir again if the index is missing or stale.
+
+        Return: True if base_dir was indexed
+        """
+        if self.is_valid():
+            return False
+        self.dirs = dict()
+        self._index_dir(self.base_dir)
+        return True
+
+    def refresh(self, dir_path):
+        """
+        Index dir_path and its subdirectories again if dir_path changed
+        since it was indexed. Parents of dir_path aren't updated.
+        """
+        record = self.dirs.get(dir_path)
+        if record is None:
+            return
+        try:
+            if os.stat(dir_path).st_mtime == record.mtime:
+                return
+        except OSError:
+            pass
+
+        prefix = os.path.join(dir_path, "")
+        for path in [path for path in self.dirs if path.startswith(prefix)]:
+            del self.dirs[path]
+        del self.dirs[dir_path]
+        self._index_dir(dir_path)
+
+    def walk(self):
+        """
+        Generator which yields (root, subdirs, files) tuples in the same
+        order as os.walk(base_dir).
+        """
+        pending = [self.base_dir]
+        while pending:
+            root = pending.pop()
+            record = self.dirs.get(root)
+            if record is None:
+                continue
+
+            subdirs = set(record.subdirs)
+            files = [name for name in record.entries if name not in subdirs]
+            yield root, list(record.subdirs), files
+
+            pending.extend(os.path.join(root, name)
+                           for name in reversed(record.subdirs)
+                           if name not in record.links)
+
+    def listdir(self, dir_path):
+        """
+        Returns a list of (name, is_dir) pairs of the entries of an indexed
+        directory in the os.listdir order, or None if it isn't indexed.
+        """
+        record = self.dirs.get(dir_path)
+        if record is None:
+            return None
+        subdirs = set(record.subdirs)
+        return [(name, name in subdirs) for name in record.entries]
+
+    def is_rule_dir(self, dir_path):
+        record = self.dirs.get(dir_path)
+        if record is None:
+            # Not indexed, a symbolic link or not a directory at all
+            return os.path.isdir(dir_path) and \
+                os.path.exists(get_rule_dir_yaml(dir_path))
+        return "rule.yml" in record.entries
+
+    def get_rule_dirs(self):
+        """
+        Returns the list of rule directories in the order os.walk visits
+        them.
+        """
+        rule_dirs = []
+        for root, subdirs, _ in self.walk():
+            for dir_name in subdirs:
+                dir_path = os.path.join(root, dir_name)
+                if self.is_rule_dir(dir_path):
+                    rule_dirs.append(dir_path)
+        return rule_dirs
+
+    def get_rule_dir_files(self, dir_path, subdir):
+        """
+        Returns the names of entries of the subdir of a rule directory,
+        an empty list if it doesn't have one, or None if the index can't
+        tell.
+        """
+        record = self.dirs.get(dir_path)
+        if record is None or subdir in record.links:
+            return None
+        if "rule.yml" not in record.entries or subdir not in record.subdirs:
+            return []
+        subdir_path = os.path.join(dir_path, subdir)
+        self.refresh(subdir_path)
+        subdir_record = self.dirs.get(subdir_path)
+        if subdir_record is None:
+            return None
+        return list(subdir_record.entries)
+
+    def _iter_relative_paths(self):
+        pending = [(self.base_dir, "")]
+        while pending:
+            dir_path, relative_path = pending.pop()
+            record = self.dirs.get(dir_path)
+            if record is None:
+                continue
+            yield dir_path, relative_path
+            for name in record.subdirs:
+                if name not in record.links:
+                    pending.append((os.path.join(dir_path, name),
+                                    os.path.join(relative_path, name)))
+
+    def load(self, filename):
+        """
+        Load the index stored by save(), a stale one gets reindexed by
+        update().
+        """
+        try:
+            with open(filename, "r") as index_file:
+                data = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get("version") != self.VERSION or \
+                data.get("base_dir") != os.path.abspath(self.base_dir):
+            return
+
+        stored_dirs = data["dirs"]
+        self.dirs = dict()
+        pending = [(self.base_dir, "")]
+        while pending:
+            dir_path, relative_path = pending.pop()
+            stored = stored_dirs.get(relative_path)
+            if stored is None:
+                continue
+            record = _DirRecord(*stored)
+            self.dirs[dir_path] = record
+            for name in record.subdirs:
+                if name not in record.links:
+                    pending.append((os.path.join(dir_path, name),
+                                    os.path.join(relative_path, name)))
+
+    def save(self, filename):
+        stored_dirs = dict(
+            (relative_path, list(self.dirs[dir_path]))
+            for dir_path, relative_path in self._iter_relative_paths())
+        data = dict(version=self.VERSION,
+                    base_dir=os.path.abspath(self.base_dir), dirs=stored_dirs)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as index_file:
+                json.dump(data, index_file)
+            os.rename(tmp_path, filename)
+        except (IOError, OSError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def get_rule_index(base_dir):
+    """
+    Return the RuleIndex of base_dir. It is built once per process and,
+    if index_cache_dir is set, stored there to be reused by the next run.
+    An index built earlier is updated if any of its directories changed.
+
+    Rule directory functions of this module and is_rule_dir() answer from
+    the indexes returned by this function for directories they cover,
+    after checking that the directories they look at didn't change.
+    """
+    # Paths in the index are based on base_dir as given, a relative
+    # base_dir indexes another directory once CWD changes
+    key = (base_dir, os.path.abspath(base_dir))
+    index = get_rule_index.indexes.get(key)
+    if index is not None:
+        index.update()
+        return index
+
+    index = RuleIndex(base_dir)
+    cache_path = None
+    if index_cache_dir:
+        cache_path = os.path.join(
+            index_cache_dir, "rule-index-%s.json" % hashlib.sha1(
+                os.path.abspath(base_dir).encode("utf-8")).hexdigest())
+        index.load(cache_path)
+    if index.update() and cache_path:
+        index.save(cache_path)
+    get_rule_index.indexes[key] = index
+    return index
+
+
+get_rule_index.indexes = dict()
+
+
+def _find_rule_index(dir_path):
     """
-    Generator which yields all rule_directories within a given base_dir
+    Returns the index returned by get_rule_index() which covers dir_path,
+    with dir_path refreshed, or None.
     """
-    for root, dirs, _ in os.walk(base_dir):
-        for dir_name in dirs:
-            dir_path = os.path.join(root, dir_name)
-            if is_rule_dir(dir_path):
-                yield dir_path
+    for (base_dir, abs_base_dir), index in get_rule_index.indexes.items():
+        if dir_path in index.dirs and (os.path.isabs(base_dir) or
+                                       os.path.abspath(base_dir) == abs_base_dir):
+            index.refresh(dir_path)
+            if dir_path in index.dirs:
+                return index
+    return None
@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import os
 import subprocess
 
 try:
@@ -9,6 +10,35 @@ except ImportError:
     import Queue
 
 
+class _DirEntry(object):
+    """
+    Minimal replacement of os.DirEntry for Pythons without os.scandir.
+    """
+
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
+
+def _scandir(path):
+    return [_DirEntry(path, name) for name in os.listdir(path)]
+
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = _scandir
+
+
 def subprocess_check_output(*popenargs, **kwargs):
     # Backport of subprocess.check_output taken from
     # https://gist.github.com/edufelipe/1027906
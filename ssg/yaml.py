@@ -11,6 +11,7 @@ from .constants import (PKG_MANAGER_TO_SYSTEM,
                         JINJA_MACROS_BASE_DEFINITIONS,
                         JINJA_MACROS_HIGHLEVEL_DEFINITIONS)
 from .constants import DEFAULT_UID_MIN
+from .utils import merge_dicts
 
 try:
     from yaml import CSafeLoader as yaml_SafeLoader
@@ -100,8 +101,10 @@ def open_and_macro_expand(yaml_file, substitutions_dict=None):
     try:
         macro_definitions = extract_substitutions_dict_from_template(
             JINJA_MACROS_BASE_DEFINITIONS, substitutions_dict)
+        # High level macros are built on top of the base ones
         macro_definitions.update(extract_substitutions_dict_from_template(
-            JINJA_MACROS_HIGHLEVEL_DEFINITIONS, substitutions_dict))
+            JINJA_MACROS_HIGHLEVEL_DEFINITIONS,
+            merge_dicts(substitutions_dict, macro_definitions)))
     except Exception as exc:
         msg = ("Error extracting macro definitions: {0}"
                .format(str(exc)))
@@ -123,7 +126,15 @@ def open_raw(yaml_file):
 
 
 def open_environment(build_config_yaml, product_yaml):
-    contents = open_raw(build_config_yaml)
+    return open_product_environment(open_raw(build_config_yaml), product_yaml)
+
+
+def open_product_environment(build_config, product_yaml):
+    """
+    Same as open_environment, but the build configuration is passed as an
+    already loaded dictionary, so it can be shared by several products.
+    """
+    contents = dict(build_config)
     contents.update(open_raw(product_yaml))
     contents.update(_get_implied_properties(contents))
     return contents
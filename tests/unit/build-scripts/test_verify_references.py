@@ -0,0 +1,141 @@
+import json
+import sys
+
+import pytest
+
+import verify_references
+from ssg.constants import XCCDF11_NS, oval_namespace, ocil_cs
+from ssg.xml import ElementTree
+
+
+XCCDF = (
+    '<Benchmark xmlns="{0}">'
+    '<Profile id="base"><select idref="rule_a" selected="true"/></Profile>'
+    '<Profile id="derived" extends="base">'
+    '<select idref="rule_b" selected="true"/></Profile>'
+    '<Group id="group">'
+    '<Rule id="rule_a" severity="low">'
+    '<reference href="{1}">AC-3</reference>'
+    '<check system="{2}"><check-content-ref href="oval.xml" name="def_a"/></check>'
+    '<check system="{3}"><check-content-ref href="ocil.xml" name="ocil_a"/></check>'
+    '</Rule>'
+    '<Rule id="rule_b" severity="low">'
+    '<check system="{2}"><check-content-ref href="oval.xml" name="def_missing"/></check>'
+    '</Rule>'
+    '<Rule id="rule_c"><reference href="{1}">AC-4</reference>{4}</Rule>'
+    '</Group></Benchmark>')
+
+OVAL = (
+    '<oval_definitions xmlns="{0}"><definitions>'
+    '<definition class="compliance" id="def_a"><criteria>'
+    '<extend_definition definition_ref="def_extended"/></criteria></definition>'
+    '<definition class="compliance" id="def_extended"/>'
+    '<definition class="compliance" id="def_unused"/>'
+    '<definition class="inventory" id="def_inventory"/>'
+    '</definitions></oval_definitions>'.format(oval_namespace))
+
+
+def make_xccdf(rule_c_checks=""):
+    return XCCDF.format(XCCDF11_NS, verify_references.nist_ref_href,
+                        oval_namespace, ocil_cs, rule_c_checks)
+
+
+def make_index(rule_c_checks=""):
+    tree = ElementTree.ElementTree(ElementTree.fromstring(make_xccdf(rule_c_checks)))
+    return verify_references.ReferenceIndex(tree)
+
+
+def test_reference_index_rules_and_checks():
+    index = make_index()
+    rules = dict((rule.get("id"), rule) for rule in index.rules)
+
+    assert sorted(rules) == ["rule_a", "rule_b", "rule_c"]
+    assert index.rule_has_check[rules["rule_a"]]
+    assert not index.rule_has_check[rules["rule_c"]]
+    assert index.rule_ref_hrefs[rules["rule_a"]] == set([verify_references.nist_ref_href])
+
+    refs = [(ref.get("name"), check.get("system"), rule.get("id"))
+            for ref, check, rule in index.check_content_refs]
+    assert refs == [
+        ("def_a", oval_namespace, "rule_a"),
+        ("ocil_a", ocil_cs, "rule_a"),
+        ("def_missing", oval_namespace, "rule_b"),
+    ]
+
+    report = verify_references.Report()
+    assert index.get_ovalfiles(report) == set(["oval.xml"])
+    assert report.get_exit_value() == 0
+
+
+def test_reference_index_profile_extends():
+    index = make_index()
+
+    assert index.get_profileruleids("base") == set(["rule_a"])
+    assert index.get_profileruleids("derived") == set(["rule_a", "rule_b"])
+    with pytest.raises(SystemExit):
+        index.get_profileruleids("missing")
+
+
+def test_reference_index_oval():
+    index = make_index()
+    index.index_oval(ElementTree.ElementTree(ElementTree.fromstring(OVAL)))
+
+    assert index.ovaldef_ids == set(["def_a", "def_extended", "def_unused"])
+    assert index.ovaldef_ids_extended == set(["def_extended"])
+
+
+def run_main(monkeypatch, tmpdir, xccdf, *options):
+    tmpdir.join("xccdf.xml").write(xccdf)
+    tmpdir.join("oval.xml").write(OVAL)
+    report_path = str(tmpdir.join("report.json"))
+    monkeypatch.setattr(sys, "argv", ["verify_references.py", "--json-report", report_path] +
+                        list(options) + [str(tmpdir.join("xccdf.xml"))])
+
+    with pytest.raises(SystemExit) as excinfo:
+        verify_references.main()
+    with open(report_path) as f:
+        return excinfo.value.code, json.load(f)
+
+
+def test_json_report(monkeypatch, tmpdir):
+    code, report = run_main(monkeypatch, tmpdir, make_xccdf(), "--all-checks")
+
+    assert code == 1
+    assert report["exit_value"] == 1
+    findings = report["findings"]
+    assert findings["rules_with_invalid_checks"] == ["rule_b"]
+    assert findings["rules_without_checks"] == ["rule_c"]
+    assert findings["rules_without_severity"] == ["rule_c"]
+    assert findings["ovaldefs_unused"] == ["def_unused"]
+    assert findings["non_oval_check_systems"] == []
+
+
+def test_json_report_profile(monkeypatch, tmpdir):
+    code, report = run_main(monkeypatch, tmpdir, make_xccdf(), "--profile", "base",
+                            "--rules-with-nistrefs-outside-profile",
+                            "--rules-without-severity")
+
+    assert code == 1
+    assert report["findings"]["nistrefs_not_in_profile"] == ["rule_c"]
+    # rule_c isn't in the profile, so it isn't checked for severity
+    assert report["findings"]["rules_without_severity"] == []
+
+
+def test_json_report_only_warnings(monkeypatch, tmpdir):
+    code, report = run_main(monkeypatch, tmpdir, make_xccdf(), "--ovaldefs-unused")
+
+    assert code == 0
+    assert report["exit_value"] == 0
+    assert report["findings"]["ovaldefs_unused"] == ["def_unused"]
+
+
+def test_findings_reported_before_early_exit(monkeypatch, tmpdir, capsys):
+    checks = (
+        '<check system="urn:other"/>'
+        '<check system="{0}"><check-content-ref href="other.xml" name="def_a"/>'
+        '</check>'.format(oval_namespace))
+    code, report = run_main(monkeypatch, tmpdir, make_xccdf(checks), "--all-checks")
+
+    assert "more than one OVAL file" in code
+    assert report["findings"]["non_oval_check_systems"] == ["urn:other"]
+    assert "ERROR: Non-OVAL checking system found: urn:other" in capsys.readouterr().out
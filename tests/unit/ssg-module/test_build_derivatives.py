@@ -0,0 +1,52 @@
+import pytest
+
+import ssg.build_derivatives
+from ssg.constants import XCCDF11_NS, RHEL_CENTOS_CPE_MAPPING
+from ssg.xml import ElementTree
+
+
+BENCHMARK = (
+    '<Benchmark xmlns="{0}">'
+    '<platform idref="cpe:/a:machine"/>'
+    '<platform idref="cpe:/o:redhat:enterprise_linux:7"/>'
+    '<Group id="g"><Rule id="r">'
+    '<ident system="cce">CCE-27445-2</ident>'
+    '<reference href="stig">RHEL-07-010010</reference>'
+    '<reference href="nist">AC-3</reference>'
+    '<fix id="fips_fix">fips</fix>'
+    '<fix id="r">echo\n  - CCE-27445-2\n<sub idref="v"/> CCE-27445-2</fix>'
+    '</Rule></Group></Benchmark>'.format(XCCDF11_NS))
+
+
+def test_add_cpes_and_remove_idents():
+    benchmark = ElementTree.fromstring(BENCHMARK)
+
+    assert ssg.build_derivatives.add_cpes_and_remove_idents(
+        benchmark, XCCDF11_NS, RHEL_CENTOS_CPE_MAPPING)
+
+    platforms = benchmark.findall("{%s}platform" % XCCDF11_NS)
+    assert [platform.get("idref") for platform in platforms] == [
+        "cpe:/a:machine",
+        "cpe:/o:redhat:enterprise_linux:7",
+        "cpe:/o:centos:centos:7",
+    ]
+
+    rule = benchmark.find(".//{%s}Rule" % XCCDF11_NS)
+    assert rule.find("{%s}ident" % XCCDF11_NS) is None
+    references = rule.findall("{%s}reference" % XCCDF11_NS)
+    assert [reference.text for reference in references] == ["AC-3"]
+
+    fixes = rule.findall("{%s}fix" % XCCDF11_NS)
+    assert [fix.get("id") for fix in fixes] == ["r"]
+    assert fixes[0].text == "echo\n"
+    assert fixes[0].find("{%s}sub" % XCCDF11_NS).tail == " "
+
+
+def test_add_cpes_without_rhel_platform():
+    benchmark = ElementTree.fromstring(
+        '<Benchmark xmlns="{0}"><platform idref="cpe:/a:machine"/></Benchmark>'
+        .format(XCCDF11_NS))
+
+    assert not ssg.build_derivatives.add_cpes(
+        benchmark, XCCDF11_NS, RHEL_CENTOS_CPE_MAPPING)
+    assert len(benchmark) == 1
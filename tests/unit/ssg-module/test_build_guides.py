@@ -0,0 +1,56 @@
+import pytest
+
+import ssg.build_guides
+from ssg.constants import XCCDF12_NS
+from ssg.xml import ElementTree
+
+
+BENCHMARK = (
+    '<Benchmark xmlns="{0}" id="benchmark">'
+    '<Profile id="small"><select idref="rule_a" selected="true"/>'
+    '<select idref="rule_b" selected="false"/></Profile>'
+    '<Profile id="large"><select idref="rule_a" selected="true"/>'
+    '<select idref="rule_b" selected="true"/></Profile>'
+    '<Group id="group"><Rule id="rule_a"/><Rule id="rule_b"/><Rule id="rule_c"/>'
+    '</Group></Benchmark>'.format(XCCDF12_NS))
+
+
+def test_get_benchmark_profile_costs():
+    tree = ElementTree.ElementTree(ElementTree.fromstring(BENCHMARK))
+    costs = ssg.build_guides.get_benchmark_profile_costs(
+        tree, {"benchmark": "title"})
+
+    assert costs == {
+        ("benchmark", ""): 3,
+        ("benchmark", "small"): 1,
+        ("benchmark", "large"): 2,
+    }
+
+
+def test_run_tasks(tmpdir):
+    tasks = [
+        ssg.build_guides.GuideTask("benchmark", profile_id, "ds.xml",
+                                   str(tmpdir.join(profile_id)), cost)
+        for profile_id, cost in (("small", 1), ("failing", 2), ("large", 3))
+    ]
+    calls = []
+
+    def generate(task):
+        calls.append(task.profile_id)
+        if task.profile_id == "failing":
+            raise RuntimeError("oscap failed")
+
+    results = ssg.build_guides.run_tasks(generate, tasks, 1, retries=2)
+
+    # The most expensive tasks go first, failing tasks are retried
+    assert calls == ["large", "failing", "failing", "failing", "small"]
+    assert [(result.task.profile_id, result.attempts, result.error)
+            for result in results] == [
+        ("large", 1, None),
+        ("failing", 3, "oscap failed"),
+        ("small", 1, None),
+    ]
+
+    report_path = tmpdir.join("report.json")
+    ssg.build_guides.write_timing_report(results, 1.0, 1, str(report_path))
+    assert '"failed": 1' in report_path.read()
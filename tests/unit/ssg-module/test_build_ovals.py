@@ -0,0 +1,71 @@
+import pytest
+
+import ssg.build_ovals
+from ssg.constants import oval_namespace
+from ssg.xml import ElementTree
+
+
+def make_variable(var_id, comment, value="0"):
+    return ElementTree.fromstring(
+        '<external_variable xmlns="%s" id="%s" comment="%s" version="%s" '
+        'datatype="int"><value>%s</value></external_variable>'
+        % (oval_namespace, var_id, comment, comment, value))
+
+
+def test_entities_differing_in_ignored_attributes_are_identical():
+    first = make_variable("var_a", "first")
+    second = make_variable("var_a", "second")
+
+    assert ssg.build_ovals.oval_entities_are_identical(first, second)
+    # The elements must not be modified by the comparison
+    assert first.get("comment") == "first"
+
+
+def test_entities_differing_in_children_are_different():
+    first = make_variable("var_a", "first", "0")
+    second = make_variable("var_a", "first", "1")
+
+    assert not ssg.build_ovals.oval_entities_are_identical(first, second)
+
+
+def test_append_skips_identical_external_variable():
+    variables = ElementTree.Element("{%s}variables" % oval_namespace)
+    try:
+        ssg.build_ovals.append(variables, make_variable("var_a", "first"))
+        ssg.build_ovals.append(variables, make_variable("var_a", "second"))
+        ssg.build_ovals.append(variables, make_variable("var_b", "first"))
+        assert [child.get("id") for child in variables] == ["var_a", "var_b"]
+    finally:
+        ssg.build_ovals.element_child_cache.pop(variables, None)
+
+
+def make_test(test_id, check):
+    return ElementTree.fromstring(
+        '<textfilecontent54_test xmlns="%s" id="%s" check="%s" version="1" />'
+        % (oval_namespace, test_id, check))
+
+
+def test_append_rejects_different_entities_with_same_id():
+    tests = ElementTree.Element("{%s}tests" % oval_namespace)
+    try:
+        ssg.build_ovals.append(tests, make_test("test_a", "all"))
+        with pytest.raises(SystemExit):
+            ssg.build_ovals.append(tests, make_test("test_a", "at least one"))
+    finally:
+        ssg.build_ovals.element_child_cache.pop(tests, None)
+
+
+def make_check(platform):
+    return ssg.build_ovals._parse_oval_check(
+        '<def-group><definition class="compliance" id="x" version="1">'
+        '<metadata><affected family="unix"><platform>%s</platform></affected>'
+        '</metadata></definition></def-group>' % platform, "rhel7")
+
+
+def test_check_tree_is_applicable_for_product():
+    multi_check = make_check("multi_platform_all")
+    assert ssg.build_ovals._check_tree_is_applicable_for_product(multi_check, "rhel7")
+
+    rhel_check = make_check("Red Hat Enterprise Linux 7")
+    assert ssg.build_ovals._check_tree_is_applicable_for_product(rhel_check, "rhel7")
+    assert not ssg.build_ovals._check_tree_is_applicable_for_product(rhel_check, "rhel6")
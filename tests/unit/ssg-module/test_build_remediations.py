@@ -2,6 +2,7 @@ import pytest
 
 import os
 import ssg.build_remediations as sbr
+from ssg.xml import ElementTree
 
 data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "data"))
 rule_dir = os.path.join(data_dir, "group_dir", "rule_dir")
@@ -56,3 +57,62 @@ def test_process_fix():
     assert 'rule_dir' in fixes
     assert len(fixes['rule_dir']) == 2
     do_test_contents(fixes['rule_dir'].contents, fixes['rule_dir'].config)
+
+
+def test_combine_fixes(tmpdir):
+    env_yaml = dict(product="rhel7", benchmark_root=".")
+    product_yaml = os.path.join(data_dir, "product.yml")
+    with open(rhel_bash) as f:
+        tmpdir.join("some_rule.sh").write(f.read())
+    fix_dirs = [str(tmpdir)]
+
+    fixes = sbr.combine_fixes(env_yaml, product_yaml, 'bash', fix_dirs)
+    assert list(fixes.keys()) == ['some_rule']
+    do_test_contents(fixes['some_rule'].contents, fixes['some_rule'].config)
+
+    fixes = sbr.combine_fixes(env_yaml, product_yaml, 'bash', fix_dirs, rule_dirs=[rule_dir])
+    assert list(fixes.keys()) == ['some_rule']
+
+    fixes = sbr.combine_fixes(env_yaml, product_yaml, 'bash', [], rule_dirs=[])
+    assert fixes == {}
+
+
+def test_collect_rule_dir_remediations():
+    rule_remediations = sbr.collect_rule_dir_remediations(
+        [rule_dir], ['bash', 'ansible'], 'rhel')
+    assert rule_remediations['ansible'] == []
+    assert rule_remediations['bash'] == [('rule_dir', [rhel_bash])]
+
+
+def test_get_available_functions(tmpdir):
+    tmpdir.join("bash-remediation-functions.xml").write(
+        '<Group id="remediation_functions">'
+        '<Value id="function_populate" type="string" hidden="true"/>'
+        '<Value hidden="true" id="function_replace_or_append"/>'
+        '<Value id="var_something" hidden="true"/>'
+        '</Group>')
+    assert sbr.get_available_functions(str(tmpdir)) == ['populate', 'replace_or_append']
+
+
+def test_remediation_function_index():
+    index = sbr.get_remediation_function_index(['package_install', 'package', 'die'])
+    assert index is sbr.get_remediation_function_index(['package_install', 'package', 'die'])
+    assert index.find_functions("package_install aide") == set(['package_install', 'package'])
+    assert index.find_functions("no calls here") == set()
+    assert sbr.RemediationFunctionIndex([]).find_functions("package") == set()
+
+
+def test_expand_xccdf_subs_bash():
+    fix = ElementTree.Element("fix", rule="some_rule")
+    fix.text = ("# platform = multi_platform_all\n"
+                ". /usr/share/scap-security-guide/remediation_functions\n"
+                "populate var_timeout\n\n"
+                "package_install aide\n"
+                "echo $var_timeout\n")
+    sbr.expand_xccdf_subs(fix, "bash", ['populate', 'package_install'])
+
+    subs = list(fix)
+    assert [sub.get("idref") for sub in subs] == ['var_timeout', 'function_package_install']
+    assert fix.text == "\nvar_timeout=\""
+    assert subs[0].tail == '"\n'
+    assert subs[1].tail == "\npackage_install aide\necho $var_timeout\n"
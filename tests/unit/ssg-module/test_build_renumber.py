@@ -0,0 +1,81 @@
+import pytest
+
+import ssg.build_renumber
+import ssg.id_translate
+from ssg.constants import XCCDF11_NS, cce_uri, oval_namespace
+from ssg.xml import ElementTree
+
+
+OVAL = (
+    '<oval_definitions xmlns="{0}"><definitions>'
+    '<definition class="compliance" id="rule_a" version="1">'
+    '<metadata><title>a</title><description>a</description></metadata>'
+    '<criteria><criterion test_ref="test_a"/>'
+    '<extend_definition definition_ref="rule_b"/></criteria></definition>'
+    '<definition class="compliance" id="rule_b" version="1">'
+    '<metadata><title>b</title><description>b</description></metadata>'
+    '<criteria><criterion test_ref="test_b"/></criteria></definition>'
+    '</definitions><tests>'
+    '<file_test xmlns="{0}#unix" id="test_a"><object object_ref="object_a"/></file_test>'
+    '<file_test xmlns="{0}#unix" id="test_b"><object object_ref="object_b"/></file_test>'
+    '</tests><objects>'
+    '<file_object xmlns="{0}#unix" id="object_a"><path var_ref="var_a"/></file_object>'
+    '<file_object xmlns="{0}#unix" id="object_b"><path var_ref="var_b"/></file_object>'
+    '</objects><variables>'
+    '<external_variable id="var_a" datatype="int" version="1"/>'
+    '<external_variable id="var_b" datatype="string" version="1"/>'
+    '</variables></oval_definitions>'.format(oval_namespace))
+
+
+def make_xccdf(oval_fname):
+    rules = []
+    for rule_id, cce in (("rule_a", "CCE-27445-2"), ("rule_c", "CCE-26976-7")):
+        rules.append(
+            '<Rule id="{0}"><ident system="{1}">{2}</ident>'
+            '<check system="{3}"><check-content-ref href="{4}" name="{0}"/>'
+            '</check></Rule>'.format(rule_id, cce_uri, cce, oval_namespace, oval_fname))
+    return ElementTree.fromstring(
+        '<Benchmark xmlns="{0}"><Value id="var_a" type="string"/>'
+        '<Group id="group">{1}</Group></Benchmark>'.format(XCCDF11_NS, "".join(rules)))
+
+
+def test_xccdf_index():
+    xccdftree = make_xccdf("oval-unlinked.xml")
+    index = ssg.build_renumber.XCCDFIndex(xccdftree)
+
+    assert [rule_id for rule_id, _ in index.rules_with_ids()] == ["rule_a", "rule_c"]
+    assert len(index.checks) == 2
+    assert list(index.values.keys()) == ["var_a"]
+    assert ssg.build_renumber.create_xccdf_id_to_cce_id_mapping(index) == {
+        "rule_a": "CCE-27445-2",
+        "rule_c": "CCE-26976-7",
+    }
+
+
+def test_oval_file_linker(tmpdir):
+    oval_file = tmpdir.join("oval-unlinked.xml")
+    oval_file.write(OVAL)
+
+    xccdftree = make_xccdf(str(oval_file))
+    index = ssg.build_renumber.XCCDFIndex(xccdftree)
+    translator = ssg.id_translate.IDTranslator("ssg")
+    linker = ssg.build_renumber.OVALFileLinker(
+        translator, xccdftree, index.checks, index)
+    linker.link()
+    linker.link_xccdf()
+
+    rules = dict(index.rules_with_ids())
+    # The check of the rule without OVAL definition is dropped
+    assert rules["rule_c"].find("{%s}check" % XCCDF11_NS) is None
+
+    check = rules["rule_a"].find("{%s}check" % XCCDF11_NS)
+    exports = check.findall("{%s}check-export" % XCCDF11_NS)
+    assert sorted(export.get("value-id") for export in exports) == ["var_a", "var_b"]
+    ref = check.find("{%s}check-content-ref" % XCCDF11_NS)
+    assert ref.get("name") == "oval:ssg-rule_a:def:1"
+
+    # The value type follows the datatype of the exported variable
+    assert index.values["var_a"].get("type") == "number"
+
+    reference = linker.tree.find(".//reference")
+    assert reference.get("ref_id") == "CCE-27445-2"
@@ -0,0 +1,47 @@
+import pytest
+
+import ssg.build_stig
+from ssg.constants import XCCDF11_NS, stig_ns, stig_refs
+
+
+REFERENCE = (
+    '<Benchmark xmlns="{0}"><version>1</version><Group id="V-1">'
+    '<Rule id="SV-1r1_rule"><version>RHEL-07-010010</version></Rule></Group>'
+    '<Group id="V-2"><Rule id="SV-2r1_rule"><version>RHEL-07-010020</version>'
+    '</Rule></Group></Benchmark>'.format(XCCDF11_NS))
+
+DESTINATION = (
+    '<Benchmark xmlns="{0}"><Rule id="rule_a">'
+    '<reference href="{1}os">RHEL-07-010020</reference>'
+    '<reference href="nist">RHEL-07-010010</reference>'
+    '<reference href="{1}os">RHEL-07-010010</reference>'
+    '<rationale/></Rule></Benchmark>'.format(XCCDF11_NS, stig_refs))
+
+
+def test_load_reference_rule_ids(tmpdir):
+    reference = tmpdir.join("reference.xml")
+    reference.write(REFERENCE)
+
+    assert ssg.build_stig.load_reference_rule_ids(str(reference)) == {
+        "RHEL-07-010010": "SV-1r1_rule",
+        "RHEL-07-010020": "SV-2r1_rule",
+    }
+
+
+def test_add_references(tmpdir):
+    reference = tmpdir.join("reference.xml")
+    reference.write(REFERENCE)
+    destination = tmpdir.join("destination.xml")
+    destination.write(DESTINATION)
+
+    root = ssg.build_stig.add_references(str(reference), str(destination))
+
+    rule = root.find(".//{%s}Rule" % XCCDF11_NS)
+    assert [(child.get("href"), child.text) for child in rule][:5] == [
+        (stig_refs + "os", "RHEL-07-010020"),
+        (stig_ns, "SV-2r1_rule"),
+        ("nist", "RHEL-07-010010"),
+        (stig_refs + "os", "RHEL-07-010010"),
+        (stig_ns, "SV-1r1_rule"),
+    ]
+    assert rule[-1].tag == "{%s}rationale" % XCCDF11_NS
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+import ssg.build_templates
+
+
+SHARED_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "shared")
+
+
+def build(input_dir, output_dir, incremental=True, jobs=1):
+    builder = ssg.build_templates.Builder({"product": "rhel7"})
+    builder.set_langs(["bash", "oval"])
+    builder.set_input_dir(str(input_dir))
+    builder.output_dir = str(output_dir)
+    builder.ssg_shared = os.path.abspath(SHARED_DIR)
+    builder.incremental = incremental
+    builder.jobs = jobs
+    builder.build()
+    return builder.manifest
+
+
+def test_parallel_build(tmpdir, monkeypatch):
+    monkeypatch.setattr(ssg.build_templates, "MIN_PARALLEL_RENDER_TASKS", 1)
+    input_dir = tmpdir.mkdir("templates")
+    input_dir.mkdir("csv").join("packages_installed.csv").write("aide\nscreen\nsudo\n")
+
+    build(input_dir, tmpdir.join("serial"), incremental=False)
+    build(input_dir, tmpdir.join("parallel"), incremental=False, jobs=2)
+
+    for lang, filename in (("bash", "package_sudo_installed.sh"),
+                           ("oval", "package_aide_installed.xml")):
+        serial = tmpdir.join("serial", lang, filename).read()
+        assert tmpdir.join("parallel", lang, filename).read() == serial
+
+
+def test_incremental_build(tmpdir):
+    input_dir = tmpdir.mkdir("templates")
+    csv_file = input_dir.mkdir("csv").join("packages_installed.csv")
+    csv_file.write("aide\nscreen\n")
+    output_dir = tmpdir.join("output")
+
+    manifest = build(input_dir, output_dir)
+    assert (manifest.generated, manifest.skipped) == (4, 0)
+    entry = manifest.outputs[os.path.join("bash", "package_aide_installed.sh")]
+    assert entry["row"] == ["aide"]
+    assert entry["template"].endswith("template_BASH_package_installed")
+
+    screen_output = output_dir.join("bash", "package_screen_installed.sh")
+    screen_output.write("not regenerated")
+    csv_file.write("aide\nscreen\nsudo\n")
+
+    manifest = build(input_dir, output_dir)
+    assert (manifest.generated, manifest.skipped) == (2, 4)
+    assert screen_output.read() == "not regenerated"
+
+    csv_file.write("screen\nsudo\n")
+
+    manifest = build(input_dir, output_dir)
+    assert (manifest.generated, manifest.skipped) == (0, 4)
+    assert not output_dir.join("bash", "package_aide_installed.sh").check()
+    assert not output_dir.join("oval", "package_aide_installed.xml").check()
+    assert output_dir.join("oval", "package_sudo_installed.xml").check()
+
+
+def test_incremental_build_with_include(tmpdir):
+    input_dir = tmpdir.mkdir("templates")
+    input_dir.mkdir("csv").join("packages_installed.csv").write("aide\n")
+    included = tmpdir.join("inc")
+    included.write("X")
+    input_dir.join("template_BASH_package_installed").write(
+        "{{% include '" + str(included) + "' %}} {{{ PKGNAME }}}\n")
+    output_dir = tmpdir.join("output")
+    output = output_dir.join("bash", "package_aide_installed.sh")
+
+    build(input_dir, output_dir)
+    assert output.read().startswith("X aide")
+
+    included.write("Y")
+    manifest = build(input_dir, output_dir)
+    assert (manifest.generated, manifest.skipped) == (1, 1)
+    assert output.read().startswith("Y aide")
+
+
+def test_cached_file_lists(tmpdir, monkeypatch):
+    input_dir = tmpdir.mkdir("templates")
+    csv_file = input_dir.mkdir("csv").join("packages_installed.csv")
+    csv_file.write("aide\n")
+    output_dir = tmpdir.join("output")
+
+    builder = ssg.build_templates.Builder({"product": "rhel7"})
+    builder.set_langs(["bash"])
+    builder.set_input_dir(str(input_dir))
+    builder.output_dir = str(output_dir)
+    builder.ssg_shared = os.path.abspath(SHARED_DIR)
+
+    ActionType = ssg.build_templates.ActionType
+    outputs = builder.get_file_list(ActionType.OUTPUT)
+    assert [os.path.basename(output) for output in outputs] == [
+        "package_aide_installed.sh"]
+    inputs = builder.get_file_list(ActionType.INPUT)
+    assert str(csv_file) in inputs
+
+    def fail(action):
+        raise AssertionError("The file lists should be cached")
+
+    monkeypatch.setattr(builder, "_collect_file_list", fail)
+    assert builder.get_file_list(ActionType.OUTPUT) == outputs
+    assert builder.get_file_list(ActionType.INPUT) == inputs
+
+    monkeypatch.undo()
+    csv_file.write("aide\nscreen\n")
+    assert len(builder.get_file_list(ActionType.OUTPUT)) == 2
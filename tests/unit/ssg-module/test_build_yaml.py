@@ -0,0 +1,94 @@
+import pytest
+
+import ssg.build_yaml
+
+
+BENCHMARK = """
+title: Test Benchmark
+status: draft
+description: Benchmark used by the unit tests
+notice:
+    id: terms_of_use
+    description: No notice
+front-matter: None
+rear-matter: None
+version: 0.1
+"""
+
+GROUP = """
+title: Group {0}
+description: Group {0} used by the unit tests
+"""
+
+RULE = """
+prodtype: rhel7
+title: Rule {0}
+description: Rule {0} used by the unit tests
+rationale: There is none
+severity: low
+"""
+
+VALUE = """
+title: Value {0}
+description: Value {0} used by the unit tests
+type: string
+options:
+    default: "{0}"
+"""
+
+
+def create_guide(guide_dir):
+    guide_dir.join("benchmark.yml").write(BENCHMARK)
+    for group_name in ["group_a", "group_b"]:
+        group_dir = guide_dir.mkdir(group_name)
+        group_dir.join("group.yml").write(GROUP.format(group_name))
+        group_dir.join("var_%s.var" % group_name).write(VALUE.format(group_name))
+        for index in range(3):
+            rule_name = "rule_%s_%d" % (group_name, index)
+            group_dir.mkdir(rule_name).join("rule.yml").write(RULE.format(rule_name))
+        nested_dir = group_dir.mkdir("nested")
+        nested_dir.join("group.yml").write(GROUP.format("nested_" + group_name))
+        rule_name = "rule_nested_" + group_name
+        nested_dir.mkdir(rule_name).join("rule.yml").write(RULE.format(rule_name))
+    # subtree without a group is skipped
+    guide_dir.mkdir("no_group").mkdir("rule_ignored").join("rule.yml").write(
+        RULE.format("rule_ignored"))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_add_from_directory(tmpdir, jobs):
+    guide_dir = tmpdir.mkdir("guide")
+    create_guide(guide_dir)
+    bash_fns = tmpdir.join("bash-remediation-functions.xml")
+    bash_fns.write("<Group id=\"remediation_functions\"/>")
+    env_yaml = dict(product="rhel7")
+
+    output = tmpdir.join("shorthand.xml")
+    ssg.build_yaml.add_from_directory(
+        "build", None, str(guide_dir), None, str(bash_fns), str(output),
+        env_yaml, jobs)
+    shorthand = output.read()
+
+    for group_name in ["group_a", "group_b"]:
+        assert "Group %s" % group_name in shorthand
+        assert "Value %s" % group_name in shorthand
+        assert "Rule rule_nested_%s" % group_name in shorthand
+        for index in range(3):
+            assert "Rule rule_%s_%d" % (group_name, index) in shorthand
+    assert "rule_ignored" not in shorthand
+
+
+def test_add_from_directory_parallel_output_is_the_same(tmpdir):
+    guide_dir = tmpdir.mkdir("guide")
+    create_guide(guide_dir)
+    bash_fns = tmpdir.join("bash-remediation-functions.xml")
+    bash_fns.write("<Group id=\"remediation_functions\"/>")
+
+    outputs = []
+    for jobs in [1, 3]:
+        output = tmpdir.join("shorthand-%d.xml" % jobs)
+        ssg.build_yaml.add_from_directory(
+            "build", None, str(guide_dir), None, str(bash_fns), str(output),
+            dict(product="rhel7"), jobs)
+        outputs.append(output.read())
+    assert outputs[0] == outputs[1]
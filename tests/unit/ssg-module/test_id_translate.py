@@ -21,3 +21,31 @@ def test__split_namespace():
     ns, n = sn("{}emptynamespace")
     assert not ns
     assert n == "emptynamespace"
+
+
+def test_translate():
+    oval_ns = ssg.id_translate.oval_ns
+    ocil_ns = ssg.id_translate.ocil_ns
+    tree = ssg.id_translate.ElementTree.fromstring(
+        '<root xmlns:oval="{0}" xmlns:ocil="{1}">'
+        '<oval:definition id="def_a"><oval:criteria>'
+        '<oval:criterion test_ref="test_a"/></oval:criteria></oval:definition>'
+        '<oval:object id="obj_a"><oval:filter action="include">ste_a</oval:filter></oval:object>'
+        '<ocil:test_action_ref>action_a</ocil:test_action_ref>'
+        '<ocil:question_ref question_ref="question_a"/>'
+        '</root>'.format(oval_ns, ocil_ns))
+
+    translator = ssg.id_translate.IDTranslator("ssg")
+    translator.translate(tree, store_defname=True)
+
+    definition = tree.find("{%s}definition" % oval_ns)
+    assert definition.get("id") == "oval:ssg-def_a:def:1"
+    assert definition.find("metadata/reference").get("ref_id") == "def_a"
+    criterion = definition.find(".//{%s}criterion" % oval_ns)
+    assert criterion.get("test_ref") == "oval:ssg-test_a:tst:1"
+    assert tree.find(".//{%s}filter" % oval_ns).text == "oval:ssg-ste_a:ste:1"
+    assert tree.find("{%s}test_action_ref" % ocil_ns).text == "ocil:ssg-action_a:testaction:1"
+    assert tree.find("{%s}question_ref" % ocil_ns).get("question_ref") == \
+        "ocil:ssg-question_a:question:1"
+
+    assert translator.generate_id("{%s}test" % oval_ns, "test_a") == "oval:ssg-test_a:tst:1"
@@ -26,3 +26,146 @@ def test_macro_expansion():
 
     complete_defs = get_definitions_with_substitution(dict(global_var="value"))
     assert complete_defs["expand_to_global_var"]() == "value"
+
+
+def test_substitutions_dict_hash():
+    first = ssg.jinja.get_substitutions_dict_hash(dict(a="1", b=["2", "3"]))
+    second = ssg.jinja.get_substitutions_dict_hash(dict(b=["2", "3"], a="1"))
+    assert first == second
+
+    different = ssg.jinja.get_substitutions_dict_hash(dict(a="1", b=["3", "2"]))
+    assert first != different
+
+    # cache configuration doesn't influence the rendered output
+    configured = ssg.jinja.get_substitutions_dict_hash(
+        dict(a="1", b=["2", "3"], jinja2_render_cache_dir="/tmp"))
+    assert first == configured
+
+
+def test_render_cache_store_and_load(tmpdir):
+    cache = ssg.jinja.RenderCache(str(tmpdir), 1024 * 1024)
+    key = cache.get_key(b"{{{ var }}}", dict(var="value"))
+    assert key != cache.get_key(b"{{{ var }}}", dict(var="other"))
+    assert key != cache.get_key(b"{{{ var }}} ", dict(var="value"))
+
+    assert cache.load(key) is None
+    cache.store(key, u"value")
+    assert cache.load(key) == u"value"
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+    cache.finish()
+    stats = ssg.jinja.get_render_cache_stats(str(tmpdir))
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["stores"] == 1
+
+
+def test_render_cache_prune(tmpdir):
+    cache = ssg.jinja.RenderCache(str(tmpdir), 10)
+    cache.store("aa01", u"12345")
+    cache.store("aa02", u"12345")
+    cache.store("aa03", u"12345")
+    old = os.path.join(str(tmpdir), "aa", "aa01")
+    os.utime(old, (0, 0))
+
+    cache.prune()
+    assert cache.evictions == 1
+    assert not os.path.exists(old)
+    assert cache.load("aa02") == u"12345"
+    assert cache.load("aa03") == u"12345"
+
+
+def test_process_file_uses_render_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "initialized", False)
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "cache", None)
+
+    template = tmpdir.join("template.jinja")
+    template.write("{{{ var }}}")
+    subs = dict(
+        var="value",
+        jinja2_render_cache_enabled="true",
+        jinja2_render_cache_dir=str(tmpdir.join("cache")),
+    )
+
+    assert ssg.jinja.process_file(str(template), subs) == "value"
+    assert ssg.jinja.process_file(str(template), subs) == "value"
+    cache = ssg.jinja._get_render_cache(subs)
+    assert (cache.hits, cache.misses, cache.stores) == (1, 1, 1)
+
+    subs["var"] = "other"
+    assert ssg.jinja.process_file(str(template), subs) == "other"
+    assert cache.misses == 2
+
+
+def test_macro_definitions_are_cached(tmpdir):
+    definitions = tmpdir.join("definitions.jinja")
+    definitions.write("{{% macro expand_to_global_var() %}}{{{ global_var }}}{{% endmacro %}}")
+    filename = str(definitions)
+
+    first = ssg.jinja.extract_substitutions_dict_from_template(filename, dict(global_var="a"))
+    second = ssg.jinja.extract_substitutions_dict_from_template(filename, dict(global_var="a"))
+    assert first["expand_to_global_var"] is second["expand_to_global_var"]
+    # callers are free to modify the returned dictionary
+    assert first is not second
+
+    other = ssg.jinja.extract_substitutions_dict_from_template(filename, dict(global_var="b"))
+    assert other["expand_to_global_var"]() == "b"
+
+    definitions.write("{{% macro expand_to_global_var() %}}x{{% endmacro %}}")
+    os.utime(filename, (0, 0))
+    changed = ssg.jinja.extract_substitutions_dict_from_template(filename, dict(global_var="a"))
+    assert changed["expand_to_global_var"]() == "x"
+
+
+def test_process_file_skips_render_cache_for_includes(tmpdir, monkeypatch):
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "initialized", False)
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "cache", None)
+
+    included = tmpdir.join("inc.txt")
+    included.write("A")
+    template = tmpdir.join("t.txt")
+    template.write("{{% include '" + str(included) + "' %}}")
+    subs = dict(
+        jinja2_render_cache_enabled="true",
+        jinja2_render_cache_dir=str(tmpdir.join("cache")),
+    )
+
+    assert ssg.jinja.process_file(str(template), subs) == "A"
+    included.write("B")
+    assert ssg.jinja.process_file(str(template), subs) == "B"
+    cache = ssg.jinja._get_render_cache(subs)
+    assert (cache.hits, cache.stores) == (0, 0)
+
+
+def test_render_cache_key_covers_macro_variables(tmpdir, monkeypatch):
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "initialized", False)
+    monkeypatch.setattr(ssg.jinja._get_render_cache, "cache", None)
+    base_definitions = tmpdir.join("base.jinja")
+    base_definitions.write("{{% macro expand_to_global_var() %}}{{{ global_var }}}{{% endmacro %}}")
+    highlevel_definitions = tmpdir.join("highlevel.jinja")
+    highlevel_definitions.write("")
+    monkeypatch.setattr(ssg.jinja, "JINJA_MACROS_BASE_DEFINITIONS", str(base_definitions))
+    monkeypatch.setattr(ssg.jinja, "JINJA_MACROS_HIGHLEVEL_DEFINITIONS",
+                        str(highlevel_definitions))
+
+    template = tmpdir.join("template.jinja")
+    template.write("{{{ expand_to_global_var() }}}")
+
+    def render(global_var, other):
+        subs = dict(
+            global_var=global_var,
+            other=other,
+            jinja2_render_cache_enabled="true",
+            jinja2_render_cache_dir=str(tmpdir.join("cache")),
+        )
+        subs.update(ssg.jinja.extract_substitutions_dict_from_template(
+            str(base_definitions), subs))
+        return ssg.jinja.process_file(str(template), subs)
+
+    assert render("a", "x") == "a"
+    cache = ssg.jinja._get_render_cache({})
+    # A value neither the template nor the macros look up doesn't matter
+    assert render("a", "y") == "a"
+    assert cache.hits == 1
+    assert render("b", "y") == "b"
+    assert cache.hits == 1
@@ -27,3 +27,42 @@ def test_find_existing_testfile():
 
 def test_dont_find_missing_testfile():
     assert ssg.oval.find_testfile("disable_prelinkxxx.xml") is None
+
+
+def test_append_skips_duplicate_ids():
+    container = ssg.oval.ET.Element("oval:tests")
+    first = ssg.oval.ET.Element("test", id="test_a")
+    ssg.oval.ET.SubElement(first, "object", id="object_a")
+    try:
+        ssg.oval.append(container, first)
+        ssg.oval.append(container, ssg.oval.ET.Element("test", id="test_a"))
+        ssg.oval.append(container, ssg.oval.ET.Element("test", id="object_a"))
+        ssg.oval.append(container, ssg.oval.ET.Element("test", id="test_b"))
+        assert [child.get("id") for child in container] == ["test_a", "test_b"]
+    finally:
+        ssg.oval.element_ids.pop(container, None)
+
+
+def test_oval_file_index(tmpdir):
+    tmpdir.join("checks", "first.xml").ensure()
+    tmpdir.join("checks", "nested", "first.xml").ensure()
+    rule_dir = tmpdir.join("guide", "some_rule")
+    rule_dir.join("rule.yml").ensure()
+    rule_dir.join("oval", "shared.xml").ensure()
+    paths = [str(tmpdir.join("checks")), str(tmpdir.join("guide"))]
+
+    index = ssg.oval.OVALFileIndex(paths)
+    assert index.update()
+    assert index.find("first") == str(tmpdir.join("checks", "nested", "first.xml"))
+    assert index.find("some_rule") == str(rule_dir.join("oval", "shared.xml"))
+    assert index.find("missing") is None
+
+    cache = str(tmpdir.join("index.json"))
+    index.save(cache)
+    loaded = ssg.oval.OVALFileIndex(paths)
+    loaded.load(cache)
+    assert not loaded.update()
+
+    tmpdir.join("checks", "second.xml").ensure()
+    assert loaded.update()
+    assert loaded.find("second") == str(tmpdir.join("checks", "second.xml"))
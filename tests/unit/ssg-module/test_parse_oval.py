@@ -0,0 +1,70 @@
+import pytest
+
+import ssg.parse_oval
+from ssg.constants import oval_namespace
+from ssg.xml import ElementTree
+
+
+OVAL = (
+    '<oval_definitions xmlns="{0}"><definitions>'
+    '<definition id="def_a"><criteria><criterion test_ref="test_a"/>'
+    '<extend_definition definition_ref="def_b"/></criteria></definition>'
+    '<definition id="def_b"><criteria><criterion test_ref="test_b"/>'
+    '<extend_definition definition_ref="def_c"/></criteria></definition>'
+    '<definition id="def_c"><criteria><criterion test_ref="test_b"/>'
+    '</criteria></definition>'
+    '<definition id="def_d"><criteria>'
+    '<extend_definition definition_ref="def_missing"/></criteria></definition>'
+    '</definitions><tests>'
+    '<file_test xmlns="{0}#unix" id="test_a"><object object_ref="object_a"/></file_test>'
+    '<file_test xmlns="{0}#unix" id="test_b"><object object_ref="object_b"/>'
+    '<state state_ref="state_b"/></file_test>'
+    '</tests><objects>'
+    '<file_object xmlns="{0}#unix" id="object_a"><path var_ref="var_a"/></file_object>'
+    '<file_object xmlns="{0}#unix" id="object_b"><path>/etc</path></file_object>'
+    '</objects><states>'
+    '<file_state xmlns="{0}#unix" id="state_b"><mode var_ref="var_b"/></file_state>'
+    '</states><variables>'
+    '<external_variable id="var_a" datatype="int"/>'
+    '<external_variable id="var_b" datatype="int"/>'
+    '</variables></oval_definitions>'.format(oval_namespace))
+
+
+@pytest.fixture
+def oval_groups():
+    return ssg.parse_oval.get_container_groups_from_root(ElementTree.fromstring(OVAL))
+
+
+def test_graph_matches_element_finder(oval_groups):
+    graph = ssg.parse_oval.OVALDependencyGraph(oval_groups)
+    for def_id, definition in oval_groups["definitions"].items():
+        assert graph.definition_variables(def_id) == \
+            ssg.parse_oval.resolve_definition(oval_groups, definition)
+
+
+def test_graph_transitive_queries(oval_groups):
+    graph = ssg.parse_oval.OVALDependencyGraph(oval_groups)
+
+    assert graph.extended_definitions("def_a") == set(["def_a", "def_b", "def_c"])
+    assert graph.needed_variables("def_a") == set(["var_a", "var_b"])
+    assert graph.extending_definitions("def_c") == set(["def_a", "def_b"])
+    assert graph.extending_definitions("def_a") == set()
+
+    # Missing definitions are reported, but not followed
+    assert graph.extended_definitions("def_d") == set(["def_d", "def_missing"])
+    assert not graph.has_definition("def_missing")
+    assert graph.needed_variables("def_d") == set()
+
+
+def test_graph_missing_reference(oval_groups):
+    del oval_groups["states"]["state_b"]
+    graph = ssg.parse_oval.OVALDependencyGraph(oval_groups)
+
+    assert graph.definition_variables("def_a") == set(["var_a"])
+    with pytest.raises(KeyError):
+        graph.definition_variables("def_c")
+    # A failed query doesn't leave the entities marked as being resolved
+    with pytest.raises(KeyError):
+        graph.definition_variables("def_c")
+    with pytest.raises(KeyError):
+        graph.definition_variables("def_b")
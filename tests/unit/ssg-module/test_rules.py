@@ -89,3 +89,71 @@ def test_get_rule_dir_remediations():
     something_bash = ssg.rules.get_rule_dir_remediations(rule_dir, 'bash', 'something')
     assert len(something_bash) == 1
     assert something_bash != rhel_bash
+
+
+def test_get_rule_dir_tests():
+    tests = ssg.rules.get_rule_dir_tests(rule_dir)
+    assert all(os.path.dirname(test) == os.path.join(rule_dir, "tests") for test in tests)
+    assert ssg.rules.get_rule_dir_tests(data_dir) == []
+
+
+def test_rule_index_walk():
+    index = ssg.rules.RuleIndex(data_dir)
+    assert index.update()
+    assert not index.update()
+
+    assert list(index.walk()) == list(os.walk(data_dir))
+    assert index.get_rule_dirs() == [
+        os.path.join(root, name)
+        for root, dirs, _ in os.walk(data_dir) for name in dirs
+        if os.path.exists(os.path.join(root, name, "rule.yml"))]
+
+
+def test_rule_index_load_save(tmpdir):
+    tmpdir.join("group", "rule", "rule.yml").ensure()
+    tmpdir.join("group", "rule", "oval", "shared.xml").ensure()
+    base_dir = str(tmpdir.join("group"))
+    index_path = str(tmpdir.join("index.json"))
+
+    index = ssg.rules.RuleIndex(base_dir)
+    index.update()
+    index.save(index_path)
+
+    loaded = ssg.rules.RuleIndex(base_dir)
+    loaded.load(index_path)
+    assert loaded.dirs == index.dirs
+    assert not loaded.update()
+    assert loaded.get_rule_dir_files(os.path.join(base_dir, "rule"), "oval") == \
+        ["shared.xml"]
+
+    tmpdir.join("group", "other", "rule.yml").ensure()
+    os.utime(base_dir, (0, 0))
+    stale = ssg.rules.RuleIndex(base_dir)
+    stale.load(index_path)
+    assert stale.update()
+    assert sorted(stale.get_rule_dirs()) == [
+        os.path.join(base_dir, "other"), os.path.join(base_dir, "rule")]
+
+
+def test_rule_index_sees_changes(tmpdir):
+    tmpdir.join("group", "rule", "rule.yml").ensure()
+    oval_dir = tmpdir.join("group", "rule", "oval").ensure(dir=True)
+    base_dir = str(tmpdir.join("group"))
+    rule_path = os.path.join(base_dir, "rule")
+
+    assert list(ssg.rules.find_rule_dirs(base_dir)) == [rule_path]
+    assert ssg.rules.get_rule_dir_ovals(rule_path) == []
+
+    oval_dir.join("shared.xml").ensure()
+    os.utime(str(oval_dir), (0, 0))
+    assert ssg.rules.get_rule_dir_ovals(rule_path) == [str(oval_dir.join("shared.xml"))]
+
+    tmpdir.join("group", "rule", "bash", "shared.sh").ensure()
+    os.utime(rule_path, (0, 0))
+    assert len(ssg.rules.get_rule_dir_remediations(rule_path, "bash")) == 1
+
+    tmpdir.join("group", "other", "rule.yml").ensure()
+    os.utime(base_dir, (0, 0))
+    assert ssg.rules.is_rule_dir(os.path.join(base_dir, "other"))
+    assert sorted(ssg.rules.find_rule_dirs(base_dir)) == [
+        os.path.join(base_dir, "other"), rule_path]
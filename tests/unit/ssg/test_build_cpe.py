@@ -90,3 +90,66 @@ def test_extract_referred_nodes():
 
     assert len(results) == 1
     assert results[0].text == 'Source Code'
+
+
+def test_get_referred_closure():
+    oval_text = """
+    <oval_definitions xmlns="{0}" xmlns:ind="{0}#independent">
+        <definitions>
+            <definition id="inventory_a" class="inventory">
+                <criteria><criterion test_ref="test_a" /></criteria>
+            </definition>
+            <definition id="compliance_b" class="compliance">
+                <criteria><criterion test_ref="test_b" /></criteria>
+            </definition>
+        </definitions>
+        <tests>
+            <ind:textfilecontent54_test id="test_a">
+                <ind:object object_ref="object_a" />
+            </ind:textfilecontent54_test>
+            <ind:textfilecontent54_test id="test_b">
+                <ind:object object_ref="object_b" />
+            </ind:textfilecontent54_test>
+        </tests>
+        <objects>
+            <ind:textfilecontent54_object id="object_a">
+                <ind:filepath var_ref="variable_a" />
+                <filter action="include">state_a</filter>
+            </ind:textfilecontent54_object>
+            <ind:textfilecontent54_object id="object_b" />
+        </objects>
+        <states>
+            <ind:textfilecontent54_state id="state_a" />
+        </states>
+        <variables>
+            <local_variable id="variable_a">
+                <object_component object_ref="object_c" />
+            </local_variable>
+        </variables>
+    </oval_definitions>
+    """.format(ssg.build_cpe.oval_ns)
+    oval_groups = ssg.build_cpe.get_container_groups_from_root(ET.fromstring(oval_text))
+
+    closure = ssg.build_cpe.get_referred_closure(
+        oval_groups, [("definitions", "inventory_a")])
+
+    # object_c is referenced, but missing
+    assert closure == set([
+        ("definitions", "inventory_a"),
+        ("tests", "test_a"),
+        ("objects", "object_a"),
+        ("states", "state_a"),
+        ("variables", "variable_a"),
+    ])
+
+
+def test_file_name_index(tmpdir):
+    tmpdir.join("first", "a.xml").ensure()
+    tmpdir.join("second", "nested", "b.xml").ensure()
+
+    index = ssg.build_cpe.FileNameIndex(
+        [str(tmpdir.join("first")), str(tmpdir.join("second"))])
+
+    assert "a.xml" in index
+    assert "b.xml" in index
+    assert "c.xml" not in index
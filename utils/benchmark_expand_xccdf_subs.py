@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import ssg.build_remediations
+import ssg.utils
+import ssg.xml
+import ssg.yaml
+
+
+SSG_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Measure the time needed to expand remediation function "
+        "calls of all bash fixes of a product into <sub> elements, with the "
+        "remediation function index built once and for every fix.")
+    parser.add_argument("--product", default="rhel7",
+                        help="Product whose bash fixes are expanded")
+    parser.add_argument("--build-config-yaml", dest="build_config_yaml",
+                        help="YAML file with information about the build "
+                        "configuration, optional")
+    parser.add_argument("--build-dir", dest="build_dir", required=True,
+                        help="Directory containing bash-remediation-functions.xml")
+    parser.add_argument("-n", "--repeat", type=int, default=5,
+                        help="How many times to expand all the fixes")
+    parser.add_argument("fix_dirs", metavar="FIX_DIR", nargs="*",
+                        help="Additional directories with bash fixes, e.g. "
+                        "templated fixes of the product")
+    return parser.parse_args()
+
+
+def make_fix_elements(fixes):
+    fix_elements = []
+    for fix_name in sorted(fixes):
+        fix_contents, config = fixes[fix_name]
+        fix_elm = ssg.xml.ElementTree.Element("fix", rule=fix_name)
+        fix_elm.text = "\n".join(fix_contents) + "\n"
+        fix_elements.append(fix_elm)
+    return fix_elements
+
+
+def expand_fixes(fixes, remediation_functions, use_index):
+    failed = 0
+    elapsed = 0.0
+    for fix_elm in make_fix_elements(fixes):
+        if not use_index:
+            ssg.build_remediations.get_remediation_function_index.cache.clear()
+        start = time.time()
+        try:
+            ssg.build_remediations.expand_xccdf_subs(
+                fix_elm, "bash", remediation_functions)
+        except SystemExit:
+            failed += 1
+        elapsed += time.time() - start
+    return elapsed, failed
+
+
+def main():
+    args = parse_args()
+
+    product_yaml = os.path.join(SSG_ROOT, args.product, "product.yml")
+    build_config = dict()
+    if args.build_config_yaml:
+        build_config = ssg.yaml.open_raw(args.build_config_yaml)
+    env_yaml = ssg.yaml.open_product_environment(build_config, product_yaml)
+
+    fix_dirs = [os.path.join(SSG_ROOT, "shared", "fixes", "bash")] + args.fix_dirs
+    fix_dirs.append(os.path.join(SSG_ROOT, args.product, "fixes", "bash"))
+    fixes = ssg.build_remediations.combine_fixes(
+        env_yaml, product_yaml, "bash", fix_dirs)
+    remediation_functions = ssg.build_remediations.get_available_functions(
+        args.build_dir)
+
+    # Fixes failing the expansion report it on stderr, keep the output clean
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, "w")
+    try:
+        rebuilt, failed = 0.0, 0
+        cached = 0.0
+        for _ in range(args.repeat):
+            elapsed, failed = expand_fixes(fixes, remediation_functions, False)
+            rebuilt += elapsed
+            elapsed, failed = expand_fixes(fixes, remediation_functions, True)
+            cached += elapsed
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+
+    count = len(fixes) * args.repeat
+    print("Fixes expanded: %d (%d failed the expansion)" % (len(fixes), failed))
+    print("Index built for every fix: %.3f ms per fix" % (1000.0 * rebuilt / count))
+    print("Index built once: %.3f ms per fix" % (1000.0 * cached / count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import ssg.id_translate
+from ssg.constants import oval_namespace as oval_ns
+from ssg.constants import OVALREFATTR_TO_TAG, OCILREFATTR_TO_TAG, ocil_namespace as ocil_ns
+from ssg.xml import ElementTree
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Measure the time IDTranslator needs to translate a "
+        "generated OVAL document, compared to translating it without "
+        "dispatch tables and memoized IDs.")
+    parser.add_argument("-n", "--elements", type=int, default=100000,
+                        help="Approximate number of elements of the document")
+    return parser.parse_args()
+
+
+def generate_oval(elements):
+    """
+    Generate an OVAL document where each check consists of a definition
+    with criteria, a test, an object with a filter, a state and a variable.
+    """
+    root = ElementTree.Element("{%s}oval_definitions" % oval_ns)
+    containers = dict(
+        (name, ElementTree.SubElement(root, "{%s}%s" % (oval_ns, name)))
+        for name in ["definitions", "tests", "objects", "states", "variables"])
+
+    # Each check has 12 elements
+    for index in range(elements // 12):
+        name = "check_%d" % index
+        definition = ElementTree.SubElement(
+            containers["definitions"], "{%s}definition" % oval_ns, id=name)
+        metadata = ElementTree.SubElement(definition, "{%s}metadata" % oval_ns)
+        ElementTree.SubElement(metadata, "{%s}title" % oval_ns).text = name
+        criteria = ElementTree.SubElement(definition, "{%s}criteria" % oval_ns)
+        ElementTree.SubElement(criteria, "{%s}criterion" % oval_ns,
+                               test_ref="test_" + name)
+        ElementTree.SubElement(criteria, "{%s}extend_definition" % oval_ns,
+                               definition_ref="check_0")
+
+        test = ElementTree.SubElement(
+            containers["tests"], "{%s#unix}file_test" % oval_ns, id="test_" + name)
+        ElementTree.SubElement(test, "{%s#unix}object" % oval_ns,
+                               object_ref="object_" + name)
+
+        obj = ElementTree.SubElement(
+            containers["objects"], "{%s#unix}file_object" % oval_ns, id="object_" + name)
+        ElementTree.SubElement(obj, "{%s}filter" % oval_ns).text = "state_" + name
+
+        ElementTree.SubElement(
+            containers["states"], "{%s#unix}file_state" % oval_ns, id="state_" + name)
+        ElementTree.SubElement(
+            containers["variables"], "{%s}external_variable" % oval_ns, id="var_" + name)
+
+    return root
+
+
+def translate_without_tables(translator, tree):
+    """
+    Translation done for each element from scratch, as IDTranslator did
+    before it got the dispatch tables and memoized IDs.
+    """
+    def generate_id(tagname, name):
+        return "%s:%s-%s:%s:1" % (
+            ssg.id_translate._namespace_to_prefix(tagname),
+            translator.content_id, name,
+            ssg.id_translate._tagname_to_abbrev(tagname))
+
+    for element in tree.iter():
+        idname = element.get("id")
+        if idname:
+            element.set("id", generate_id(element.tag, idname))
+        if element.tag == "{%s}filter" % oval_ns:
+            element.text = generate_id("{%s}state" % oval_ns, element.text)
+            continue
+        if element.tag == "{%s#independent}var_ref" % oval_ns:
+            element.text = generate_id("{%s}variable" % oval_ns, element.text)
+            continue
+        for attr in element.keys():
+            if attr in OVALREFATTR_TO_TAG.keys():
+                element.set(attr, generate_id(
+                    "{%s}%s" % (oval_ns, OVALREFATTR_TO_TAG[attr]),
+                    element.get(attr)))
+            if attr in OCILREFATTR_TO_TAG.keys():
+                element.set(attr, generate_id(
+                    "{%s}%s" % (ocil_ns, OCILREFATTR_TO_TAG[attr]),
+                    element.get(attr)))
+        if element.tag == "{%s}test_action_ref" % ocil_ns:
+            element.text = generate_id("{%s}action" % ocil_ns, element.text)
+    return tree
+
+
+def main():
+    args = parse_args()
+
+    tree = generate_oval(args.elements)
+    reference = generate_oval(args.elements)
+    count = len(list(tree.iter()))
+
+    start = time.time()
+    translate_without_tables(ssg.id_translate.IDTranslator("ssg"), reference)
+    without_tables = time.time() - start
+
+    start = time.time()
+    ssg.id_translate.IDTranslator("ssg").translate(tree)
+    with_tables = time.time() - start
+
+    if ElementTree.tostring(reference) != ElementTree.tostring(tree):
+        raise RuntimeError("The translations differ")
+
+    print("Elements translated: %d" % count)
+    print("Without dispatch tables: %.3f s" % without_tables)
+    print("With dispatch tables: %.3f s" % with_tables)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+
+import ssg.jinja
+import ssg.rules
+import ssg.utils
+import ssg.yaml
+
+
+SSG_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Measure the time needed to open a rule.yml with "
+        "macros expanded, with and without the cache of macro definitions.")
+    parser.add_argument("--product", default="rhel7",
+                        help="Product whose product.yml is used for expansion")
+    parser.add_argument("--build-config-yaml", dest="build_config_yaml",
+                        help="YAML file with information about the build "
+                        "configuration, optional")
+    parser.add_argument("-n", "--rules", type=int, default=200,
+                        help="How many rules to expand")
+    return parser.parse_args()
+
+
+def expand_rules(rule_files, env_yaml, use_cache):
+    start = time.time()
+    for rule_file in rule_files:
+        if not use_cache:
+            ssg.jinja.extract_substitutions_dict_from_template.cache.clear()
+        ssg.yaml.open_and_macro_expand(rule_file, dict(env_yaml))
+    return time.time() - start
+
+
+def main():
+    args = parse_args()
+
+    product_yaml = os.path.join(SSG_ROOT, args.product, "product.yml")
+    build_config = dict()
+    if args.build_config_yaml:
+        build_config = ssg.yaml.open_raw(args.build_config_yaml)
+    env_yaml = ssg.yaml.open_product_environment(build_config, product_yaml)
+
+    guide_dir = os.path.join(os.path.dirname(product_yaml),
+                             ssg.utils.required_key(env_yaml, "benchmark_root"))
+    rule_files = []
+    for rule_dir in ssg.rules.find_rule_dirs(os.path.abspath(guide_dir)):
+        rule_files.append(ssg.rules.get_rule_dir_yaml(rule_dir))
+        if len(rule_files) == args.rules:
+            break
+
+    # Warm up the jinja environment so that template compilation of the
+    # rules themselves isn't part of the measurement
+    expand_rules(rule_files, env_yaml, True)
+
+    uncached = expand_rules(rule_files, env_yaml, False)
+    cached = expand_rules(rule_files, env_yaml, True)
+
+    print("Rules expanded: %d" % len(rule_files))
+    print("Without macro cache: %.2f ms per rule" % (1000.0 * uncached / len(rule_files)))
+    print("With macro cache: %.2f ms per rule" % (1000.0 * cached / len(rule_files)))
+
+
+if __name__ == "__main__":
+    main()
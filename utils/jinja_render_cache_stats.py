@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+
+import ssg.jinja
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Show hit and miss statistics of the jinja2 render cache.")
+    parser.add_argument(
+        "cache_dir",
+        help="Path to the render cache, see SSG_JINJA2_RENDER_CACHE_DIR")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stats = ssg.jinja.get_render_cache_stats(args.cache_dir)
+    lookups = stats["hits"] + stats["misses"]
+    hit_ratio = 0.0
+    if lookups:
+        hit_ratio = 100.0 * stats["hits"] / lookups
+    print("Lookups: %d" % lookups)
+    print("Hits: %d (%.1f%%)" % (stats["hits"], hit_ratio))
+    print("Misses: %d" % stats["misses"])
+    print("Stored entries: %d" % stats["stores"])
+    print("Evicted entries: %d" % stats["evictions"])
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@
 from __future__ import print_function
 
 import argparse
+import hashlib
 import os
 import sys
 from collections import defaultdict
@@ -11,6 +12,7 @@ import json
 
 import ssg.build_yaml
 import ssg.oval
+import ssg.products
 import ssg.build_remediations
 import ssg.rules
 import ssg.yaml
@@ -19,6 +21,9 @@ import ssg.yaml
 SSG_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 BUILD_OUTPUT = os.path.join(SSG_ROOT, "build", "rule_dirs.json")
 
+# Bump when the layout of the rule objects changes
+STAMPS_VERSION = 1
+
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -26,6 +31,9 @@ def parse_args():
                    help="Path to SSG root directory (defaults to %s)" % SSG_ROOT)
     parser.add_argument("-o", "--output", type=str, action="store", default=BUILD_OUTPUT,
                    help="File to write json output to (defaults to build/rule_dirs.json)")
+    parser.add_argument("-f", "--full", action="store_true",
+                   help="Process all rule directories, instead of only those which "
+                   "changed since the output was last written")
 
     return parser.parse_args()
 
@@ -150,49 +158,144 @@ def handle_remediations(product_list, product_yamls, rule_obj):
     return rule_remediations, r_products
 
 
+def process_rule(product_list, product_yamls, rule_id, rule_dir, guide_dir):
+    rule_obj = handle_rule_yaml(product_list, product_yamls, rule_id, rule_dir, guide_dir)
+    rule_obj['ovals'], oval_products = handle_ovals(product_list, product_yamls, rule_obj)
+    rule_obj['remediations'], r_products = handle_remediations(product_list, product_yamls, rule_obj)
+
+    for key in oval_products:
+        oval_products[key] = sorted(oval_products[key])
+    rule_obj['oval_products'] = oval_products
+
+    for key in r_products:
+        r_products[key] = sorted(r_products[key])
+    rule_obj['remediation_products'] = r_products
+
+    return rule_obj
+
+
+def validate_rule(rule_obj):
+    # Validate oval products
+    oval_products = rule_obj['oval_products']
+    for key in oval_products:
+        if len(oval_products[key]) > 1:
+            print("product has multiple ovals: %s - %s" % (key, ','.join(oval_products[key])), file=sys.stderr)
+
+    # Validate remediation products
+    r_products = rule_obj['remediation_products']
+    for key in r_products:
+        if len(r_products[key]) > 1:
+            exts = sorted(map(lambda x: os.path.splitext(x)[1], r_products[key]))
+            if len(exts) != len(set(exts)):
+                print("product has multiple remediations of the same type: %s - %s" % (key, ','.join(r_products[key])), file=sys.stderr)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return [path, stat.st_mtime, stat.st_size]
+
+
+def get_global_stamp(root, product_yamls, linux_products):
+    """
+    Hash of everything the rule objects depend on besides the files of
+    their rule directory: product.yml files, Jinja macros and the ssg
+    package processing them.
+    """
+    ssg_dir = os.path.dirname(os.path.abspath(ssg.rules.__file__))
+    files = [os.path.join(root, "shared", "macros.jinja"),
+             os.path.join(root, "shared", "macros-highlevel.jinja")]
+    files.extend(os.path.join(ssg_dir, name) for name in sorted(os.listdir(ssg_dir))
+                 if name.endswith(".py"))
+
+    stamp = dict(version=STAMPS_VERSION, root=os.path.abspath(root),
+                 script=_file_stamp(os.path.abspath(__file__)),
+                 files=[_file_stamp(path) for path in files if os.path.exists(path)],
+                 product_yamls=product_yamls, linux_products=sorted(linux_products))
+    data = json.dumps(stamp, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def get_rule_stamp(rule_dir, guide_dir, product_list):
+    """
+    Stamp of a rule directory made of the mtime and size of each file that
+    its rule object is built from.
+    """
+    paths = [ssg.rules.get_rule_dir_yaml(rule_dir)]
+    paths.extend(ssg.rules.get_rule_dir_ovals(rule_dir))
+    for r_type in sorted(ssg.build_remediations.REMEDIATION_TO_EXT_MAP):
+        paths.extend(ssg.rules.get_rule_dir_remediations(rule_dir, r_type))
+    return [guide_dir, product_list] + [_file_stamp(path) for path in paths]
+
+
+def load_previous_output(output, stamps_path, global_stamp):
+    """
+    Return the rule objects of the previous run and the stamps of their
+    rule directories, or empty dicts if they can't be reused.
+    """
+    try:
+        with open(stamps_path, 'r') as f:
+            stamps = json.load(f)
+        with open(output, 'r') as f:
+            known_rules = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}, {}
+
+    if stamps.get('global') != global_stamp:
+        return {}, {}
+    return known_rules, stamps.get('rules', {})
+
+
+def write_json(data, filename):
+    f = open(filename, 'w')
+    j = json.dump(data, f)
+    if not f.closed:
+        f.flush()
+        f.close()
+
+
 def main():
     args = parse_args()
 
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    stamps_path = args.output + ".stamps"
+    if os.path.isdir(output_dir):
+        ssg.rules.index_cache_dir = output_dir
+
     linux_products, other_products = ssg.products.get_all(args.root)
     all_products = linux_products.union(other_products)
 
-    all_rule_dirs, product_yamls = walk_products(args.root, all_products)
+    all_rule_dirs, product_yamls = walk_products(args.root, sorted(all_products))
+
+    global_stamp = get_global_stamp(args.root, product_yamls, linux_products)
+    previous_rules = {}
+    previous_stamps = {}
+    if not args.full:
+        previous_rules, previous_stamps = load_previous_output(
+            args.output, stamps_path, global_stamp)
 
     known_rules = {}
+    rule_stamps = {}
+    processed = 0
     for rule_id, rule_dir, guide_dir, given_product in all_rule_dirs:
         product_list = sorted(linux_products)
         if 'linux_os' not in guide_dir:
             product_list = [given_product]
 
-        rule_obj = handle_rule_yaml(product_list, product_yamls, rule_id, rule_dir, guide_dir)
-        rule_obj['ovals'], oval_products = handle_ovals(product_list, product_yamls, rule_obj)
-        rule_obj['remediations'], r_products = handle_remediations(product_list, product_yamls, rule_obj)
-
-        # Validate oval products
-        for key in oval_products:
-            oval_products[key] = sorted(oval_products[key])
-            if len(oval_products[key]) > 1:
-                print("product has multiple ovals: %s - %s" % (key, ','.join(oval_products[key])), file=sys.stderr)
-
-        rule_obj['oval_products'] = oval_products
-
-        # Validate remediation products
-        for key in r_products:
-            r_products[key] = sorted(r_products[key])
-            if len(r_products[key]) > 1:
-                exts = sorted(map(lambda x: os.path.splitext(x)[1], r_products[key]))
-                if len(exts) != len(set(exts)):
-                    print("product has multiple remediations of the same type: %s - %s" % (key, ','.join(r_products[key])), file=sys.stderr)
-
-        rule_obj['remediation_products'] = r_products
+        rule_stamp = get_rule_stamp(rule_dir, guide_dir, product_list)
+        if rule_id in previous_rules and previous_stamps.get(rule_id) == rule_stamp:
+            rule_obj = previous_rules[rule_id]
+        else:
+            rule_obj = process_rule(product_list, product_yamls, rule_id, rule_dir, guide_dir)
+            processed += 1
 
+        validate_rule(rule_obj)
         known_rules[rule_id] = rule_obj
+        rule_stamps[rule_id] = rule_stamp
+
+    write_json(known_rules, args.output)
+    write_json({'global': global_stamp, 'rules': rule_stamps}, stamps_path)
+    print("Processed %d of %d rule directories" % (processed, len(known_rules)))
 
-    f = open(args.output, 'w')
-    j = json.dump(known_rules, f)
-    if not f.closed:
-        f.flush()
-        f.close()
 
 if __name__ == "__main__":
     main()